@@ -4,3 +4,6 @@
 
 $p = Start-Process '.\silent_new_version.exe' -Wait -PassThru
 Write-Host "Exit code is $($p.ExitCode)"
+
+# 0 ok, 1 failed, 2 nothing collected, 3 cancelled/timed out (--timeout),
+# 4 partial: archive created, but some files were unreadable or left out (see <archive>.metrics.json)
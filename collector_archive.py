@@ -0,0 +1,520 @@
+import os
+import io
+import json
+import zlib
+import hashlib
+import logging
+from functools import partial
+from collector_cancel import Cancelled
+from collector_checksums import CHECKSUMS_NAME, Checksums
+from collector_compact import COMPACT_INDEX_NAME, COMPACT_SUFFIX, CompactIndex, CompactingReader, compactable
+from collector_entries import COMPRESSED_EXTENSIONS, ArchiveEntry
+from collector_filter import FILTER_INDEX_NAME, FilteringReader, FilterIndex
+from collector_index import LogIndex
+from collector_throttle import open_slot
+from collector_writers import CODECS, FORMATS, archive_format, open_writer
+
+# Return codes of stream_to_archive; the silent builds pass them straight to sys.exit
+ARCHIVE_OK = 0
+ARCHIVE_FAILED = 1
+ARCHIVE_EMPTY = 2
+ARCHIVE_CANCELLED = 3
+# Exit code only: archive created, but some files failed or did not fit the size budget
+ARCHIVE_PARTIAL = 4
+
+# Where an archive lists the entries stored once but collected more than once
+SHARED_INDEX_NAME = "shared_entries.json"
+
+# Bytes kept from the start of an oversized log; the rest of the cap goes to its tail
+CAPTURE_HEAD_BYTES = 256 * 1024
+# Bytes compared first when a file has the size of one already stored: files of the
+# same size mostly differ early, and only a matching start is worth a full read
+DEDUPE_HEAD_BYTES = 64 * 1024
+
+
+# --- Content hash shared by the archive writer and the manifests ---
+def new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_file(path, chunk_size=1024 * 1024, throttle=None, cancel=None):
+    # A cancelled token stops the read between chunks (Cancelled)
+    h = new_hash()
+    with open_slot(throttle), open(path, 'rb') as f:
+        read = partial(throttle.read, f) if throttle is not None else f.read
+        for chunk in iter(lambda: read(chunk_size), b''):
+            if cancel is not None:
+                cancel.check()
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# --- File wrapper that hashes the bytes as the archiver reads them ---
+class HashingReader(io.BufferedIOBase):
+    # With a CancelToken, a read after cancellation raises Cancelled;
+    # with an IOThrottle, reads are paced by it. Once size is set, exactly that
+    # many bytes are read: past it nothing, and where raw ends early, zeros.
+    def __init__(self, raw, cancel=None, throttle=None):
+        self._raw = raw
+        self._cancel = cancel
+        self._throttle = throttle
+        self.hash = new_hash()
+        self.bytes = 0
+        self.size = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        if self._cancel is not None:
+            self._cancel.check()
+        if self.size is not None:
+            left = self.size - self.bytes
+            size = left if size is None or size < 0 else min(size, left)
+        if self._throttle is not None:
+            data = self._throttle.read(self._raw, size)
+        else:
+            data = self._raw.read(size)
+        if not data and self.size is not None:
+            data = bytes(size)
+        self.hash.update(data)
+        self.bytes += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+
+# --- File wrapper passing every chunk read to a callback ---
+class TapReader(io.BufferedIOBase):
+    def __init__(self, raw, on_read):
+        self._raw = raw
+        self._on_read = on_read
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self._on_read(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+
+# --- File wrapper exposing only the head and tail of an oversized log ---
+class BoundedCaptureReader(io.BufferedIOBase):
+    # Presents <head_bytes> + marker + tail as one stream of exactly max_bytes.
+    # Only those two ranges are read from disk (seek + read), whatever the file size.
+
+    def __init__(self, raw, file_size, max_bytes, head_bytes=CAPTURE_HEAD_BYTES):
+        head = min(head_bytes, max_bytes // 2)
+        marker = b""
+        for _ in range(2):  # the marker length depends on the omitted count
+            tail = max(max_bytes - head - len(marker), 0)
+            omitted = file_size - head - tail
+            marker = (f"\n\n[... log_collector: {omitted} bytes omitted, "
+                      f"original size {file_size} bytes ...]\n\n").encode("ascii")
+        self._raw = raw
+        # (start in this stream, length, offset in the file or None, literal bytes)
+        self._segments = [
+            (0, head, 0, None),
+            (head, len(marker), None, marker),
+            (head + len(marker), tail, file_size - tail, None),
+        ]
+        self._size = head + len(marker) + tail
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size - self._pos
+        chunks = []
+        for start, length, offset, data in self._segments:
+            end = start + length
+            if size <= 0 or self._pos >= self._size:
+                break
+            if self._pos >= end:
+                continue
+            n = min(size, end - self._pos)
+            if data is not None:
+                chunk = data[self._pos - start:self._pos - start + n]
+            else:
+                self._raw.seek(offset + self._pos - start)
+                chunk = self._raw.read(n)
+            if not chunk:  # file shrank underneath us
+                break
+            chunks.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+            if len(chunk) < n:
+                break
+        return b"".join(chunks)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, min(offset, self._size))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+# --- Write one source file into an open archive ---
+def write_file(archive, source_path, arcname, max_bytes=None, cancel=None, throttle=None, line_filter=None,
+               on_filtered=None, on_read=None, codec=None, on_stored=None, compact=False, on_compacted=None):
+    # Returns the content hash of the source file, or None if the file was skipped.
+    # With max_bytes, a larger file is stored as its head and tail (BoundedCaptureReader).
+    # With a line_filter the file is read through a FilteringReader instead, and
+    # on_filtered(arcname, reader, size) is told what was kept. on_read(data) sees
+    # the bytes stored, as they are compressed. codec is the entry's own, for
+    # writers that pick one per entry (collector_writers). on_stored(arcname, size,
+    # digest, changed, read) gets the length and hash of the bytes stored (those of
+    # the source unless cut or filtered), whether the file changed while it was read,
+    # and how many bytes were read from it.
+    # With compact the text is stored as templates and columns (CompactingReader);
+    # on_read still sees the text, and on_compacted(arcname, reader) what it became.
+    # The file is opened before anything is added to the archive, so a locked or
+    # vanished log is skipped without leaving a dangling entry in the archive.
+    with open_slot(throttle):
+        try:
+            f = open(source_path, 'rb')
+        except OSError as e:
+            logging.warning(f"Could not read {source_path}: {e}")
+            return None
+        with f:
+            st = os.fstat(f.fileno())
+            mtime = st.st_mtime
+            if line_filter is not None:
+                reader = HashingReader(f, cancel, throttle)
+                stored = FilteringReader(reader, line_filter, st.st_size, max_bytes)
+            elif max_bytes is not None and st.st_size > max_bytes:
+                reader = stored = HashingReader(BoundedCaptureReader(f, st.st_size, max_bytes), cancel, throttle)
+            else:
+                reader = stored = HashingReader(f, cancel, throttle)
+            # The length stored is only known up front when the bytes are the file's own
+            size = None if line_filter is not None or compact else stored.seek(0, io.SEEK_END)
+            stored.seek(0)
+            if size is not None:
+                # The writer is promised size bytes (a tar header holds it): a file that
+                # shrinks while read is padded here, where the checksum sees the padding
+                stored.size = size
+            checked = stored if stored is reader else HashingReader(stored)
+            out = TapReader(checked, on_read) if on_read else checked
+            if compact:
+                compactor = CompactingReader(out, st.st_size)
+                out = checked = HashingReader(compactor)
+            archive.writef(out, arcname, mtime, codec, size)
+            if line_filter is not None and on_filtered:
+                on_filtered(arcname, stored, st.st_size)
+            if compact and on_compacted:
+                on_compacted(arcname, compactor)
+            if on_stored:
+                after = os.fstat(f.fileno())
+                changed = (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns)
+                on_stored(arcname, checked.bytes, checked.hash.hexdigest(), changed, reader.bytes)
+    return reader.hash.hexdigest()
+
+
+# --- Entries for every file below a folder ---
+def tree_entries(folder, arc_prefix, category=None):
+    for root, _, files in os.walk(folder):
+        for f in files:
+            full_path = os.path.join(root, f)
+            arcname = os.path.join(arc_prefix, os.path.relpath(full_path, folder))
+            yield ArchiveEntry(full_path, arcname, category)
+
+
+# --- Add bytes held in memory (indexes, summaries) to an open archive ---
+def write_bytes(archive, data, arcname):
+    # writef rather than writestr: py7zr corrupts entries when the two are mixed
+    # in an appended session, and policy groups are written as appended sessions.
+    archive.writef(io.BytesIO(data), arcname)
+
+
+# --- Store each physical file and each distinct content once per archive ---
+class Deduplicator:
+    # A source path already written is linked without being read again. A file
+    # with the same size as one already written has its first DEDUPE_HEAD_BYTES
+    # compared with those of the stored ones, and only if they match is it hashed
+    # whole (a read, no compression) and linked if the content matches; a file
+    # that is stored after all is then read twice only when its start matched.
+    # Links end up in SHARED_INDEX_NAME. An entry is only linked to the same file
+    # stored under the same filter and the same cap (max_bytes, if the file is
+    # over it), a compacted one (see stream_to_archive) only to another compacted copy.
+
+    def __init__(self, throttle=None):
+        self.throttle = throttle
+        self.by_path = {}   # (normalised source path, filter, cap) -> (arcname, digest)
+        self.by_size = {}   # size -> [[digest, arcname, source, digest of its head or None]]
+        self.links = {}     # arcname not stored -> arcname holding the bytes
+
+    @staticmethod
+    def _key(entry):
+        # A cap the file is under stores the whole file, like no cap
+        cap = entry.max_bytes
+        if cap is not None and entry.line_filter is None and entry.record is not None and entry.record.size <= cap:
+            cap = None
+        return os.path.normcase(os.path.abspath(entry.source)), entry.line_filter, cap
+
+    @staticmethod
+    def _whole(entry):
+        return entry.max_bytes is None and entry.line_filter is None
+
+    @staticmethod
+    def _size_key(entry):
+        return entry.record.size, entry.arcname.endswith(COMPACT_SUFFIX)
+
+    def lookup(self, entry):
+        found = self.by_path.get(self._key(entry))
+        if found or not self._whole(entry) or entry.record is None or not entry.record.size:
+            return found
+        candidates = self.by_size.get(self._size_key(entry))
+        if not candidates:
+            return None
+        try:
+            head = self._head(entry.source)
+            if not any(self._candidate_head(candidate) == head for candidate in candidates):
+                return None
+            digest = hash_file(entry.source, throttle=self.throttle)
+        except OSError:
+            return None
+        for stored_digest, arcname, _, _ in candidates:
+            if stored_digest == digest:
+                return arcname, digest
+        return None
+
+    def _head(self, path):
+        h = new_hash()
+        with open_slot(self.throttle), open(path, 'rb') as f:
+            if self.throttle is not None:
+                h.update(self.throttle.read(f, DEDUPE_HEAD_BYTES))
+            else:
+                h.update(f.read(DEDUPE_HEAD_BYTES))
+        return h.hexdigest()
+
+    def _candidate_head(self, candidate):
+        # Read once, the first time a file of the same size comes along
+        if candidate[3] is None:
+            try:
+                candidate[3] = self._head(candidate[2])
+            except OSError:
+                candidate[3] = ""
+        return candidate[3]
+
+    def stored(self, entry, digest):
+        self.by_path[self._key(entry)] = (entry.arcname, digest)
+        if self._whole(entry) and entry.record is not None and entry.record.size:
+            self.by_size.setdefault(self._size_key(entry), []).append([digest, entry.arcname, entry.source, None])
+
+    def link(self, entry, arcname):
+        self.links[entry.arcname] = arcname
+
+    def index(self):
+        return json.dumps({"links": self.links}, indent=1).encode("utf-8")
+
+
+# --- Per-file codec choice ---
+class CompressionPolicy:
+    # codec_for() picks a CODECS name for each entry, first match wins:
+    #   categories[category][extension] -> extensions[extension]
+    #   -> categories[category] (a codec name, or the dict's "default")
+    #   -> a quick compressibility probe of files >= sample_min_size -> default
+    # The probe stores incompressible (high-entropy) data and gives very
+    # repetitive text the strong preset, where it pays for itself.
+
+    def __init__(self, default="fast", extensions=None, categories=None,
+                 sample_size=64 * 1024, sample_min_size=1024 * 1024):
+        self.default = default
+        self.extensions = dict.fromkeys(COMPRESSED_EXTENSIONS, "store")
+        self.extensions.update(extensions or {})
+        self.categories = categories or {}
+        self.sample_size = sample_size
+        self.sample_min_size = sample_min_size
+        for codec in [default, *self.extensions.values(), *self._category_codecs()]:
+            if codec not in CODECS:
+                raise ValueError(f"Unknown codec '{codec}', expected one of {sorted(CODECS)}")
+
+    def _category_codecs(self):
+        for rule in self.categories.values():
+            yield from (rule.values() if isinstance(rule, dict) else [rule])
+
+    def codec_for(self, entry, throttle=None):
+        # throttle (an IOThrottle) paces the probe's sample read like any other read
+        ext = os.path.splitext(entry.arcname)[1].lower()
+        rule = self.categories.get(entry.category)
+        if isinstance(rule, dict):
+            if ext in rule:
+                return rule[ext]
+            rule = rule.get("default")
+        if ext in self.extensions:
+            return self.extensions[ext]
+        if rule:
+            return rule
+        return self._probe(entry, throttle) or self.default
+
+    def _probe(self, entry, throttle=None):
+        if entry.record is None or entry.record.size < self.sample_min_size:
+            return None
+        try:
+            with open_slot(throttle), open(entry.source, 'rb') as f:
+                sample = throttle.read(f, self.sample_size) if throttle is not None else f.read(self.sample_size)
+        except OSError:
+            return None
+        if not sample:
+            return None
+        ratio = len(zlib.compress(sample, 1)) / len(sample)
+        if ratio > 0.9:
+            return "store"
+        if ratio < 0.1:
+            return "strong"
+        return None
+
+
+# --- Stream files from their source location into a new archive ---
+def stream_to_archive(archive_path, entries, policy=None, on_written=None, finish=None, dedupe=True, cancel=None,
+                      throttle=None, on_failed=None, index=False, compact=False, on_stored=None):
+    # The format follows the extension of archive_path (collector_writers.FORMATS,
+    # 7z if none matches). Nothing is staged on disk: each file is read once and
+    # compressed on the fly. A 7z entry whose codec is the policy default is written
+    # as it arrives; the others are grouped per codec and appended afterwards as
+    # extra 7z folders (py7zr uses a single coder chain per session). zip and
+    # tar.zst write every entry as it arrives, with its own codec in a zip.
+    # on_written(entry, digest) is called for every file written or linked (see
+    # Deduplicator), on_stored(entry, read) only for those actually written, with the
+    # bytes read from their source, on_failed(source, reason, category) for every
+    # file that could not be read; finish(archive) may add final entries (e.g. an index). Entries
+    # with a line filter are listed in FILTER_INDEX_NAME, and the length and hash of
+    # every file stored in CHECKSUMS_NAME (collector_checksums.verify). With index, the text logs
+    # are indexed as they are compressed (collector_index.LogIndex) and the index is
+    # stored last (in a 7z, as a folder of its own). With compact, the text logs
+    # (collector_compact.COMPACT_FILES) are stored compacted under their name plus
+    # COMPACT_SUFFIX, listed in COMPACT_INDEX_NAME; collector_compact rebuilds them.
+    # A cancelled token stops the run at the next file (or chunk), closes the
+    # writer and removes the partial archive (ARCHIVE_CANCELLED). An IOThrottle
+    # paces every read made for the archive.
+    policy = policy or CompressionPolicy()
+    grouped = FORMATS[archive_format(archive_path) or "7z"].one_codec
+    dedupe = Deduplicator(throttle) if dedupe else None
+    filtered = FilterIndex()
+    compacted = CompactIndex()
+    checksums = Checksums()
+    index = LogIndex() if index else None
+    written = False
+    deferred = {}
+
+    def stored(entry, arcname, size, digest, changed, read):
+        checksums.record(arcname, size, digest, changed)
+        if on_stored:
+            on_stored(entry, read)
+
+    def write_group(archive, group):
+        nonlocal written
+        for entry, codec in group:
+            if cancel is not None:
+                cancel.check()
+            compact_entry = compact and compactable(entry.source)
+            if compact_entry:
+                entry = entry._replace(arcname=entry.arcname + COMPACT_SUFFIX)
+            found = dedupe.lookup(entry) if dedupe else None
+            if found:
+                dedupe.link(entry, found[0])
+                if index is not None:
+                    index.link(entry, found[0])
+                digest = found[1]
+            else:
+                indexed = index.start(entry) if index is not None else None
+                digest = write_file(archive, entry.source, entry.arcname, entry.max_bytes, cancel, throttle,
+                                    entry.line_filter, filtered.record, indexed.feed if indexed else None, codec,
+                                    partial(stored, entry), compact_entry, compacted.record)
+                if digest and dedupe:
+                    dedupe.stored(entry, digest)
+                if digest and indexed:
+                    index.add(indexed)
+            if digest:
+                written = True
+                if on_written:
+                    on_written(entry, digest)
+            elif on_failed:
+                on_failed(entry.source, "unreadable", entry.category)
+
+    def close_out(archive):
+        if dedupe and dedupe.links:
+            write_bytes(archive, dedupe.index(), SHARED_INDEX_NAME)
+        if filtered:
+            write_bytes(archive, filtered.index(), FILTER_INDEX_NAME)
+        if compacted:
+            write_bytes(archive, compacted.index(), COMPACT_INDEX_NAME)
+        if checksums.changed:
+            logging.warning(f"{len(checksums.changed)} file(s) changed while they were read, "
+                            f"listed in {CHECKSUMS_NAME}")
+        write_bytes(archive, checksums.index(), CHECKSUMS_NAME)
+        if finish:
+            finish(archive)
+        if index is not None and not grouped:
+            index.store(archive)
+
+    def primary_entries():
+        for entry in entries:
+            codec = policy.codec_for(entry, throttle)
+            if codec == policy.default or not grouped:
+                yield entry, codec
+            else:
+                deferred.setdefault(codec, []).append(entry)
+
+    try:
+        with open_writer(archive_path, policy.default) as archive:
+            write_group(archive, primary_entries())
+            if not deferred and written:
+                close_out(archive)
+        groups = list(deferred.items())
+        for i, (codec, group) in enumerate(groups):
+            with open_writer(archive_path, codec, append=True) as archive:
+                write_group(archive, ((entry, codec) for entry in group))
+                if i == len(groups) - 1 and written:
+                    close_out(archive)
+        if index is not None and grouped and written:
+            with open_writer(archive_path, "fast", append=True) as archive:
+                index.store(archive)
+        status = ARCHIVE_OK if written else ARCHIVE_EMPTY
+    except Cancelled as e:
+        logging.warning(f"Archive {archive_path} not completed: {e}")
+        status = ARCHIVE_CANCELLED
+    except Exception as e:
+        if cancel is not None and cancel.cancelled():
+            # Closing the writer mid-file can fail in its own way; the cause is the same
+            logging.warning(f"Archive {archive_path} not completed: {cancel.reason}")
+            status = ARCHIVE_CANCELLED
+        else:
+            logging.error(f"Failed to create archive {archive_path}: {e}")
+            status = ARCHIVE_FAILED
+
+    if index is not None:
+        index.remove()
+    if status != ARCHIVE_OK:
+        try:
+            os.remove(archive_path)
+        except OSError:
+            pass
+    return status
@@ -0,0 +1,409 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+
+# Engines that can be benchmarked; each runs in its own process so peak RSS is its own
+ENGINES = ("gui", "silent", "silent_ev")
+# A change of more than this (relative) in a rate is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+_LEVELS = ["INFO"] * 8 + ["DEBUG"] * 4 + ["WARN", "ERROR"]
+_MESSAGES = [
+    "Heartbeat sent to {host} in {n} ms",
+    "Job {id} finished with status {status}",
+    "Checking for updates from {host}",
+    "Connection to {host}:{port} closed after {n} ms",
+    "Script {id}.ps1 returned exit code {status}",
+    "Patch scan found {n} missing updates",
+    "Retrying request {id} ({n}/5)",
+    "Service state changed to {status}",
+]
+
+
+# --- Synthetic log trees shaped like the categories layout ---
+def _log_lines(rng, count):
+    # A pool of varied lines drawn at random: compresses like a real agent log
+    pool = [
+        f"{_LEVELS[i % len(_LEVELS)]} [{rng.randrange(1, 64)}] " + rng.choice(_MESSAGES).format(
+            host=f"srv{rng.randrange(100)}.example.net", port=rng.choice((443, 8443, 15000)),
+            n=rng.randrange(5000), id=rng.randrange(10 ** 6), status=rng.choice(("OK", "FAILED", "0", "1", "Running")))
+        for i in range(2000)
+    ]
+    start = datetime.datetime(2025, 1, 1)
+    return "".join(
+        f"{start + datetime.timedelta(seconds=i * 3)} {line}\n"
+        for i, line in enumerate(rng.choices(pool, k=count))
+    )
+
+
+def _write_log(path, rng, size):
+    text = _log_lines(rng, max(size // 80, 1))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def populate_folder(folder, rng, scale=1.0, oversized=False):
+    # Many tiny scripts, a rotating log set, a .gz backlog and excluded binaries;
+    # oversized adds a log above the profile's max_file_size (kept as head + tail)
+    scripts = os.path.join(folder, "scripts")
+    for i in range(int(100 * scale)):
+        sub = os.path.join(scripts, f"job{i % 10}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"task_{i}.ps1"), "w", encoding="utf-8") as f:
+            f.write(f"# task {i}\nWrite-Output 'step {rng.randrange(1000)}'\nexit {rng.randrange(2)}\n")
+
+    _write_log(os.path.join(folder, "agent.log"), rng, int(512 * 1024 * scale))
+    for n in range(1, 4):
+        _write_log(os.path.join(folder, f"agent.log.{n}"), rng, int(256 * 1024 * scale))
+    if oversized:
+        _write_log(os.path.join(folder, "trace.log"), rng, 12 * 1024 * 1024)
+
+    with gzip.open(os.path.join(folder, "agent_backlog.log.gz"), "wt", encoding="utf-8") as f:
+        f.write(_log_lines(rng, int(128 * 1024 * scale) // 80 * 4))
+    size = int(128 * 1024 * scale)
+    for name in ("helper.dll", "updater.exe"):
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(rng.getrandbits(size * 8).to_bytes(size, "little"))
+
+
+def remap_path(path, root):
+    # C:\Program Files (x86)\Msp Agent\ -> <root>/Program Files (x86)/Msp Agent
+    parts = [part for part in re.split(r"[\\/]+", path) if part]
+    if parts and re.fullmatch(r"[A-Za-z]:", parts[0]):
+        parts = parts[1:]
+    return os.path.join(root, *parts)
+
+
+def remap_categories(categories, root):
+    # Same layout under root; event log exporters are left out (no wevtutil to time)
+    return {
+        category: [remap_path(path, root) for path in paths if not callable(path)]
+        for category, paths in categories.items()
+    }
+
+
+def build_tree(root, categories_list, seed=0, scale=1.0):
+    # Populates every remapped folder of every engine's categories, once
+    rng = random.Random(seed)
+    folders = sorted({
+        path for categories in categories_list
+        for paths in remap_categories(categories, root).values() for path in paths
+    })
+    # One folder in five gets an oversized log at scale 1; it cannot shrink with the
+    # scale (it has to stay above max_file_size), so smaller scales get fewer of them
+    every = max(1, round(5 / scale)) if scale > 0 else len(folders)
+    for i, folder in enumerate(folders):
+        os.makedirs(folder, exist_ok=True)
+        populate_folder(folder, rng, scale, oversized=(i % every == 0))
+    return folders
+
+
+def tree_size(root):
+    files = total = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return files, total
+
+
+# --- Engines, timed phase by phase ---
+def _load_engine(engine):
+    if engine == "gui":
+        import collector_core as module
+    elif engine == "silent":
+        import silent_new_version as module
+    else:
+        import log_col_silent_ev as module
+    return module
+
+
+def _profile_module(engine):
+    # Where the engine keeps its categories: the silent builds share collector_silent's
+    if engine == "gui":
+        import collector_core as module
+    else:
+        import collector_silent as module
+    return module
+
+
+def _scan_gui(module, manifest):
+    for category in module.categories:
+        if category in module.EVENT_CATEGORIES:
+            continue
+        yield from module.copy_selected_items_for_category(category, manifest)
+
+
+def _peak_rss_kb():
+    # VmHWM is the high-water mark of this process alone; ru_maxrss (where there is
+    # no /proc) may still hold the parent's, which Linux carries across exec
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _run_gui(module, manifest, archive_path):
+    # collect_logs without the window: the categories in order, fitted to the free
+    # space, then the GUI's create_7z_archive. Returns status, phase times, files, bytes
+    from collector_budget import estimate, fit_to_budget
+    start = time.perf_counter()
+    entries = fit_to_budget(_scan_gui(module, manifest), module.MAX_TOTAL_SIZE, module.CATEGORY_WEIGHTS, manifest,
+                            os.path.dirname(archive_path))
+    scanned = time.perf_counter()
+    status = module.create_7z_archive(archive_path, entries, manifest)
+    preflight = estimate(entries)
+    return status, scanned - start, time.perf_counter() - scanned, preflight.files, preflight.bytes
+
+
+def _run_silent(module, copy_items, manifest, archive_path, compact):
+    # The silent run as shipped (collector_silent.create_7z_archive): budget, disk
+    # budget, metrics and search index included; phases and counts from its metrics
+    import collector_silent
+    from collector_metrics import RunMetrics
+    metrics = RunMetrics()
+    status = collector_silent.create_7z_archive(archive_path, manifest, copy_items, module.COMPRESSION_POLICY,
+                                                metrics=metrics, compact=compact)
+    summary = metrics.summary(status, archive_path)
+    return (status, metrics.phases.get("scan", 0), metrics.phases.get("archive", 0), summary["files"],
+            summary["bytes_read"])
+
+
+def run_engine(engine, root, out_dir, archive_format="7z", compact=False):
+    # The engine's own collection path, timed in two phases. Scan: its entry
+    # generator (stat only, nothing is read) fitted to the budget. Archive: its
+    # create_7z_archive, reading straight from the tree. With compact, the text
+    # logs are stored compacted (collector_compact); the GUI has no such option.
+    # Import time is what a user waits for before anything happens (the GUI's startup)
+    start = time.perf_counter()
+    module = _load_engine(engine)
+    imported = time.perf_counter() - start
+    from collector_manifest import RunManifest
+
+    profile = _profile_module(engine)
+    profile.categories = remap_categories(profile.categories, root)
+    manifest = RunManifest(os.path.join(out_dir, f"{engine}_manifest.json"))
+    archive_path = os.path.join(out_dir, f"{engine}.{archive_format}")
+
+    if engine == "gui":
+        if compact:
+            raise ValueError("the GUI does not compact text logs")
+        status, scan_s, archive_s, files, size = _run_gui(module, manifest, archive_path)
+    elif engine == "silent":
+        status, scan_s, archive_s, files, size = _run_silent(module, module.copy_all_categories, manifest,
+                                                             archive_path, compact)
+    else:
+        status, scan_s, archive_s, files, size = _run_silent(module, module.copy_selected_items, manifest,
+                                                             archive_path, compact)
+
+    archive_bytes = os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+    total = scan_s + archive_s
+    return {
+        "engine": engine,
+        "format": archive_format,
+        "compact": compact,
+        "status": status,
+        "import_s": round(imported, 4),
+        "files": files,
+        "bytes": size,
+        "scan_s": round(scan_s, 4),
+        "archive_s": round(archive_s, 4),
+        "total_s": round(total, 4),
+        "files_per_s": round(files / total, 1) if total else None,
+        "mb_per_s": round(size / 1e6 / total, 2) if total else None,
+        "peak_rss_kb": _peak_rss_kb(),
+        "archive_bytes": archive_bytes,
+        "ratio": round(archive_bytes / size, 4) if size else None,
+    }
+
+
+def _run_in_child(engine, root, out_dir, archive_format="7z", compact=False):
+    command = [sys.executable, os.path.abspath(__file__), "--engine", engine, "--root", root, "--out-dir", out_dir,
+               "--format", archive_format] + (["--compact"] if compact else [])
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        # e.g. the GUI engine where tkinter is missing
+        error = (result.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"engine": engine, "format": archive_format, "compact": compact, "error": error}
+    return json.loads(result.stdout)
+
+
+# --- Template compaction of the text logs against LZMA on the raw text ---
+def compare_compaction(root):
+    # Every text log of the tree, compressed whole with LZMA at the presets of the
+    # "fast" and "strong" codecs, against compaction (collector_compact) followed by
+    # the same presets. Every compacted log is rebuilt and checked against its source.
+    import io
+    import lzma
+    from collector_compact import CompactingReader, compactable, rebuild
+    from collector_writers import CODECS
+    presets = {codec: CODECS[codec][0]['preset'] for codec in ("fast", "strong")}
+    files = size = compact_bytes = 0
+    compact_s = rebuild_s = 0.0
+    lossless = True
+    raw = {codec: [0, 0.0] for codec in presets}          # codec -> [bytes, seconds]
+    compacted = {codec: [0, 0.0] for codec in presets}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if not compactable(path):
+                continue
+            with open(path, "rb") as f:
+                text = f.read()
+            files += 1
+            size += len(text)
+            start = time.perf_counter()
+            data = CompactingReader(io.BytesIO(text)).read()
+            compact_s += time.perf_counter() - start
+            compact_bytes += len(data)
+            for codec, preset in presets.items():
+                for totals, source in ((raw, text), (compacted, data)):
+                    start = time.perf_counter()
+                    totals[codec][0] += len(lzma.compress(source, preset=preset))
+                    totals[codec][1] += time.perf_counter() - start
+            out = io.BytesIO()
+            start = time.perf_counter()
+            rebuild(io.BytesIO(data), out)
+            rebuild_s += time.perf_counter() - start
+            lossless = lossless and out.getvalue() == text
+
+    result = {"files": files, "bytes": size, "compact_bytes": compact_bytes, "compact_s": round(compact_s, 4),
+              "rebuild_s": round(rebuild_s, 4), "lossless": lossless}
+    for codec in presets:
+        raw_bytes, raw_s = raw[codec]
+        packed_bytes, packed_s = compacted[codec]
+        result[codec] = {
+            "lzma_bytes": raw_bytes,
+            "lzma_s": round(raw_s, 4),
+            "compact_lzma_bytes": packed_bytes,
+            # Compaction included: what the archiver spends on the text either way
+            "compact_lzma_s": round(compact_s + packed_s, 4),
+            "size_factor": round(raw_bytes / packed_bytes, 2) if packed_bytes else None,
+            "cpu_factor": round(raw_s / (compact_s + packed_s), 2) if compact_s + packed_s else None,
+        }
+    return result
+
+
+# --- Regressions against an earlier results file ---
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Results are matched by engine, archive format (7z in files older than --format)
+    # and compaction
+    def key(result):
+        return result["engine"], result.get("format", "7z"), result.get("compact", False)
+
+    previous = {key(r): r for r in baseline.get("results", []) if "error" not in r}
+    regressions = []
+    for result in results:
+        before = previous.get(key(result))
+        if before is None or "error" in result:
+            continue
+        for rate in ("files_per_s", "mb_per_s"):
+            if before.get(rate) and result.get(rate) is not None:
+                change = result[rate] / before[rate] - 1
+                if change < -threshold:
+                    regressions.append(f"{result['engine']} ({result.get('format', '7z')}"
+                                       f"{', compact' if result.get('compact') else ''}): "
+                                       f"{rate} {before[rate]} -> {result[rate]} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the log collector engines on a synthetic log tree")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"comma-separated, from {', '.join(ENGINES)}")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic tree (same seed, same tree)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies file counts and sizes")
+    parser.add_argument("--root", help="reuse (or keep) the synthetic tree in this folder")
+    parser.add_argument("--output", default="bench_results.json", help="where the JSON results are written")
+    parser.add_argument("--baseline", help="earlier results file; rates more than 10%% lower are reported")
+    parser.add_argument("--format", default="7z", help="comma-separated archive formats to time each engine with, "
+                                                       "from 7z, tar.zst, zip")
+    parser.add_argument("--compact", action="store_true",
+                        help="also time each engine with the text logs compacted, and compare compaction "
+                             "with LZMA on the raw text logs")
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.engine:
+        # Child process: one engine, result as JSON on stdout
+        print(json.dumps(run_engine(args.engine, args.root, args.out_dir, args.format, args.compact)))
+        return 0
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    formats = [fmt.strip() for fmt in args.format.split(",") if fmt.strip()]
+    root = args.root or tempfile.mkdtemp(prefix="log_collector_bench_")
+    out_dir = tempfile.mkdtemp(prefix="log_collector_bench_out_")
+    try:
+        os.makedirs(root, exist_ok=True)
+        if not os.listdir(root):
+            import collector_silent
+            layouts = [collector_silent.categories]
+            if "gui" in engines:
+                try:
+                    layouts.append(_profile_module("gui").categories)
+                except ImportError:
+                    pass
+            start = time.perf_counter()
+            build_tree(root, layouts, args.seed, args.scale)
+            print(f"Synthetic tree built in {time.perf_counter() - start:.1f}s: {root}", file=sys.stderr)
+        files, total = tree_size(root)
+
+        modes = (False, True) if args.compact else (False,)
+        results = [_run_in_child(engine, root, out_dir, fmt, compact)
+                   for engine in engines for fmt in formats for compact in modes
+                   if not (compact and engine == "gui")]
+        report = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "scale": args.scale,
+            "tree": {"files": files, "bytes": total},
+            "results": results,
+        }
+        if args.compact:
+            report["compaction"] = compare_compaction(root)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        for result in results:
+            print(json.dumps(result))
+        if args.compact:
+            print(json.dumps({"compaction": report["compaction"]}))
+
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            if (baseline.get("seed"), baseline.get("scale")) != (args.seed, args.scale):
+                print("Baseline was run on a different tree (seed/scale); rates are not comparable", file=sys.stderr)
+            regressions = compare(results, baseline)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            return 1 if regressions else 0
+        return 0
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
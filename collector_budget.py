@@ -0,0 +1,171 @@
+import os
+import re
+import shutil
+import logging
+from collections import namedtuple
+from collector_entries import COMPRESSED_EXTENSIONS, EntryList
+
+# Space always left free on the drive the archive is written to
+DISK_RESERVE = 512 * 1024 * 1024
+# Weight of a category missing from the weights table
+DEFAULT_WEIGHT = 1
+# Archive bytes per source byte assumed when checking the free space: logs shrink 5-20x
+# in practice; the already-compressed formats (COMPRESSED_EXTENSIONS) count in full
+ARCHIVE_RATIO = 0.25
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+# Preflight result: unique files and bytes (before compression), bytes per category,
+# and the expected size of the archive (archive_size)
+Estimate = namedtuple("Estimate", "files bytes by_category archive_bytes")
+
+
+# --- Parse "500M", "2G", "1.5g" or a plain byte count ---
+def parse_size(text):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?", text.strip(), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid size '{text}': use e.g. 500M or 2G")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+# --- Bytes an entry adds to the archive before compression, from stat data only ---
+def entry_size(entry):
+    if entry.max_bytes is not None:
+        return entry.max_bytes
+    if entry.record is not None:
+        return entry.record.size
+    try:
+        return os.path.getsize(entry.source)
+    except OSError:
+        return 0
+
+
+def _listed_size(entries, i):
+    # entry_size from the columns of an EntryList
+    max_bytes = entries.max_bytes[i]
+    if max_bytes >= 0:
+        return max_bytes
+    if entries.rel_starts[i] >= 0:
+        return entries.sizes[i]
+    try:
+        return os.path.getsize(entries.sources[i])
+    except OSError:
+        return 0
+
+
+def _listed_mtime(entries, i):
+    if entries.rel_starts[i] >= 0:
+        return entries.mtimes[i]
+    try:
+        return os.path.getmtime(entries.sources[i])
+    except OSError:
+        return 0
+
+
+# --- Expected bytes of a file once compressed, from its name and size only ---
+def archive_size(source, size):
+    if os.path.splitext(source)[1].lower() in COMPRESSED_EXTENSIONS:
+        return size
+    return int(size * ARCHIVE_RATIO)
+
+
+def _source_key(source):
+    return os.path.normcase(os.path.abspath(source))
+
+
+def _sources(entries):
+    # (source, size, category) per entry; an EntryList answers from its columns,
+    # without building the entries
+    if isinstance(entries, EntryList):
+        for i, source in enumerate(entries.sources):
+            yield source, _listed_size(entries, i), entries.category(i)
+    else:
+        for entry in entries:
+            yield entry.source, entry_size(entry), entry.category
+
+
+# --- Preflight estimate; a file collected under several categories counts once ---
+def estimate(entries):
+    seen = set()
+    total = packed = 0
+    by_category = {}
+    for source, size, category in _sources(entries):
+        key = _source_key(source)
+        if key in seen:
+            continue
+        seen.add(key)
+        total += size
+        packed += archive_size(source, size)
+        by_category[category] = by_category.get(category, 0) + size
+    return Estimate(len(seen), total, by_category, packed)
+
+
+# --- Room left on the output drive, keeping DISK_RESERVE free ---
+def disk_budget(output_dir, reserve=DISK_RESERVE):
+    try:
+        return max(shutil.disk_usage(output_dir).free - reserve, 0)
+    except OSError:
+        return None
+
+
+# --- Pick the entries that fit in the budget ---
+def apply_budget(entries, budget, weights=None, room=None):
+    # Returns (selected, left_out), both in their original order. budget caps the
+    # bytes before compression, room (the free space, see disk_budget) the expected
+    # archive size (archive_size); either may be None. Files are taken by category
+    # weight (highest first), then newest first; a file that does not fit is left
+    # out and smaller ones still get a chance. All entries of one source file (see
+    # collector_archive.Deduplicator) are kept or dropped together. selected is an
+    # EntryList.
+    entries = entries if isinstance(entries, EntryList) else EntryList(entries)
+    if budget is None and room is None:
+        return entries, []
+    weights = weights or {}
+
+    # Indexes per source file, first entry (the owner) first; priorities and sizes
+    # come from the list's columns
+    groups = {}
+    for index, source in enumerate(entries.sources):
+        groups.setdefault(_source_key(source), []).append(index)
+
+    def priority(group):
+        owner = group[0]
+        return -weights.get(entries.category(owner), DEFAULT_WEIGHT), -_listed_mtime(entries, owner)
+
+    used = packed = 0
+    keep = set()
+    for group in sorted(groups.values(), key=priority):
+        size = _listed_size(entries, group[0])
+        expected = archive_size(entries.sources[group[0]], size)
+        if (budget is None or used + size <= budget) and (room is None or packed + expected <= room):
+            used += size
+            packed += expected
+            keep.update(group)
+
+    selected = entries.select(keep)
+    left_out = [entries[index] for index in range(len(entries)) if index not in keep]
+    return selected, left_out
+
+
+# --- Preflight + selection, recorded in the run manifest ---
+def fit_to_budget(entries, budget, weights=None, manifest=None, output_dir=None):
+    # Returns the EntryList of the entries to archive. budget (None: no limit)
+    # applies to the bytes before compression; with output_dir, the free space of
+    # its drive only limits the expected archive size, so logs that fit once
+    # compressed are kept on a nearly full drive.
+    entries = EntryList(entries)
+    preflight = estimate(entries)
+    logging.info(f"Preflight: {preflight.files} file(s), {preflight.bytes} bytes before compression, "
+                 f"about {preflight.archive_bytes} bytes compressed")
+    room = disk_budget(output_dir) if output_dir is not None else None
+    if room is not None and preflight.archive_bytes <= room:
+        room = None
+    # Nothing to choose when everything fits (the usual case)
+    selected, left_out = entries, []
+    if (budget is not None and preflight.bytes > budget) or room is not None:
+        selected, left_out = apply_budget(entries, budget, weights, room)
+    if left_out:
+        logging.info(f"Size budget reached: {len(left_out)} file(s) left out")
+    if manifest is not None:
+        manifest.record_budget(preflight, budget, left_out, room)
+    return selected
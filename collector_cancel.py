@@ -0,0 +1,83 @@
+import os
+import re
+import time
+import threading
+
+# Extra time a cancelled run gets to close the archive before the watchdog ends the process
+CANCEL_GRACE = 30
+
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*([smhdw]?)", re.IGNORECASE)
+
+
+class Cancelled(Exception):
+    pass
+
+
+# --- Cooperative cancellation shared by every collection stage ---
+class CancelToken:
+    # Cancelled explicitly (GUI closed during a collection) or once its deadline
+    # passes (run_silent --timeout). Scanners and exporters check it between files,
+    # the archive readers between chunks, so even a large file stops promptly.
+
+    def __init__(self, timeout=None):
+        self._event = threading.Event()
+        self.reason = None
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+        return self._event.is_set()
+
+    def check(self):
+        if self.cancelled():
+            raise Cancelled(self.reason)
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def wait(self, timeout):
+        # Sleeps up to timeout seconds; True if cancelled meanwhile
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled()
+
+
+# --- Parse "90", "90s", "30m", "2h", "7d" or "2w" into seconds ---
+def parse_duration(text, unit_required=False):
+    # The one duration format: --timeout, and the ages of --since and the profile
+    # (collector_scan.parse_age, where the unit is required)
+    match = _DURATION.fullmatch(text.strip())
+    if not match or (unit_required and not match.group(2)):
+        raise ValueError(f"invalid duration '{text}': use e.g. 90s, 30m, 2h or 7d")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+
+# --- Hard stop for a run whose I/O is stuck and never reaches a cancellation check ---
+def start_watchdog(token, exit_code, cleanup=None, grace=CANCEL_GRACE):
+    # Once the token's deadline plus grace has passed, cleanup() runs (e.g. removes
+    # the partial archive) and the process exits with exit_code.
+    if token.deadline is None:
+        return None
+
+    def watch():
+        time.sleep(token.remaining() + grace)
+        try:
+            if cleanup:
+                cleanup()
+        finally:
+            os._exit(exit_code)
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
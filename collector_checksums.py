@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import argparse
+import datetime
+import hashlib
+from collector_writers import archive_format, read_member
+
+# Where an archive lists the length and hash of every file it stores
+CHECKSUMS_NAME = "checksums.json"
+CHECKSUMS_VERSION = 1
+# The content hash of collector_archive.new_hash
+HASH_NAME = "blake2b-128"
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _name(arcname):
+    # 7z, zip and tar all list their members with forward slashes
+    return arcname.replace("\\", "/")
+
+
+def _hash_stream(f):
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+        h.update(chunk)
+        size += len(chunk)
+    return size, h.hexdigest()
+
+
+# --- Length and hash of each stored file, taken from the archiver's own read ---
+class Checksums:
+    # record() is write_file's on_stored callback: nothing is read a second time.
+    # A source whose size or modification time moved while it was read is listed
+    # under "changed": its copy may mix old and new content.
+
+    def __init__(self):
+        self.files = {}     # arcname -> [size, digest]
+        self.changed = []
+
+    def record(self, arcname, size, digest, changed):
+        self.files[_name(arcname)] = [size, digest]
+        if changed:
+            self.changed.append(_name(arcname))
+
+    def __bool__(self):
+        return bool(self.files)
+
+    def index(self):
+        return json.dumps({
+            "version": CHECKSUMS_VERSION,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "hash": HASH_NAME,
+            "files": self.files,
+            "changed": self.changed,
+        }, indent=1).encode("utf-8")
+
+
+# --- Check an archive against the checksums it carries ---
+def _stored(path):
+    # (name, size, digest) of every member, reading the archive once. A 7z has a
+    # CRC per file, checked by py7zr as it decompresses: its digests are None.
+    fmt = archive_format(path) or "7z"
+    if fmt == "zip":
+        import zipfile
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as f:
+                        yield (info.filename, *_hash_stream(f))
+    elif fmt == "tar.zst":
+        import tarfile
+        import pyzstd
+        with pyzstd.ZstdFile(path) as raw, tarfile.open(fileobj=raw, mode="r|") as archive:
+            for member in archive:
+                if member.isfile():
+                    yield (member.name, *_hash_stream(archive.extractfile(member)))
+    else:
+        import py7zr
+        with py7zr.SevenZipFile(path, 'r') as archive:
+            files = [(info.filename, info.uncompressed) for info in archive.list() if not info.is_directory]
+            bad = archive.testzip()
+            if bad is not None:
+                raise ValueError(f"CRC error in {bad}")
+        for name, size in files:
+            yield name, size, None
+
+
+def verify(path):
+    # Returns a report; "ok" is False if the archive cannot be read to its end,
+    # has no checksums, or a listed file is missing or differs
+    report = {"archive": path, "ok": False, "files": 0, "missing": [], "wrong_size": [], "wrong_hash": [],
+              "changed_while_read": [], "error": None}
+    try:
+        data = read_member(path, CHECKSUMS_NAME)
+        if data is None:
+            report["error"] = f"no {CHECKSUMS_NAME} in the archive"
+            return report
+        checksums = json.loads(data)
+        expected = checksums["files"]
+        report["changed_while_read"] = checksums.get("changed", [])
+        seen = set()
+        for name, size, digest in _stored(path):
+            if name not in expected:
+                continue
+            seen.add(name)
+            report["files"] += 1
+            if size != expected[name][0]:
+                report["wrong_size"].append(name)
+            elif digest is not None and digest != expected[name][1]:
+                report["wrong_hash"].append(name)
+        report["missing"] = sorted(set(expected) - seen)
+    except Exception as e:
+        # Truncated or corrupted beyond what the format can read
+        report["error"] = f"{type(e).__name__}: {e}"
+        return report
+    report["ok"] = not (report["missing"] or report["wrong_size"] or report["wrong_hash"])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a collector archive against the checksums stored in it")
+    parser.add_argument("archive", help="the .7z, .zip or .tar.zst written by a collector")
+    parser.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    args = parser.parse_args(argv)
+    report = verify(args.archive)
+    if args.json:
+        print(json.dumps(report, indent=1))
+    else:
+        print(f"{os.path.basename(args.archive)}: {'OK' if report['ok'] else 'FAILED'}, {report['files']} file(s) checked")
+        if report["error"]:
+            print(f"  {report['error']}")
+        for key in ("missing", "wrong_size", "wrong_hash", "changed_while_read"):
+            for name in report[key]:
+                print(f"  {key.replace('_', ' ')}: {name}")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
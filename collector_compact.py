@@ -0,0 +1,363 @@
+import io
+import os
+import re
+import sys
+import json
+import array
+import argparse
+import hashlib
+from collections import Counter
+from collector_scan import FileMatcher
+
+# Where an archive lists the logs it stored compacted
+COMPACT_INDEX_NAME = "compacted_entries.json"
+# A compacted log is stored under its own name plus this; main() rebuilds the text
+COMPACT_SUFFIX = ".lct"
+# Logs compacted when compaction is on; anything else is stored as it is
+COMPACT_FILES = ("*.log", "*.txt")
+# Templates kept per file (ids are 16 bits); a block that needs more is stored as it is
+MAX_TEMPLATES = 65536
+
+_MAGIC = b"LCT1\n"
+_CHUNK_SIZE = 1024 * 1024
+# A "line" longer than this is cut, so one endless line cannot grow the buffer
+_MAX_LINE = 1024 * 1024
+# The parameters of a line: runs of GUIDs, hex and decimal numbers (what
+# collector_index masks in its signatures); everything between them is the line's
+# template. Python's re costs about a microsecond a match, more than LZMA takes for
+# the bytes it saves, so it is only used on blocks with a GUID or hex number in
+# them: in the others the parameters are the runs of digits, found by
+# bytes.translate and split, at C speed.
+_PARAMETER = re.compile(rb"(?:\{?[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\}?|"
+                        rb"0x[0-9a-fA-F]+|\d+)+")
+_GUID_HINT = re.compile(rb"-[0-9a-fA-F]{4}-")
+# Stands for a parameter in a template, a run of them for a run of digits; a block
+# whose text has this byte (UTF-16, binary data) is stored as it is
+_SLOT = b"\x00"
+_SLOTS = re.compile(rb"\x00+")
+_DIGITS = b"0123456789"
+_DIGITS_ONLY = bytes(b if b in _DIGITS else 32 for b in range(256))
+_DIGITS_TO_SLOT = bytes(0 if b in _DIGITS else b for b in range(256))
+# Block kinds
+_RAW = 0
+_TEMPLATED = 1
+_END = 2
+
+_COMPACT_MATCHER = FileMatcher(list(COMPACT_FILES))
+
+
+def compactable(path):
+    return _COMPACT_MATCHER.matches(path, os.path.basename(path))
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _sized(data):
+    return _varint(len(data)) + data
+
+
+def _ids_bytes(ids):
+    # Template ids are stored little-endian, whatever the machine
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids.tobytes()
+
+
+# --- File wrapper that stores a text log as templates and parameter columns ---
+class CompactingReader(io.BufferedIOBase):
+    # Reads raw forward a chunk of whole lines at a time; each chunk becomes one block.
+    # A line is split at its parameters (_PARAMETER): what is left is its template,
+    # stored once per file, the first time a block uses it. A block then holds the
+    # template id of each line, and the parameters of its lines column by column,
+    # per template: the 3rd number of every "Job # finished in # ms" line, then the
+    # 4th... The archiver only sees about half of the text, so a strong LZMA preset
+    # takes a third of the time, for an archive a few percent larger (the README has
+    # the benchmark; compaction is off by default for that). The stream ends with
+    # the length and hash of the text, which rebuild() checks. Like FilteringReader,
+    # the size it reports is size_hint (the source size).
+    # lines, templates, raw_blocks, size (text bytes read) and bytes (bytes
+    # produced) describe the result once read to the end.
+
+    def __init__(self, raw, size_hint=0, chunk_size=_CHUNK_SIZE):
+        self._raw = raw
+        self._size_hint = size_hint
+        self._chunk_size = chunk_size
+        self._templates = {}    # template -> id
+        self._slots = []        # id -> parameters per line
+        self._pieces = self._generate()
+        self._buffer = bytearray()
+        self._pos = 0
+        self._at_end = False
+        self.lines = 0
+        self.raw_blocks = 0
+        self.size = 0
+        self.bytes = 0
+
+    @property
+    def templates(self):
+        return len(self._slots)
+
+    def _chunks(self):
+        # Whole lines, a chunk at a time; unlike FilteringReader nothing is added,
+        # so the chunks put back together are the text
+        carry = b""
+        while True:
+            data = self._raw.read(self._chunk_size)
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                if len(data) <= _MAX_LINE:
+                    carry = data
+                    continue
+                cut = len(data)
+            carry = data[cut:]
+            yield data[:cut]
+        if carry:
+            yield carry
+
+    def _raw_block(self, chunk):
+        self.raw_blocks += 1
+        return bytes([_RAW]) + _sized(chunk)
+
+    def _block(self, chunk):
+        if _SLOT in chunk:
+            return self._raw_block(chunk)
+        # Parameters and templates come from whole-chunk passes; Python only looks
+        # up one template per line
+        if b"0x" in chunk or _GUID_HINT.search(chunk):
+            values = _PARAMETER.findall(chunk)
+            skeleton = _PARAMETER.sub(_SLOT, chunk)
+        else:
+            # A number keeps its width in the template: "# ms" and "## ms" are two templates
+            values = chunk.translate(_DIGITS_ONLY).split()
+            skeleton = chunk.translate(_DIGITS_TO_SLOT)
+        lines = skeleton.split(b"\n")
+        templates = self._templates
+        slots = self._slots
+        ids = array.array('H')
+        rows = {}   # id -> parameters of its lines, line by line
+        new = []
+        pos = 0
+        for line in lines:
+            t = templates.get(line)
+            if t is None:
+                if len(slots) >= MAX_TEMPLATES:
+                    for template in new:
+                        del templates[template]
+                    del slots[len(slots) - len(new):]
+                    return self._raw_block(chunk)
+                t = templates[line] = len(slots)
+                slots.append(len(_SLOTS.findall(line)))
+                new.append(line)
+            ids.append(t)
+            k = slots[t]
+            if k:
+                row = rows.get(t)
+                if row is None:
+                    row = rows[t] = []
+                row.extend(values[pos:pos + k])
+                pos += k
+        columns = []
+        for t in sorted(rows):
+            row = rows[t]
+            k = slots[t]
+            for j in range(k):
+                columns.extend(row[j::k])
+        # Parameters never hold a newline: one column follows the other, a value per line
+        return b"".join([bytes([_TEMPLATED]), _varint(len(new)), *map(_sized, new), _varint(len(ids)),
+                         _ids_bytes(ids), _sized(b"\n".join(columns))])
+
+    def _generate(self):
+        yield _MAGIC
+        digest = hashlib.blake2b(digest_size=16)
+        for chunk in self._chunks():
+            digest.update(chunk)
+            self.size += len(chunk)
+            self.lines += chunk.count(b"\n")
+            yield self._block(chunk)
+        yield bytes([_END]) + _varint(self.size) + digest.digest()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            self._buffer += piece
+            self.bytes += len(piece)
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Only the size probe of the archiver (to the end and back) is supported
+        if whence == io.SEEK_END:
+            self._at_end = True
+            return self._size_hint + offset
+        if whence == io.SEEK_SET and offset == self._pos:
+            self._at_end = False
+            return offset
+        raise io.UnsupportedOperation("a compacted log can only be read forward")
+
+    def tell(self):
+        return self._size_hint if self._at_end else self._pos
+
+
+# --- Text of a compacted log ---
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated compacted log")
+    return data
+
+
+def _read_varint(f):
+    n = shift = 0
+    while True:
+        byte = _read_exact(f, 1)[0]
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n
+        shift += 7
+
+
+def rebuild(src, out):
+    # Writes the text of the compacted stream src (file objects) to out and returns
+    # its length; ValueError if src is not a compacted log, or the text does not
+    # match the length and hash src ends with
+    if src.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("not a compacted log")
+    templates = []
+    formats = []    # id -> template as a %-format, None without parameters
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    while True:
+        kind = _read_exact(src, 1)[0]
+        if kind == _END:
+            if _read_varint(src) != size or _read_exact(src, 16) != digest.digest():
+                raise ValueError("rebuilt text does not match the original")
+            return size
+        if kind == _RAW:
+            text = _read_exact(src, _read_varint(src))
+        elif kind == _TEMPLATED:
+            for _ in range(_read_varint(src)):
+                template = _read_exact(src, _read_varint(src))
+                templates.append(template)
+                formats.append(_SLOTS.sub(b"%s", template.replace(b"%", b"%%")) if _SLOT in template else None)
+            ids = array.array('H')
+            ids.frombytes(_read_exact(src, 2 * _read_varint(src)))
+            if sys.byteorder == "big":
+                ids.byteswap()
+            data = _read_exact(src, _read_varint(src))
+            values = data.split(b"\n") if data else []
+            rows = {}
+            pos = 0
+            try:
+                for t, n in sorted(Counter(ids).items()):
+                    if formats[t] is not None:
+                        k = len(_SLOTS.findall(templates[t]))
+                        rows[t] = iter(zip(*(values[pos + j * n:pos + (j + 1) * n] for j in range(k))))
+                        pos += n * k
+                text = b"\n".join([formats[t] % next(rows[t]) if formats[t] is not None else templates[t]
+                                   for t in ids])
+            except (IndexError, StopIteration, TypeError):
+                raise ValueError("corrupted compacted log") from None
+        else:
+            raise ValueError(f"unknown block kind {kind}")
+        digest.update(text)
+        size += len(text)
+        out.write(text)
+
+
+# --- What the archive records about the logs it stored compacted ---
+class CompactIndex:
+
+    def __init__(self):
+        self.files = {}     # arcname -> sizes and counts
+
+    def record(self, arcname, reader):
+        self.files[arcname] = {
+            "size": reader.size,
+            "compact_size": reader.bytes,
+            "lines": reader.lines,
+            "templates": reader.templates,
+            "raw_blocks": reader.raw_blocks,
+        }
+
+    def __bool__(self):
+        return bool(self.files)
+
+    def index(self):
+        return json.dumps({"suffix": COMPACT_SUFFIX, "files": self.files}, indent=1).encode("utf-8")
+
+
+def _rebuild_file(path, target, remove=False):
+    partial = target + ".partial"
+    try:
+        with open(path, 'rb') as src, open(partial, 'wb') as out:
+            size = rebuild(io.BufferedReader(src, _CHUNK_SIZE), out)
+        os.replace(partial, target)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    if remove:
+        os.remove(path)
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Rebuild the text of the logs a collector stored compacted "
+                                                 f"(*{COMPACT_SUFFIX})")
+    parser.add_argument("paths", nargs="+",
+                        help=f"compacted logs, or folders (an extracted archive) to rebuild every *{COMPACT_SUFFIX} in")
+    parser.add_argument("-o", "--output", help="where the text goes, for a single compacted log "
+                                               f"(default: its name without {COMPACT_SUFFIX})")
+    parser.add_argument("--remove", action="store_true",
+                        help="delete each compacted log once its text is rebuilt and checked")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.endswith(COMPACT_SUFFIX)]
+        else:
+            files.append(path)
+    if args.output and len(files) != 1:
+        parser.error("--output needs exactly one compacted log")
+
+    failed = 0
+    for path in files:
+        target = args.output or (path[:-len(COMPACT_SUFFIX)] if path.endswith(COMPACT_SUFFIX) else path + ".txt")
+        try:
+            size = _rebuild_file(path, target, args.remove)
+        except (OSError, ValueError) as e:
+            print(f"{path}: FAILED, {e}")
+            failed += 1
+        else:
+            print(f"{target}: {size} bytes")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,334 +1,428 @@
-import os
-import shutil
-import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-import logging
-import datetime
-import sys
-import ctypes
-import platform
-import tempfile
-import pythoncom
-import win32com.client
-import py7zr
-from functools import partial
-
-EXCLUDE_EXTENSIONS = tuple(ext.lower() for ext in ('.dll', '.exe', '.bin', '.msi', '.dat', '.rar', '.gz','cab'))
-MAX_FILE_SIZE = 8 * 1024 * 1024  # 8 MB in bytes
-
-# --- Get user's Desktop path ---
-def get_desktop_path():
-    pythoncom.CoInitialize()
-    shell = win32com.client.Dispatch("WScript.Shell")
-    return shell.SpecialFolders("Desktop")
-
-# --- Setup Logging ---
-desktop_path = get_desktop_path()
-log_file = os.path.join(desktop_path, "N-Able_LogCollector.log")
-if not logging.getLogger().hasHandlers():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, mode='a', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-
-# --- Global control flags ---
-is_collecting = False
-current_temp_dir = None
-
-# --- Check for administrator privileges ---
-def is_admin():
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
-
-# --- Exclusion helper ---
-def is_excluded_file(file_path):
-    return file_path.lower().endswith(EXCLUDE_EXTENSIONS)
-
-# --- Log categories and paths ---
-categories = {
-    "Automation Manager": [
-        os.path.expandvars(r"C:\Program Files (x86)\N-able Technologies\AutomationManager\logs"),
-        os.path.expandvars(r"C:\Program Files (x86)\Advanced Monitoring Agent\scriptrunner"),
-        os.path.expandvars(r"C:\ProgramData\N-able Technologies\AutomationManager\log"),
-        os.path.expandvars(r"C:\ProgramData\N-able Technologies\AutomationManager\scripts"),
-    ],
-    "MSP Core": [
-        os.path.expandvars(r"C:\Program Files (x86)\Msp Agent\logs"),
-    ],
-    "Vulnerability Management": [
-        os.path.expandvars(r"C:\Program Files (x86)\Msp Agent\Components\software-scanner"),
-        os.path.expandvars(r"C:\ProgramData\N-able Technologies\Vulnerability Management\logs"),
-    ],
-    "Take Control Console": [
-        os.path.expandvars(r"%LOCALAPPDATA%\BeAnywhere Support Express\Console\Logs"),
-    ],
-    "Take Control StandAlone Agent": [
-        os.path.expandvars(r"%ALLUSERSPROFILE%\GetSupportService\Logs"),
-    ],
-    "N-sight Agent": [
-        os.path.expandvars(r"C:\Program Files (x86)\Advanced Monitoring Agent"),
-        os.path.expandvars(r"C:\Program Files (x86)\Advanced Monitoring Agent GP"),
-        os.path.expandvars(r"%ProgramData%\MspPlatform\PME\log"),
-        os.path.expandvars(r"%ProgramData%\MspPlatform\FileCacheServiceAgent\log"),
-        os.path.expandvars(r"%ProgramData%\MspPlatform\PME.Agent.PmeService\log"),
-        os.path.expandvars(r"%ProgramData%\MspPlatform\RequestHandlerAgent\log"),
-        os.path.expandvars(r"%ProgramData%\AdvancedMonitoringAgentWebProtection"),
-        os.path.expandvars(r"%ProgramData%\AdvancedMonitoringAgentNetworkManagement"),
-        os.path.expandvars(r"%ProgramData%\GetSupportService_LOGICnow"),
-    ],
-    "Event Logs": [],
-    "Take Control Viewer": [
-        os.path.expandvars(r"%LOCALAPPDATA%\Take Control Viewer\Logs"),
-    ],
-}
-
-# --- Generate archive name ---
-def generate_archive_name():
-    hostname = platform.node()
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"N-Able_Logs_{hostname}_{timestamp}.7z"
-
-# --- Copy files/folders for a category ---
-def copy_selected_items_for_category(category, destination_folder, exclude_large_files=False):
-    paths = categories.get(category, [])
-    copied = False
-    temp_subfolder = tempfile.mkdtemp()
-
-    for path in paths:
-        try:
-            if os.path.isfile(path):
-                if is_excluded_file(path):
-                    continue
-                if exclude_large_files and os.path.getsize(path) > MAX_FILE_SIZE:
-                    logging.info(f"[{category}] Skipped large file: {path}")
-                    continue
-                os.makedirs(temp_subfolder, exist_ok=True)
-                shutil.copy2(path, temp_subfolder)
-                logging.info(f"[{category}] Copied file: {path}")
-                copied = True
-            elif os.path.isdir(path):
-                def ignore_func(dir_path, dir_names):
-                    ignored = []
-
-                    # Exclude files by extension
-                    for f in list(dir_names):
-                        if is_excluded_file(f):
-                            ignored.append(f)
-                    return ignored
-                
-                # Preserve full path relative to the root of the drive (e.g., from C:\)
-                drive, _ = os.path.splitdrive(path)
-                rel_path = os.path.relpath(path, start=drive + os.sep)
-                dest = os.path.join(temp_subfolder, drive.strip(":") + os.sep + rel_path)
-                shutil.copytree(path, dest, dirs_exist_ok=True, ignore=ignore_func)
-                
-                if exclude_large_files:
-                    for root, _, files in os.walk(dest):
-                        for f in files:
-                            fpath = os.path.join(root, f)
-                            try:
-                                if os.path.getsize(fpath) > MAX_FILE_SIZE:
-                                    os.remove(fpath)
-                                    logging.info(f"[{category}] Removed large file: {fpath}")
-                            except Exception as e:
-                                logging.warning(f"Error checking/removing file {fpath}: {e}")
-                
-                logging.info(f"[{category}] Copied folder: {path} to {dest}")
-                copied = True
-        except Exception as e:
-            logging.warning(f"[{category}] Could not copy {path}: {e}")
-
-    if copied:
-        safe_category = category.replace(" ", "_").replace("-", "_")
-        final_folder = os.path.join(destination_folder, safe_category)
-        os.makedirs(final_folder, exist_ok=True)
-        for item in os.listdir(temp_subfolder):
-            shutil.move(os.path.join(temp_subfolder, item), final_folder)
-
-    shutil.rmtree(temp_subfolder, ignore_errors=True)
-    return copied
-
-# --- Export Windows Event Logs ---
-def export_event_logs(destination_folder):
-    try:
-        temp_dir = tempfile.mkdtemp()
-        logs = ["System", "Application", "Security"]
-        files_exported = 0
-
-        for logname in logs:
-            outfile = os.path.join(temp_dir, f"{logname}.evtx")
-            result = os.system(f'wevtutil epl {logname} "{outfile}"')
-            if result != 0:
-                logging.error(f"Failed to export log: {logname}")
-                continue
-            if os.path.isfile(outfile):
-                eventlogs_dir = os.path.join(destination_folder, "EventLogs")
-                os.makedirs(eventlogs_dir, exist_ok=True)
-                shutil.move(outfile, os.path.join(eventlogs_dir, f"{logname}.evtx"))
-                logging.info(f"Exported event log: {logname}")
-                files_exported += 1
-
-        shutil.rmtree(temp_dir)
-        return files_exported > 0
-    except Exception as e:
-        logging.error(f"Failed to export Event Logs: {e}", exc_info=True)
-        messagebox.showerror("Error", f"Fail to export Event Logs: {e}")
-        return False
-
-# --- Create 7z archive ---
-def create_7z_archive(source_folder, archive_path):
-    try:
-        if not has_valid_files(source_folder):
-            logging.warning("Nothing to archive: source folder is empty or no valid files.")
-            return False
-        with py7zr.SevenZipFile(archive_path, 'w', filters=[{'id': py7zr.FILTER_LZMA2, 'preset': 1}]) as archive:
-            archive.writeall(source_folder, arcname=platform.node())
-        return True
-    except Exception as e:
-        logging.error(f"Failed to create archive: {e}")
-        return False
-
-# --- Check if folder has valid files ---
-def has_valid_files(folder):
-    for root, _, files in os.walk(folder):
-        if any(not f.lower().endswith(EXCLUDE_EXTENSIONS) for f in files):
-            return True
-    return False
-
-# --- Preload N-sight Agent ---
-preloaded_n_sight_dir = tempfile.mkdtemp()
-
-def preload_n_sight_agent():
-    logging.info("Preloading N-sight Agent logs...")
-    copy_selected_items_for_category("N-sight Agent", preloaded_n_sight_dir)
-    logging.info("N-sight Agent preload complete.")
-
-# --- Collect logs ---
-def collect_logs(progress_bar, progress_label, checkboxes):
-    global is_collecting, current_temp_dir
-    is_collecting = True
-    progress_bar["value"] = 0
-    progress_label.config(text="0%")
-    selected = [cat for cat, var in checkboxes.items() if var.get()]
-    if not selected:
-        messagebox.showinfo("Info", "No category selected.")
-        is_collecting = False
-        return
-
-    total = len(selected)
-    step = 100 / total
-    current_temp_dir = tempfile.mkdtemp()
-    temp_dir = current_temp_dir
-    archive_path = os.path.join(desktop_path, generate_archive_name())
-
-    logging.info(f"Selected categories: {selected}")
-    logging.info(f"Temporary directory: {temp_dir}")
-    files_copied = False
-
-    for i, category in enumerate(selected):
-        if category == "Event Logs":
-            if export_event_logs(temp_dir):
-                files_copied = True
-        elif category == "N-sight Agent":
-            preload_dest = os.path.join(temp_dir, "N_sight_Agent")
-            os.makedirs(preload_dest, exist_ok=True)
-            for item in os.listdir(preloaded_n_sight_dir):
-                src = os.path.join(preloaded_n_sight_dir, item)
-                dst = os.path.join(preload_dest, item)
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(src, dst)
-            if has_valid_files(preload_dest):
-                files_copied = True
-            else:
-                logging.warning("N-sight Agent: No valid files found in preloaded data.")
-        else:
-            # Always exclude large files except for Event Logs (already handled)
-            if copy_selected_items_for_category(category, temp_dir, exclude_large_files=True):
-                files_copied = True
-
-        percent = int((i + 1) * step)
-        progress_bar.after(0, partial(progress_bar.config, value=percent))
-        progress_label.after(0, partial(progress_label.config, text=f"{percent}%"))
-
-    if not has_valid_files(temp_dir):
-        messagebox.showinfo("Info", "No files or folders found. Archive not created.")
-    else:
-        if create_7z_archive(temp_dir, archive_path):
-            messagebox.showinfo("Success", f"Archive created: {archive_path}")
-        else:
-            messagebox.showerror("Error", "Failed to create .7z archive")
-
-    progress_bar.after(0, lambda: progress_bar.config(value=0))
-    progress_label.after(0, lambda: progress_label.config(text="0%"))
-    is_collecting = False
-    current_temp_dir = None
-    shutil.rmtree(temp_dir, ignore_errors=True)
-
-# --- Start log collection in a thread ---
-def start_collection(progress_bar, progress_label, checkboxes, collect_btn):
-    collect_btn.config(state="disabled")
-    def run():
-        collect_logs(progress_bar, progress_label, checkboxes)
-        progress_bar.after(0, lambda: collect_btn.config(state="normal"))
-    threading.Thread(target=run, daemon=True).start()
-
-# --- Create GUI ---
-def create_gui():
-    root = tk.Tk()
-    root.title("N-Able Log Collector")
-    root.geometry("320x370")
-
-    def on_closing():
-        global is_collecting, current_temp_dir
-        if is_collecting:
-            if messagebox.askyesno("Collecting logs", "Logs are still being collected. Do you want to force exit?"):
-                logging.warning("User closed the application during log collection. Archive creation incomplete.")
-                is_collecting = False
-                if current_temp_dir and os.path.isdir(current_temp_dir):
-                    shutil.rmtree(current_temp_dir, ignore_errors=True)
-                root.destroy()
-        else:
-            if messagebox.askokcancel("Quit", "Do you want to exit the Log Collector?"):
-                root.destroy()
-
-    root.protocol("WM_DELETE_WINDOW", on_closing)
-
-    admin_status = "Yes" if is_admin() else "No"
-    tk.Label(root, text=f"Administrator privileges: {admin_status}", fg="green" if is_admin() else "red").grid(row=0, column=0, columnspan=2, pady=5)
-    tk.Label(root, text="Select log categories to collect:").grid(row=1, column=0, columnspan=2, pady=5)
-
-    checkboxes = {}
-    for i, category in enumerate(categories):
-        var = tk.BooleanVar()
-        tk.Checkbutton(root, text=category, variable=var).grid(row=i+2, column=0, sticky="w", padx=20)
-        checkboxes[category] = var
-
-    progress_bar = ttk.Progressbar(root, length=300, mode="determinate")
-    progress_bar.grid(row=len(categories)+2, column=0, columnspan=2, pady=10, padx=(10, 0))
-
-    progress_label = tk.Label(root, text="0%")
-    progress_label.grid(row=len(categories)+3, column=0, columnspan=2)
-
-    collect_btn = tk.Button(root, text="Collect Logs")
-    collect_btn.config(command=lambda: start_collection(progress_bar, progress_label, checkboxes, collect_btn))
-    collect_btn.grid(row=len(categories)+4, column=0, columnspan=2, pady=10)
-
-    threading.Thread(target=preload_n_sight_agent, daemon=True).start()
-
-    root.mainloop()
-
-# --- Main ---
-if __name__ == "__main__":
-    logging.info(f"Running with administrator privileges: {'Yes' if is_admin() else 'No'}")
-    create_gui()
-#
-
+import os
+import time
+# Startup is measured from here (before the other imports) to the window shown
+started = time.perf_counter()
+import shutil
+import tkinter as tk
+from tkinter import ttk, messagebox
+import threading
+import logging
+import datetime
+import sys
+import ctypes
+import platform
+import tempfile
+import importlib
+from functools import lru_cache, partial
+from collector_budget import fit_to_budget
+from collector_cancel import CancelToken
+from collector_entries import ArchiveEntry
+from collector_filter import filter_for
+from collector_prefetch import ScanPrefetcher
+from collector_profile import DEFAULT_PROFILE, Profile, load_profile
+from collector_scan import SKIP_TOO_LARGE, SKIP_UNREADABLE, scan_many, time_window
+# The archive pipeline (collector_archive: writers, index, compaction), the manifest
+# and the event log export are imported by the collection itself, and ahead of it
+# by warm_up once the window is shown
+
+MANIFEST_NAME = "N-Able_LogCollector_manifest.json"
+# Codec for logs (LZMA2 preset 1); already-compressed and high-entropy files are stored
+COMPRESSION_CODEC = "fast"
+# Size budget for one collection (None: only limited by the free space on the Desktop drive)
+MAX_TOTAL_SIZE = None
+# Threads listing folders in parallel (None: CPU count + 4, max 32)
+SCAN_WORKERS = None
+# Seconds a force-close waits for the collection to stop and clean up
+CANCEL_TIMEOUT = 10
+# Milliseconds between checks of a stopping collection
+CANCEL_POLL_INTERVAL = 100
+# Seconds from import to the window being shown; slower starts are logged as warnings
+STARTUP_TARGET = 1.0
+# Time window choices offered in the GUI, as --since values
+TIME_WINDOWS = {
+    "All time": None,
+    "Last 24 hours": "24h",
+    "Last 48 hours": "48h",
+    "Last 7 days": "7d",
+}
+
+# Shell folder id of the (possibly redirected) Desktop, for SHGetFolderPathW
+CSIDL_DESKTOPDIRECTORY = 0x10
+
+# --- Get user's Desktop path ---
+@lru_cache(maxsize=None)
+def get_desktop_path():
+    # Shell API through ctypes (no COM, follows a redirected Desktop); WScript.Shell
+    # only if that fails, then %USERPROFILE%\Desktop. Resolved once per run.
+    try:
+        buf = ctypes.create_unicode_buffer(260)
+        if ctypes.windll.shell32.SHGetFolderPathW(None, CSIDL_DESKTOPDIRECTORY, None, 0, buf) == 0 and buf.value:
+            return buf.value
+    except Exception:
+        pass
+    try:
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        return win32com.client.Dispatch("WScript.Shell").SpecialFolders("Desktop")
+    except Exception:
+        return os.path.join(os.path.expanduser("~"), "Desktop")
+
+# --- Setup Logging ---
+def setup_logging():
+    # The log file is only created by the first message (delay=True)
+    if logging.getLogger().hasHandlers():
+        return
+    log_file = os.path.join(get_desktop_path(), "N-Able_LogCollector.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, mode='a', encoding='utf-8', delay=True),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+# --- Global control flags ---
+is_collecting = False
+current_archive_path = None
+current_cancel = None
+collection_thread = None
+
+# --- Check for administrator privileges ---
+def is_admin():
+    try:
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+# --- Log categories, paths and file rules from the collection profile ---
+def use_profile(profile):
+    # The built-in profile until main loads collector_profile.json, if there is one
+    global categories, CATEGORY_RULES, DEFAULT_RULES, CATEGORY_WEIGHTS, CATEGORY_FILTERS, EVENT_CATEGORIES
+    categories = profile.category_paths()
+    CATEGORY_RULES = profile.rules()
+    DEFAULT_RULES = profile.default_rules
+    CATEGORY_WEIGHTS = profile.weights()
+    CATEGORY_FILTERS = profile.filters()
+    EVENT_CATEGORIES = profile.event_categories()
+
+use_profile(Profile(DEFAULT_PROFILE))
+
+# --- Generate archive name ---
+def generate_archive_name(suffix=""):
+    hostname = platform.node()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"N-Able_Logs_{hostname}_{timestamp}{suffix}.7z"
+
+# --- Enumerate files for a category ---
+def iter_category_files(category, window=None, cancel=None):
+    # Yields (FileRecord, path inside the category folder of the archive). The folders
+    # are listed in parallel (collector_scan.scan_many), so a big category uses every worker.
+    def on_skip(path, reason):
+        if reason == SKIP_TOO_LARGE:
+            logging.info(f"[{category}] Skipped large file: {path}")
+        elif reason == SKIP_UNREADABLE:
+            logging.warning(f"[{category}] Could not read {path}")
+
+    bases = {}
+    for path in categories.get(category, []):
+        if os.path.isdir(path):
+            # Preserve full path relative to the root of the drive (e.g., from C:\)
+            drive, _ = os.path.splitdrive(path)
+            rel_path = os.path.relpath(path, start=drive + os.sep)
+            bases[path] = os.path.join(drive.strip(":"), rel_path)
+        else:
+            bases[path] = ""
+    for path, record in scan_many(bases, SCAN_WORKERS, rules=CATEGORY_RULES.get(category, DEFAULT_RULES), on_skip=on_skip,
+                                  window=window, cancel=cancel):
+        yield record, os.path.join(bases[path], record.rel_path)
+
+# --- Archive entries for a category (read straight from the sources) ---
+def copy_selected_items_for_category(category, manifest=None, window=None, cancel=None):
+    safe_category = category.replace(" ", "_").replace("-", "_")
+    arc_root = os.path.join(platform.node(), safe_category)
+    selected = 0
+
+    for record, rel_path in iter_category_files(category, window, cancel):
+        if manifest and not manifest.should_collect(record, category, cancel=cancel):
+            continue
+        line_filter = filter_for(CATEGORY_FILTERS, category, record.source)
+        if record.capped and line_filter is None:
+            logging.info(f"[{category}] Large file, keeping head and tail only: {record.source}")
+        selected += 1
+        yield ArchiveEntry(record.source, os.path.join(arc_root, rel_path), category, record.capped or None, record,
+                           line_filter)
+
+    if selected:
+        logging.info(f"[{category}] {selected} file(s) added to archive")
+
+# --- Export Windows Event Logs ---
+def start_event_log_export(export_dir, window=None, cancel=None):
+    # Every log is exported at once, in the background, while the folders are scanned.
+    # Exports go to export_dir, which the caller removes once the archive is written.
+    from collector_events import EVENT_LOGS, EventLogExport
+
+    def on_failed(logname, reason):
+        logging.error(f"Failed to export log {logname}: {reason}")
+
+    outfiles = {logname: os.path.join(export_dir, f"{logname}.evtx") for logname in EVENT_LOGS}
+    return EventLogExport(outfiles, window, cancel, on_failed=on_failed)
+
+def event_log_entries(export, category):
+    # Entries of the exported logs, in the order the exports finish
+    try:
+        for logname, outfile in export.results():
+            logging.info(f"Exported event log: {logname}")
+            yield ArchiveEntry(outfile, os.path.join(platform.node(), "EventLogs", f"{logname}.evtx"), category)
+    except Exception as e:
+        logging.error(f"Failed to export Event Logs: {e}", exc_info=True)
+        messagebox.showerror("Error", f"Fail to export Event Logs: {e}")
+
+# --- Create 7z archive ---
+def create_7z_archive(archive_path, entries, manifest, cancel=None, on_progress=None):
+    # entries: the EntryList from fit_to_budget, also stored as the list of collected files
+    from collector_archive import ARCHIVE_EMPTY, CompressionPolicy, stream_to_archive
+
+    def finish(archive):
+        manifest.write_index(archive)
+        entries.store(archive)
+
+    def with_progress():
+        # Files are compressed as they are yielded, so progress follows the archive
+        for i, entry in enumerate(entries):
+            yield entry
+            if on_progress:
+                on_progress(i + 1, len(entries))
+
+    status = ARCHIVE_EMPTY
+    if entries:
+        status = stream_to_archive(archive_path, with_progress(), CompressionPolicy(default=COMPRESSION_CODEC),
+                                   manifest.entry_written, finish, cancel=cancel, index=True)
+    if status == ARCHIVE_EMPTY:
+        logging.warning("Nothing to archive: no valid files.")
+    return status
+
+# --- Scans of the selected categories, run ahead ---
+prefetcher = ScanPrefetcher()
+
+def prefetch_category(category, selected):
+    # Checkbox callback: warm a category when it is ticked, stop when it is unticked
+    if not selected:
+        prefetcher.cancel(category)
+    elif category not in EVENT_CATEGORIES:
+        prefetcher.warm(category, partial(iter_category_files, category))
+
+# --- Collect logs ---
+def collect_logs(progress_bar, progress_label, checkboxes, incremental=False, window=None, cancel=None):
+    # Everything runs under the try, so a failure anywhere still ends the collection
+    # (is_collecting, the Collect button, the export folder)
+    global is_collecting, current_archive_path
+    is_collecting = True
+    export_dir = None
+    try:
+        from collector_archive import ARCHIVE_OK, ARCHIVE_EMPTY, ARCHIVE_CANCELLED
+        from collector_manifest import LEFT_OUT_NAME, RunManifest
+        progress_bar["value"] = 0
+        progress_label.config(text="0%")
+        selected = [cat for cat, var in checkboxes.items() if var.get()]
+        if not selected:
+            messagebox.showinfo("Info", "No category selected.")
+            return
+
+        desktop_path = get_desktop_path()
+        manifest = RunManifest(os.path.join(desktop_path, MANIFEST_NAME), incremental=incremental)
+        if incremental and not manifest.incremental:
+            logging.info("No previous collection found, collecting everything.")
+        archive_path = os.path.join(desktop_path, generate_archive_name("_delta" if manifest.incremental else ""))
+        current_archive_path = archive_path
+
+        logging.info(f"Selected categories: {selected}")
+        logging.info(f"Archive: {archive_path}")
+        if window:
+            logging.info(f"Time window: {window}")
+
+        export_dir = tempfile.mkdtemp()
+        events = None
+        if any(category in EVENT_CATEGORIES for category in selected):
+            events = start_event_log_export(export_dir, window, cancel)
+
+        def collect():
+            # Folders first: the event log exports started above run meanwhile
+            for category in sorted(selected, key=lambda c: c in EVENT_CATEGORIES):
+                if category in EVENT_CATEGORIES:
+                    yield from event_log_entries(events, category)
+                else:
+                    found = False
+                    for entry in copy_selected_items_for_category(category, manifest, window, cancel):
+                        found = True
+                        yield entry
+                    if not found and category == "N-sight Agent":
+                        logging.warning("N-sight Agent: No valid files found.")
+
+        def on_progress(done, total):
+            percent = int(done * 100 / total)
+            progress_bar.after(0, partial(progress_bar.config, value=percent))
+            progress_label.after(0, partial(progress_label.config, text=f"{percent}%"))
+
+        # Everything is listed first (stat data only) so the budget can pick what to keep
+        progress_label.after(0, partial(progress_label.config, text="Scanning..."))
+        entries = fit_to_budget(collect(), MAX_TOTAL_SIZE, CATEGORY_WEIGHTS, manifest, desktop_path)
+        status = create_7z_archive(archive_path, entries, manifest, cancel, on_progress)
+        if status == ARCHIVE_CANCELLED:
+            # The window is closing: no dialogs, no widget updates
+            return
+        if status == ARCHIVE_OK:
+            manifest.save(os.path.basename(archive_path))
+            if manifest.left_out:
+                messagebox.showwarning("Size limit reached", f"Archive created: {archive_path}\n\n"
+                                       f"{len(manifest.left_out)} file(s) were left out to stay within the size limit "
+                                       f"(listed in {LEFT_OUT_NAME} inside the archive).")
+            else:
+                messagebox.showinfo("Success", f"Archive created: {archive_path}")
+        elif status == ARCHIVE_EMPTY:
+            messagebox.showinfo("Info", "No files or folders found. Archive not created.")
+        else:
+            messagebox.showerror("Error", "Failed to create .7z archive")
+
+        progress_bar.after(0, lambda: progress_bar.config(value=0))
+        progress_label.after(0, lambda: progress_label.config(text="0%"))
+    except Exception as e:
+        logging.error(f"Log collection failed: {e}", exc_info=True)
+        if cancel is None or not cancel.cancelled():
+            messagebox.showerror("Error", f"Log collection failed: {e}")
+    finally:
+        if export_dir:
+            shutil.rmtree(export_dir, ignore_errors=True)
+        is_collecting = False
+        current_archive_path = None
+
+# --- Start log collection in a thread ---
+def start_collection(progress_bar, progress_label, checkboxes, collect_btn, incremental_var, window_var):
+    global current_cancel, collection_thread
+    collect_btn.config(state="disabled")
+    incremental = incremental_var.get()
+    window = time_window(TIME_WINDOWS.get(window_var.get()))
+    cancel = CancelToken()
+    def run():
+        collect_logs(progress_bar, progress_label, checkboxes, incremental, window, cancel)
+        if not cancel.cancelled():
+            progress_bar.after(0, lambda: collect_btn.config(state="normal"))
+    current_cancel = cancel
+    collection_thread = threading.Thread(target=run, daemon=True)
+    collection_thread.start()
+
+# --- Stop a running collection; on_stopped runs once it has cleaned up ---
+def cancel_collection(root, on_stopped, timeout=CANCEL_TIMEOUT):
+    # The collection thread is polled from the Tk loop (root.after), so the window
+    # keeps responding while it stops; on_stopped also runs after timeout seconds
+    archive_path = current_archive_path
+    if current_cancel is not None:
+        current_cancel.cancel()
+    deadline = time.monotonic() + timeout
+
+    def poll():
+        if collection_thread is not None and collection_thread.is_alive():
+            if time.monotonic() < deadline:
+                root.after(CANCEL_POLL_INTERVAL, poll)
+                return
+            logging.warning(f"Collection did not stop within {timeout}s")
+        # stream_to_archive removes its partial archive; this covers a worker still stuck in I/O
+        if archive_path and os.path.isfile(archive_path):
+            try:
+                os.remove(archive_path)
+            except OSError:
+                pass
+        on_stopped()
+
+    poll()
+
+# --- Work deferred until the window is shown ---
+def warm_up():
+    # Background thread: the first collection then finds the archive pipeline and
+    # py7zr (and its codec stack) imported and the Desktop resolved
+    get_desktop_path()
+    for module in ("collector_events", "collector_manifest"):
+        importlib.import_module(module)
+    from collector_writers import codec_filters
+    codec_filters(COMPRESSION_CODEC)
+
+def on_window_shown():
+    elapsed = time.perf_counter() - started
+    if elapsed > STARTUP_TARGET:
+        logging.warning(f"Window shown after {elapsed:.2f}s (target {STARTUP_TARGET}s)")
+    else:
+        logging.info(f"Window shown after {elapsed:.2f}s")
+    threading.Thread(target=warm_up, daemon=True).start()
+
+# --- Create GUI ---
+def create_gui():
+    root = tk.Tk()
+    root.title("N-Able Log Collector")
+    root.geometry("320x425")
+
+    def close():
+        prefetcher.close()
+        root.destroy()
+
+    def on_closing():
+        global is_collecting
+        if is_collecting:
+            if messagebox.askyesno("Collecting logs", "Logs are still being collected. Do you want to force exit?"):
+                logging.warning("User closed the application during log collection. Archive creation incomplete.")
+                # Further close requests are ignored while the collection stops
+                root.protocol("WM_DELETE_WINDOW", lambda: None)
+                is_collecting = False
+                cancel_collection(root, close)
+        else:
+            if messagebox.askokcancel("Quit", "Do you want to exit the Log Collector?"):
+                close()
+
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+
+    admin = is_admin()
+    tk.Label(root, text=f"Administrator privileges: {'Yes' if admin else 'No'}", fg="green" if admin else "red").grid(row=0, column=0, columnspan=2, pady=5)
+    tk.Label(root, text="Select log categories to collect:").grid(row=1, column=0, columnspan=2, pady=5)
+
+    checkboxes = {}
+    for i, category in enumerate(categories):
+        var = tk.BooleanVar()
+        tk.Checkbutton(root, text=category, variable=var,
+                       command=lambda c=category, v=var: prefetch_category(c, v.get())).grid(row=i+2, column=0, sticky="w", padx=20)
+        checkboxes[category] = var
+
+    incremental_var = tk.BooleanVar()
+    tk.Checkbutton(root, text="Only changes since last collection", variable=incremental_var).grid(row=len(categories)+2, column=0, columnspan=2, sticky="w", padx=10)
+
+    tk.Label(root, text="Time window:").grid(row=len(categories)+3, column=0, sticky="w", padx=10)
+    window_var = tk.StringVar(value="All time")
+    ttk.Combobox(root, textvariable=window_var, values=list(TIME_WINDOWS), state="readonly", width=14).grid(row=len(categories)+3, column=1, sticky="w")
+
+    progress_bar = ttk.Progressbar(root, length=300, mode="determinate")
+    progress_bar.grid(row=len(categories)+4, column=0, columnspan=2, pady=10, padx=(10, 0))
+
+    progress_label = tk.Label(root, text="0%")
+    progress_label.grid(row=len(categories)+5, column=0, columnspan=2)
+
+    collect_btn = tk.Button(root, text="Collect Logs")
+    collect_btn.config(command=lambda: start_collection(progress_bar, progress_label, checkboxes, collect_btn, incremental_var, window_var))
+    collect_btn.grid(row=len(categories)+6, column=0, columnspan=2, pady=10)
+
+    root.after_idle(on_window_shown)
+    try:
+        root.mainloop()
+    finally:
+        prefetcher.close()
+
+# --- Main ---
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        use_profile(load_profile())
+    except (OSError, ValueError) as e:
+        logging.error(f"Collection profile not loaded, using the built-in one: {e}")
+        messagebox.showerror("Profile", f"Collection profile not loaded, using the built-in one:\n{e}")
+    logging.info(f"Running with administrator privileges: {'Yes' if is_admin() else 'No'}")
+    create_gui()
+#
+
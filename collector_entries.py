@@ -0,0 +1,122 @@
+import json
+import array
+import tempfile
+from collections import namedtuple
+from collector_scan import FileRecord
+
+# One file to put in the archive. max_bytes caps an oversized log (head + tail);
+# category and record (the scanner's FileRecord) are handed back to on_written.
+# With a line_filter (collector_filter.LineFilter) only the lines it keeps are
+# stored, and max_bytes caps what is kept instead. collector_archive re-exports it.
+ArchiveEntry = namedtuple("ArchiveEntry", "source arcname category max_bytes record line_filter",
+                          defaults=(None, None, None, None))
+
+# Formats that are already compressed: the archive stores them as they are (recompressing
+# them only burns CPU) and the size budget counts them in full
+COMPRESSED_EXTENSIONS = frozenset((
+    '.gz', '.tgz', '.zip', '.7z', '.rar', '.cab', '.bz2', '.xz', '.zst', '.lz4',
+    '.jpg', '.jpeg', '.png', '.gif', '.mp4', '.docx', '.xlsx', '.nupkg', '.jar',
+))
+
+# Where an archive lists what the run collected: one JSON object per line
+COLLECTED_NAME = "collected_files.jsonl"
+
+
+# --- What a run collected, held between the scan and the archive ---
+class EntryList:
+    # The archive entries of a run, column by column: paths in lists, sizes, times
+    # and caps in arrays, categories and line filters as ids into one small table;
+    # a FileRecord's rel_path, the end of its source path, is kept as an offset.
+    # Indexing or iterating builds the ArchiveEntry (and its FileRecord) of one
+    # file at a time, so a run of hundreds of thousands of files does not hold two
+    # tuples per file while it is archived.
+    __slots__ = ("sources", "arcnames", "rel_starts", "sizes", "mtimes", "caps", "max_bytes", "categories",
+                 "filters", "_record_sources", "_rel_paths", "_values", "_ids")
+
+    def __init__(self, entries=()):
+        self.sources = []
+        self.arcnames = []
+        self.rel_starts = array.array('q')      # -1: the entry has no FileRecord
+        self.sizes = array.array('q')
+        self.mtimes = array.array('d')
+        self.caps = array.array('q')            # FileRecord.capped, 0 if not capped
+        self.max_bytes = array.array('q')       # -1 for None
+        self.categories = array.array('I')      # ids into _values
+        self.filters = array.array('I')
+        self._record_sources = {}               # index -> FileRecord.source, where it is not the entry's
+        self._rel_paths = {}                    # index -> rel_path, where it does not end the source path
+        self._values = [None]
+        self._ids = {None: 0}
+        for entry in entries:
+            self.append(entry)
+
+    def _id(self, value):
+        found = self._ids.get(value)
+        if found is None:
+            found = self._ids[value] = len(self._values)
+            self._values.append(value)
+        return found
+
+    def append(self, entry):
+        record = entry.record
+        i = len(self.sources)
+        rel_start = -1
+        if record is not None:
+            if record.source != entry.source:
+                self._record_sources[i] = record.source
+            rel_start = len(record.source) - len(record.rel_path)
+            if not record.source.endswith(record.rel_path):
+                self._rel_paths[i] = record.rel_path
+        self.sources.append(entry.source)
+        self.arcnames.append(entry.arcname)
+        self.rel_starts.append(rel_start)
+        self.sizes.append(record.size if record is not None else 0)
+        self.mtimes.append(record.mtime if record is not None else 0.0)
+        self.caps.append((record.capped or 0) if record is not None else 0)
+        self.max_bytes.append(entry.max_bytes if entry.max_bytes is not None else -1)
+        self.categories.append(self._id(entry.category))
+        self.filters.append(self._id(entry.line_filter))
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __bool__(self):
+        return bool(self.sources)
+
+    def __getitem__(self, i):
+        record = None
+        if self.rel_starts[i] >= 0:
+            source = self._record_sources.get(i, self.sources[i])
+            rel_path = self._rel_paths.get(i) or source[self.rel_starts[i]:]
+            record = FileRecord(source, rel_path, self.sizes[i], self.mtimes[i], self.caps[i] or False)
+        max_bytes = self.max_bytes[i]
+        return ArchiveEntry(self.sources[i], self.arcnames[i], self._values[self.categories[i]],
+                            max_bytes if max_bytes >= 0 else None, record, self._values[self.filters[i]])
+
+    def __iter__(self):
+        for i in range(len(self.sources)):
+            yield self[i]
+
+    def category(self, i):
+        return self._values[self.categories[i]]
+
+    def select(self, indexes):
+        # A new list of the entries at indexes, in their order here
+        return EntryList(self[i] for i in sorted(indexes))
+
+    def store(self, archive):
+        # finish() callback: the list goes into the archive as COLLECTED_NAME,
+        # written out through a temporary file rather than built in memory
+        with tempfile.TemporaryFile() as f:
+            for i, source in enumerate(self.sources):
+                row = {"source": self._record_sources.get(i, source), "arcname": self.arcnames[i],
+                       "category": self._values[self.categories[i]]}
+                if self.rel_starts[i] >= 0:
+                    row.update(size=self.sizes[i], mtime=self.mtimes[i])
+                if self.max_bytes[i] >= 0:
+                    row["max_bytes"] = self.max_bytes[i]
+                if self.filters[i]:
+                    row["filtered"] = True
+                f.write(json.dumps(row).encode("utf-8") + b"\n")
+            f.seek(0)
+            archive.writef(f, COLLECTED_NAME)
@@ -0,0 +1,123 @@
+import os
+import time
+import datetime
+import subprocess
+import concurrent.futures
+
+EVENT_LOGS = ["Application", "System", "Security"]
+# Limits of each export; a log over either is dropped, the other logs are kept
+EXPORT_TIMEOUT = 10 * 60
+EXPORT_MAX_BYTES = 1024 ** 3
+
+# Reasons passed to on_failed
+EXPORT_FAILED = "export failed"
+EXPORT_TIMED_OUT = "export timed out"
+EXPORT_TOO_LARGE = "export too large"
+EXPORT_CANCELLED = "export cancelled"
+
+# wevtutil by default; point LOG_COLLECTOR_EVENT_EXPORTER at a stand-in script to
+# exercise the export orchestration away from Windows. It gets wevtutil's arguments.
+EXPORTER_ENV = "LOG_COLLECTOR_EVENT_EXPORTER"
+
+
+def exporter_command():
+    return os.environ.get(EXPORTER_ENV, "wevtutil")
+
+
+def _system_time(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+# --- XPath query selecting the events inside a TimeWindow ---
+def time_window_query(window):
+    if window is None:
+        return None
+    conditions = []
+    if window.since is not None:
+        conditions.append(f"@SystemTime>='{_system_time(window.since)}'")
+    if window.until is not None:
+        conditions.append(f"@SystemTime<='{_system_time(window.until)}'")
+    if not conditions:
+        return None
+    return f"*[System[TimeCreated[{' and '.join(conditions)}]]]"
+
+
+def build_export_command(log_name, outfile, window=None):
+    command = [exporter_command(), "epl", log_name, outfile, "/ow:true"]
+    query = time_window_query(window)
+    if query:
+        # Query-filtered export: only the events in the window are written
+        command.append(f"/q:{query}")
+    return command
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# --- Export one event log; True if the .evtx file was written ---
+def export_event_log(log_name, outfile, window=None, cancel=None, timeout=EXPORT_TIMEOUT, max_bytes=EXPORT_MAX_BYTES,
+                     on_failed=None):
+    # The exporter is killed and its partial output dropped when the token (see
+    # collector_cancel) is cancelled, after timeout seconds, or once the output
+    # grows past max_bytes; on_failed(log_name, reason) says which.
+    if cancel is not None and cancel.cancelled():
+        return False
+    try:
+        process = subprocess.Popen(build_export_command(log_name, outfile, window),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        if on_failed:
+            on_failed(log_name, f"{EXPORT_FAILED}: {e}")
+        return False
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        try:
+            returncode = process.wait(timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            reason = None
+            if cancel is not None and cancel.cancelled():
+                reason = EXPORT_CANCELLED
+            elif deadline is not None and time.monotonic() >= deadline:
+                reason = EXPORT_TIMED_OUT
+            elif max_bytes is not None and os.path.isfile(outfile) and os.path.getsize(outfile) > max_bytes:
+                reason = EXPORT_TOO_LARGE
+            if reason:
+                process.kill()
+                process.wait()
+                _remove(outfile)
+                if on_failed and reason != EXPORT_CANCELLED:
+                    on_failed(log_name, reason)
+                return False
+    if returncode != 0 or not os.path.isfile(outfile):
+        if on_failed:
+            on_failed(log_name, f"{EXPORT_FAILED} (exit code {returncode})")
+        return False
+    return True
+
+
+# --- Every event log exported at once, in the background ---
+class EventLogExport:
+    # Starts one exporter per log as soon as it is created, so the exports overlap
+    # with the file scan; each has its own timeout and size cap (export_event_log).
+    # results() yields (log_name, outfile) in the order the exports finish, so the
+    # first one done is the first one archived.
+
+    def __init__(self, outfiles, window=None, cancel=None, timeout=EXPORT_TIMEOUT, max_bytes=EXPORT_MAX_BYTES,
+                 on_failed=None):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(outfiles)))
+        self._futures = {
+            executor.submit(export_event_log, log_name, outfile, window, cancel, timeout, max_bytes, on_failed):
+                (log_name, outfile)
+            for log_name, outfile in outfiles.items()
+        }
+        executor.shutdown(wait=False)
+
+    def results(self):
+        for future in concurrent.futures.as_completed(self._futures):
+            if future.result():
+                yield self._futures[future]
@@ -0,0 +1,418 @@
+import io
+import os
+import itertools
+import re
+import json
+import time
+from collections import deque
+from collector_scan import FileMatcher
+
+# Where an archive lists the files stored filtered, and the filters used
+FILTER_INDEX_NAME = "filtered_entries.json"
+
+# Files a line filter applies to unless it lists its own globs
+DEFAULT_FILTER_FILES = ("*.log", "*.txt")
+# Lines kept around every matching line unless the filter says otherwise
+DEFAULT_CONTEXT = 2
+
+_CHUNK_SIZE = 1024 * 1024
+# A "line" longer than this is cut, so one endless line cannot grow the buffer
+_MAX_LINE = 1024 * 1024
+
+# Timestamp at the start of a line: 2025-10-30 12:00:00, 2025-10-30T12:00:00,
+# [2025-10-30 12:00:00,123] or 10/30/2025 12:00:00, as the agents write them
+_STAMP = rb"\[?(?:(\d{4})-(\d\d)-(\d\d)|(\d{1,2})/(\d{1,2})/(\d{4}))[ T](\d\d):(\d\d):(\d\d)"
+_LINE_STAMP = re.compile(_STAMP)
+_ANY_STAMP = re.compile(rb"^" + _STAMP, re.MULTILINE)
+# A level only counts as a word: "ERROR" but not "NoErrors"
+_WORD_BYTES = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789_")
+
+
+def _stamp_key(match):
+    # (year, month, day, hour, minute, second): compared as tuples, no datetime per line
+    g = match.groups()
+    if g[0] is not None:
+        date = (int(g[0]), int(g[1]), int(g[2]))
+    else:
+        date = (int(g[5]), int(g[3]), int(g[4]))
+    return date + (int(g[6]), int(g[7]), int(g[8]))
+
+
+def _epoch_key(epoch):
+    return None if epoch is None else tuple(time.localtime(epoch)[:6])
+
+
+def last_stamp(chunk):
+    # Last timestamped line of a chunk, looking back from its end a window at a time
+    end = len(chunk)
+    window = 64 * 1024
+    while end > 0:
+        start = max(0, end - window)
+        if start:
+            start = chunk.rfind(b"\n", 0, start) + 1
+        last = None
+        for last in _ANY_STAMP.finditer(chunk, start, end):
+            pass
+        if last is not None:
+            return _stamp_key(last)
+        end = start
+        window *= 2
+    return None
+
+
+def first_stamp(chunk):
+    match = _ANY_STAMP.search(chunk)
+    return _stamp_key(match) if match else None
+
+
+def line_stamp(chunk, pos):
+    # Timestamp of the line starting at pos, or None
+    match = _LINE_STAMP.match(chunk, pos)
+    return _stamp_key(match) if match else None
+
+
+def stamp_text(key):
+    return "%04d-%02d-%02dT%02d:%02d:%02d" % key
+
+
+# --- Which lines of a text log are worth shipping ---
+class LineFilter:
+    # A line is kept if it names one of levels (as a word) or contains one of
+    # keywords (both case-insensitive) and, with since/until (epoch seconds), if
+    # its timestamp is in range. A line without a timestamp takes the one of the
+    # line before it (stack traces, wrapped messages). Without levels and keywords
+    # every line in range is kept. context lines before and after every kept line
+    # are kept too. settings is what the archive records.
+
+    def __init__(self, levels=(), keywords=(), since=None, until=None, context=DEFAULT_CONTEXT,
+                 files=DEFAULT_FILTER_FILES, settings=None):
+        # (lowercased term, whole word only)
+        self.terms = [(level.lower().encode("utf-8"), True) for level in levels]
+        self.terms += [(keyword.lower().encode("utf-8"), False) for keyword in keywords]
+        self.since = _epoch_key(since)
+        self.until = _epoch_key(until)
+        self.context = context
+        self.files = FileMatcher(list(files))
+        self.settings = settings if settings is not None else {
+            "levels": list(levels), "keywords": list(keywords), "since": since, "until": until, "context": context,
+        }
+
+    def applies(self, path):
+        return self.files.matches(path, os.path.basename(path))
+
+    def spans(self, chunk):
+        # (start, end) of the lines of chunk naming a term, in order. bytes.find on
+        # the lowercased chunk, once per term: several times faster than a
+        # case-insensitive regex alternation, which Python's re cannot search by prefix
+        lowered = chunk.lower()
+        spans = set()
+        for term, word in self.terms:
+            pos = lowered.find(term)
+            while pos >= 0:
+                end = pos + len(term)
+                if word and ((pos and lowered[pos - 1] in _WORD_BYTES) or
+                             (end < len(lowered) and lowered[end] in _WORD_BYTES)):
+                    pos = lowered.find(term, pos + 1)
+                    continue
+                line_end = lowered.find(b"\n", end) + 1 or len(lowered)
+                spans.add((lowered.rfind(b"\n", 0, pos) + 1, line_end))
+                pos = lowered.find(term, line_end)
+        return sorted(spans)
+
+    def in_range(self, key):
+        # Lines before the first timestamp of a file are kept
+        if key is None:
+            return True
+        return (self.since is None or key >= self.since) and (self.until is None or key <= self.until)
+
+    def before_since(self, keys):
+        return self.since is not None and None not in keys and all(key < self.since for key in keys)
+
+    def after_until(self, keys):
+        return self.until is not None and None not in keys and all(key > self.until for key in keys)
+
+    @property
+    def timed(self):
+        return self.since is not None or self.until is not None
+
+
+def filter_for(filters, category, path):
+    # The line filter of a category if it applies to path (a text log), else None
+    line_filter = filters.get(category)
+    return line_filter if line_filter is not None and line_filter.applies(path) else None
+
+
+# Lines the filter adds start with this
+_MARKER = b"[... log_collector: "
+
+
+def _skipped_marker(count):
+    return _MARKER + f"{count} lines filtered out ...]\n".encode("ascii")
+
+
+# --- Run a file through a LineFilter, one chunk at a time ---
+class _LineScanner:
+    # Works on chunks of whole lines. Matching lines are found by searching the
+    # whole chunk (C speed); Python only handles the hits and the gaps between them,
+    # which are copied or counted with bytes.count. Only chunks straddling the
+    # since/until boundary are walked line by line. Memory is one chunk plus the
+    # up to <context> undecided lines carried into the next one.
+
+    def __init__(self, line_filter):
+        self.filter = line_filter
+        self.stamp = None       # timestamp of the last timestamped line seen
+        self.after = 0          # context lines still owed after the last kept line
+        self.held = b""         # last lines of the previous chunk, not decided yet
+        self.skipped = 0
+        self.lines = 0
+        self.kept = 0
+
+    def _matches(self, chunk):
+        # (start, end) of the matching lines of chunk, possibly several lines at once
+        lf = self.filter
+        if lf.timed:
+            # Log timestamps only go forward: a chunk whose first and last stamps
+            # (and the stamp its first lines inherit) are all in range is kept
+            # whole, one entirely before since or after until is dropped whole
+            first = _ANY_STAMP.search(chunk)
+            if first is None:
+                keys = [self.stamp]
+            else:
+                keys = [_stamp_key(first), last_stamp(chunk)]
+                if first.start() > 0:
+                    keys.append(self.stamp)
+            if all(lf.in_range(key) for key in keys):
+                if first is not None:
+                    self.stamp = keys[1]
+            elif lf.before_since(keys) or lf.after_until(keys):
+                if first is not None:
+                    self.stamp = keys[1]
+                return
+            else:
+                yield from self._timed_matches(chunk)
+                return
+        if not lf.terms:
+            yield 0, len(chunk)
+        else:
+            yield from lf.spans(chunk)
+
+    def _timed_matches(self, chunk):
+        # Line by line, for the chunks where the since/until boundary falls
+        lf = self.filter
+        pos = 0
+        while pos < len(chunk):
+            end = chunk.find(b"\n", pos) + 1
+            m = _LINE_STAMP.match(chunk, pos)
+            if m:
+                self.stamp = _stamp_key(m)
+            if lf.in_range(self.stamp) and (not lf.terms or lf.spans(chunk[pos:end])):
+                yield pos, end
+            pos = end
+
+    @staticmethod
+    def _lines_from(chunk, pos, count, limit):
+        # Offset after <count> lines from pos, not past limit; and how many lines that is
+        n = 0
+        while n < count and pos < limit:
+            pos = chunk.find(b"\n", pos) + 1
+            n += 1
+        return pos, n
+
+    @staticmethod
+    def _lines_before(chunk, start, end, count):
+        # Offset of the <count>th line before end, not before start
+        n = 0
+        while n < count and end > start:
+            end = max(chunk.rfind(b"\n", start, end - 1) + 1, start)
+            n += 1
+        return end
+
+    def _keep(self, out, data):
+        if self.skipped:
+            out.append(_skipped_marker(self.skipped))
+            self.skipped = 0
+        out.append(data)
+
+    def _gap(self, out, chunk, done, start):
+        # Lines between the last kept line and start: context owed to the former is
+        # kept, the ones dropped are counted; returns where the context of start begins
+        owed, n = self._lines_from(chunk, done, self.after, start)
+        self.after -= n
+        if owed > done:
+            self._keep(out, chunk[done:owed])
+        keep_from = self._lines_before(chunk, owed, start, self.filter.context)
+        self.skipped += chunk.count(b"\n", owed, keep_from)
+        return keep_from
+
+    def chunk(self, chunk):
+        # chunk is whole lines; returns the bytes to keep, markers included
+        self.lines += chunk.count(b"\n")
+        chunk = self.held + chunk
+        out = []
+        done = 0
+        for start, end in self._matches(chunk):
+            keep_from = self._gap(out, chunk, done, start)
+            self._keep(out, chunk[keep_from:end])
+            done = end
+            self.after = self.filter.context
+        # Lines after the last match: those still owed as context are kept, the
+        # last <context> are held back in case the next chunk starts with a match
+        hold_from = self._gap(out, chunk, done, len(chunk))
+        self.held = chunk[hold_from:]
+        data = b"".join(out)
+        self.kept += data.count(b"\n") - data.count(_MARKER)
+        return data
+
+    def finish(self):
+        self.skipped += self.held.count(b"\n")
+        self.held = b""
+        data = _skipped_marker(self.skipped) if self.skipped else b""
+        self.skipped = 0
+        return data
+
+
+# --- File wrapper that yields only the lines a LineFilter keeps ---
+class FilteringReader(io.BufferedIOBase):
+    # Reads raw forward in chunks and ends with a line saying how much was kept.
+    # With max_bytes, the newest max_bytes of kept lines are stored: the whole file
+    # is read, the kept lines go through a ring that drops the oldest, and the ring
+    # comes out once the file is read, after a line saying how much was dropped.
+    # Memory is max_bytes plus one chunk. The size it reports is size_hint (the
+    # source size): py7zr only uses it to tell empty files apart and records the
+    # bytes actually read.
+    # lines, kept_lines, bytes and truncated describe the result once read to the end.
+
+    def __init__(self, raw, line_filter, size_hint, max_bytes=None, chunk_size=_CHUNK_SIZE):
+        self._raw = raw
+        self.line_filter = line_filter
+        self._scanner = _LineScanner(line_filter)
+        self._size_hint = size_hint
+        self._max_bytes = max_bytes
+        self._chunk_size = chunk_size
+        self._pieces = self._generate()
+        self._buffer = bytearray()
+        self._pos = 0
+        self._at_end = False
+        self.bytes = 0
+        self.truncated = False
+
+    @property
+    def lines(self):
+        return self._scanner.lines
+
+    @property
+    def kept_lines(self):
+        return self._scanner.kept
+
+    def _chunks(self):
+        # Whole lines, a chunk at a time; an overlong or unterminated last line gets a newline
+        carry = b""
+        while True:
+            data = self._raw.read(self._chunk_size)
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0 and len(data) > _MAX_LINE:
+                yield data + b"\n"
+                carry = b""
+            else:
+                carry = data[cut:]
+                if cut:
+                    yield data[:cut]
+        if carry:
+            yield carry + b"\n"
+
+    def _generate(self):
+        scanner = self._scanner
+        pieces = (scanner.chunk(chunk) for chunk in self._chunks())
+        if self._max_bytes is not None:
+            pieces = self._newest(pieces)
+        yield from pieces
+        if self._max_bytes is None:
+            yield scanner.finish()
+        yield _MARKER + f"filtered, kept {scanner.kept} of {scanner.lines} lines ...]\n".encode("ascii")
+
+    def _newest(self, pieces):
+        # The last max_bytes of kept lines (markers included), cut at a line start
+        scanner = self._scanner
+        ring = deque()
+        size = dropped = 0
+        for piece in itertools.chain(pieces, [scanner.finish()]):
+            ring.append(piece)
+            size += len(piece)
+            while size > self._max_bytes:
+                oldest = ring.popleft()
+                cut = len(oldest)
+                if size - cut < self._max_bytes:
+                    cut = oldest.find(b"\n", size - self._max_bytes - 1) + 1 or cut
+                    if cut < len(oldest):
+                        ring.appendleft(oldest[cut:])
+                size -= cut
+                dropped += oldest.count(b"\n", 0, cut) - oldest.count(_MARKER, 0, cut)
+        if dropped:
+            scanner.kept -= dropped
+            self.truncated = True
+            yield _MARKER + (f"output limit of {self._max_bytes} bytes reached, "
+                             f"{dropped} older matching lines dropped ...]\n").encode("ascii")
+        yield from ring
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            self._buffer += piece
+            self.bytes += len(piece)
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Only the size probe of the archiver (to the end and back) is supported
+        if whence == io.SEEK_END:
+            self._at_end = True
+            return self._size_hint + offset
+        if whence == io.SEEK_SET and offset == self._pos:
+            self._at_end = False
+            return offset
+        raise io.UnsupportedOperation("a filtered log can only be read forward")
+
+    def tell(self):
+        return self._size_hint if self._at_end else self._pos
+
+
+# --- What the archive records about the files it stored filtered ---
+class FilterIndex:
+
+    def __init__(self):
+        self.filters = []   # settings of each filter used, in order of first use
+        self.files = {}     # arcname -> what was kept
+
+    def record(self, arcname, reader, size):
+        settings = reader.line_filter.settings
+        if settings not in self.filters:
+            self.filters.append(settings)
+        self.files[arcname] = {
+            "filter": self.filters.index(settings),
+            "size": size,
+            "kept_size": reader.bytes,
+            "lines": reader.lines,
+            "kept_lines": reader.kept_lines,
+            "truncated": reader.truncated,
+        }
+
+    def __bool__(self):
+        return bool(self.files)
+
+    def index(self):
+        return json.dumps({"filters": self.filters, "files": self.files}, indent=1).encode("utf-8")
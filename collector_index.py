@@ -0,0 +1,280 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+import datetime
+import tempfile
+from collector_filter import LineFilter, first_stamp, last_stamp, line_stamp, stamp_text
+from collector_scan import FileMatcher, parse_time_spec
+from collector_writers import archive_format, read_member
+
+# Where an archive keeps its index (in a 7z, a folder of its own, so reading it
+# does not decompress the logs)
+INDEX_NAME = "log_index.sqlite"
+INDEX_VERSION = 1
+# Files indexed; anything else is only listed by the archive
+INDEX_FILES = ("*.log", "*.txt", "*.csv", "*.xml", "*.json", "*.trace", "*.out", "*.err")
+# Signatures and codes kept per file; beyond that they are only counted
+MAX_SIGNATURES = 1000
+MAX_CODES = 1000
+
+# Lines that get a signature: a severity level or an exception
+_ERROR_LINES = LineFilter(levels=("error", "fatal", "critical"), keywords=("exception",))
+# Error codes in those lines: HRESULTs, exception types, "error 1603" / "code: 5"
+_CODES = re.compile(rb"\b0x[0-9a-fA-F]{8}\b|\b(?:[A-Za-z_]\w*\.)*[A-Za-z_]\w*(?:Exception|Error)\b|"
+                    rb"(?i:\b(?:error|code|hresult)[ :=#(]{1,3})(-?\d{2,})\b")
+# Leading timestamp and anything that differs between two occurrences of one error
+_LEADING_STAMP = re.compile(rb"^\[?[\d/-]{8,10}[ T][\d:.,]{8,12}\]?\s*")
+_VOLATILE = re.compile(rb"\{?[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\}?|"
+                       rb"0x[0-9a-fA-F]+|\d+")
+_SIGNATURE_LENGTH = 160
+# How far back an error line without a timestamp looks for one
+_LOOKBACK_LINES = 50
+_MAX_LINE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE files (id INTEGER PRIMARY KEY, arcname TEXT, category TEXT, bytes INTEGER, lines INTEGER,
+                    errors INTEGER, first_ts TEXT, last_ts TEXT);
+CREATE TABLE links (arcname TEXT, file_id INTEGER);
+CREATE TABLE signatures (file_id INTEGER, signature TEXT, count INTEGER, first_ts TEXT, last_ts TEXT);
+CREATE TABLE codes (code TEXT COLLATE NOCASE, file_id INTEGER, count INTEGER, first_ts TEXT, last_ts TEXT);
+CREATE INDEX codes_code ON codes (code);
+"""
+
+
+def _signature(line):
+    text = _VOLATILE.sub(b"#", _LEADING_STAMP.sub(b"", line.strip()))
+    return text[:_SIGNATURE_LENGTH].decode("utf-8", "replace")
+
+
+def _code(match):
+    if match.group(1) is not None:
+        return match.group(1).decode("ascii")
+    code = match.group(0).decode("ascii")
+    return code.lower() if code.startswith(("0x", "0X")) else code
+
+
+def _count(table, key, stamp, limit):
+    # table: key -> [count, first, last]; False once the key did not fit
+    seen = table.get(key)
+    if seen is None:
+        if len(table) >= limit:
+            return False
+        table[key] = [1, stamp, stamp]
+        return True
+    seen[0] += 1
+    if stamp is not None:
+        if seen[1] is None or stamp < seen[1]:
+            seen[1] = stamp
+        if seen[2] is None or stamp > seen[2]:
+            seen[2] = stamp
+    return True
+
+
+# --- What one file says, gathered from the bytes as the archiver reads them ---
+class FileIndex:
+    # feed() takes the stored bytes in whatever pieces they are read; whole lines
+    # are scanned a chunk at a time. Only error lines (found the same way the line
+    # filter finds levels) are looked at one by one.
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.bytes = 0
+        self.lines = 0
+        self.errors = 0
+        self.first = None
+        self.last = None
+        self.stamp = None       # timestamp of the last timestamped line seen
+        self.signatures = {}
+        self.codes = {}
+        self.dropped = 0
+        self._carry = b""
+
+    def feed(self, data):
+        self.bytes += len(data)
+        data = self._carry + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0 and len(data) <= _MAX_LINE:
+            self._carry = data
+            return
+        cut = cut or len(data)
+        self._carry = data[cut:]
+        self._chunk(data[:cut])
+
+    def close(self):
+        if self._carry:
+            self._chunk(self._carry)
+            self._carry = b""
+
+    def _stamp_of(self, chunk, start):
+        # The line's own timestamp, or that of the nearest line above that has one
+        pos = start
+        for _ in range(_LOOKBACK_LINES):
+            stamp = line_stamp(chunk, pos)
+            if stamp is not None or pos == 0:
+                return stamp or self.stamp
+            pos = chunk.rfind(b"\n", 0, pos - 1) + 1
+        return self.stamp
+
+    def _chunk(self, chunk):
+        self.lines += chunk.count(b"\n")
+        for start, end in _ERROR_LINES.spans(chunk):
+            line = chunk[start:end]
+            stamp = self._stamp_of(chunk, start)
+            stamp = stamp_text(stamp) if stamp is not None else None
+            self.errors += 1
+            if not _count(self.signatures, _signature(line), stamp, MAX_SIGNATURES):
+                self.dropped += 1
+            for match in _CODES.finditer(line):
+                _count(self.codes, _code(match), stamp, MAX_CODES)
+        first = first_stamp(chunk)
+        if first is not None:
+            if self.first is None:
+                self.first = first
+            self.stamp = last_stamp(chunk)
+            self.last = self.stamp if self.last is None else max(self.last, self.stamp)
+
+
+# --- SQLite index of the text logs of one archive ---
+class LogIndex:
+    # Built in a temporary file by the thread writing the archive, then stored in
+    # it as INDEX_NAME (store()); remove() deletes the temporary file.
+
+    def __init__(self, files=INDEX_FILES):
+        self.matcher = FileMatcher(list(files))
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(_SCHEMA)
+        self.db.executemany("INSERT INTO info VALUES (?, ?)", [
+            ("version", str(INDEX_VERSION)),
+            ("created", datetime.datetime.now().isoformat(timespec="seconds")),
+        ])
+        self.ids = {}   # arcname -> files.id
+
+    def start(self, entry):
+        # A FileIndex to feed with the entry's bytes, or None for a file not indexed.
+        # Matched on the source name: a compacted log is stored under another
+        if not self.matcher.matches(entry.source, os.path.basename(entry.source)):
+            return None
+        return FileIndex(entry)
+
+    def add(self, file_index):
+        file_index.close()
+        entry = file_index.entry
+        cursor = self.db.execute(
+            "INSERT INTO files (arcname, category, bytes, lines, errors, first_ts, last_ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.arcname, entry.category, file_index.bytes, file_index.lines, file_index.errors,
+             stamp_text(file_index.first) if file_index.first else None,
+             stamp_text(file_index.last) if file_index.last else None))
+        file_id = self.ids[entry.arcname] = cursor.lastrowid
+        self.db.executemany("INSERT INTO signatures VALUES (?, ?, ?, ?, ?)", [
+            (file_id, signature, count, first, last)
+            for signature, (count, first, last) in file_index.signatures.items()
+        ])
+        self.db.executemany("INSERT INTO codes VALUES (?, ?, ?, ?, ?)", [
+            (code, file_id, count, first, last) for code, (count, first, last) in file_index.codes.items()
+        ])
+
+    def link(self, entry, arcname):
+        # An entry stored once under another name (see Deduplicator)
+        file_id = self.ids.get(arcname)
+        if file_id is not None:
+            self.db.execute("INSERT INTO links VALUES (?, ?)", (entry.arcname, file_id))
+
+    def store(self, archive):
+        self.db.commit()
+        self.db.close()
+        with open(self.path, 'rb') as f:
+            archive.writef(f, INDEX_NAME)
+
+    def remove(self):
+        try:
+            self.db.close()
+            os.remove(self.path)
+        except (OSError, sqlite3.Error):
+            pass
+
+
+# --- Open the index of an archive (or an index file already extracted) ---
+def open_index(path):
+    # Only the index is read from a 7z or zip: in a 7z it is alone in its folder
+    if archive_format(path) is None:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True), None
+    data = read_member(path, INDEX_NAME)
+    if data is None:
+        raise ValueError(f"{path} has no {INDEX_NAME}")
+    fd, copy = tempfile.mkstemp(suffix=".sqlite")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return sqlite3.connect(copy), copy
+
+
+# Every name a file was collected under: its own and those linked to it
+_NAMES = "(SELECT id AS file_id, arcname FROM files UNION ALL SELECT file_id, arcname FROM links)"
+
+
+def query(db, code=None, text=None, since=None, until=None):
+    # Rows of (arcname, what matched, count, first, last). since/until are
+    # "YYYY-MM-DDTHH:MM:SS" strings; an occurrence without a timestamp only
+    # matches when neither is given.
+    if code is not None:
+        sql = ("SELECT n.arcname, m.code, m.count, m.first_ts, m.last_ts FROM codes m "
+               f"JOIN {_NAMES} n ON n.file_id = m.file_id WHERE m.code = ?")
+        params = [code]
+    elif text is not None:
+        sql = ("SELECT n.arcname, m.signature, m.count, m.first_ts, m.last_ts FROM signatures m "
+               f"JOIN {_NAMES} n ON n.file_id = m.file_id WHERE m.signature LIKE ?")
+        params = [f"%{text}%"]
+    else:
+        sql = ("SELECT n.arcname, m.category, m.errors, m.first_ts, m.last_ts FROM files m "
+               f"JOIN {_NAMES} n ON n.file_id = m.id WHERE 1")
+        params = []
+    if since is not None:
+        sql += " AND m.last_ts >= ?"
+        params.append(since)
+    if until is not None:
+        sql += " AND m.first_ts <= ?"
+        params.append(until)
+    sql += " ORDER BY 3 DESC, 1"
+    return db.execute(sql, params).fetchall()
+
+
+def _time_arg(text):
+    return stamp_text(datetime.datetime.fromtimestamp(parse_time_spec(text)).timetuple()[:6])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the log index of a collector archive")
+    parser.add_argument("archive", help="the archive (only its index is extracted) or an extracted " + INDEX_NAME)
+    parser.add_argument("--error", help="files mentioning this error code (0x80070005, 1603, IOException, ...)")
+    parser.add_argument("--text", help="files with error lines containing this text")
+    parser.add_argument("--since", help="only occurrences at or after this time (e.g. 48h, 2025-10-30T12:00)")
+    parser.add_argument("--until", help="only occurrences at or before this time")
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = parser.parse_args(argv)
+    try:
+        since = _time_arg(args.since) if args.since else None
+        until = _time_arg(args.until) if args.until else None
+        db, copy = open_index(args.archive)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        parser.error(str(e))
+    try:
+        rows = query(db, args.error, args.text, since, until)
+    finally:
+        db.close()
+        if copy:
+            os.remove(copy)
+    if args.json:
+        print(json.dumps([dict(zip(("arcname", "match", "count", "first", "last"), row)) for row in rows], indent=1))
+    else:
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row))
+    return 0 if rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import os
+import json
+import datetime
+import threading
+from collector_archive import hash_file, write_bytes
+from collector_cancel import Cancelled
+
+MANIFEST_VERSION = 1
+DELTA_INDEX_NAME = "delta_index.json"
+LEFT_OUT_NAME = "left_out.json"
+
+
+# --- Load the manifest saved by a previous run ---
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return None
+    return data
+
+
+# --- What one run collected, and what changed since the last one ---
+class RunManifest:
+    # Entries are keyed by source path: [size, mtime, content hash, category].
+    # Every successful run saves one; an incremental run loads the previous one
+    # and only collects files that are new or whose content changed.
+
+    def __init__(self, manifest_path, incremental=False):
+        self.path = manifest_path
+        self.previous = load_manifest(manifest_path) if incremental else None
+        self.incremental = self.previous is not None
+        self.files = {}
+        self.changed = []
+        self.unchanged = set()  # sources kept from the previous run, not collected again
+        self.categories = set()
+        self.budget = None      # preflight estimate and size budget of this run
+        self.left_out = []      # files the budget did not leave room for
+        self._lock = threading.Lock()
+
+    def should_collect(self, record, category, throttle=None, cancel=None):
+        # throttle and cancel are the run's: the re-hash below reads like the archiver
+        with self._lock:
+            self.categories.add(category)
+        if not self.incremental:
+            return True
+
+        entry = self.previous["files"].get(record.source)
+        if entry is None:
+            return True
+        size, mtime, digest = entry[:3]
+        if size == record.size and mtime == record.mtime:
+            self._keep(record, category, digest)
+            return False
+        # Same size but touched: re-hash (a read, no write) before shipping it again
+        if size == record.size and digest:
+            try:
+                if hash_file(record.source, throttle=throttle, cancel=cancel) == digest:
+                    self._keep(record, category, digest)
+                    return False
+            except (OSError, Cancelled):
+                # Cancelled: the archive stage stops the run at its first file
+                pass
+        return True
+
+    def _keep(self, record, category, digest):
+        with self._lock:
+            self.files[record.source] = [record.size, record.mtime, digest, category]
+            self.unchanged.add(record.source)
+
+    def add(self, record, category, arcname, digest):
+        # A file claimed by several categories stays under the first (owning) one
+        with self._lock:
+            self.files.setdefault(record.source, [record.size, record.mtime, digest, category])
+            self.changed.append(arcname)
+
+    def entry_written(self, entry, digest):
+        # on_written callback for stream_to_archive
+        if entry.record is not None:
+            self.add(entry.record, entry.category, entry.arcname, digest)
+
+    def record_budget(self, preflight, budget, left_out, room=None):
+        # room: the free space, when the expected archive did not fit in it
+        self.budget = {
+            "limit": budget,
+            "free_space": room,
+            "estimated_files": preflight.files,
+            "estimated_bytes": preflight.bytes,
+            "estimated_archive_bytes": preflight.archive_bytes,
+            "estimated_by_category": preflight.by_category,
+        }
+        self.left_out = [
+            {"path": entry.source, "category": entry.category,
+             "size": entry.record.size if entry.record is not None else None}
+            for entry in left_out
+        ]
+
+    def deleted(self):
+        # Files collected last time that are gone now. A file that was only left
+        # out of this run (time window, size) still exists and is not reported.
+        if not self.incremental:
+            return []
+        return sorted(
+            source for source, entry in self.previous["files"].items()
+            if entry[3] in self.categories and source not in self.files
+            and not os.path.exists(source)
+        )
+
+    def write_index(self, archive):
+        # What the size budget left out, so whoever opens the archive knows it is partial
+        if self.left_out:
+            report = dict(self.budget, left_out=self.left_out)
+            write_bytes(archive, json.dumps(report, indent=1).encode("utf-8"), LEFT_OUT_NAME)
+        # Small index stored in a delta archive, pointing back to the archives it extends
+        if not self.incremental:
+            return
+        index = {
+            "version": MANIFEST_VERSION,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "base_archive": self.previous.get("base_archive"),
+            "previous_archive": self.previous.get("archive"),
+            "changed": self.changed,
+            "unchanged": len(self.unchanged),
+            "deleted": self.deleted(),
+        }
+        write_bytes(archive, json.dumps(index, indent=1).encode("utf-8"), DELTA_INDEX_NAME)
+
+    def save(self, archive_name):
+        files = dict(self.files)
+        if self.incremental:
+            # Keep what earlier runs collected and this run left out
+            for source, entry in self.previous["files"].items():
+                if source not in files and (entry[3] not in self.categories or os.path.exists(source)):
+                    files[source] = entry
+            base_archive = self.previous.get("base_archive")
+        else:
+            base_archive = archive_name
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "archive": archive_name,
+            "base_archive": base_archive,
+            "files": files,
+            "budget": self.budget,
+            "left_out": self.left_out,
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import datetime
+import threading
+import contextlib
+from collector_archive import ARCHIVE_CANCELLED, ARCHIVE_EMPTY, ARCHIVE_FAILED, ARCHIVE_OK, ARCHIVE_PARTIAL, write_bytes
+from collector_writers import archive_format
+
+METRICS_VERSION = 1
+# Name of the copy stored inside the archive (--embed-metrics)
+METRICS_NAME = "metrics.json"
+# Failed files listed by name; beyond that only counted
+MAX_LISTED_FAILURES = 200
+
+STATUS_NAMES = {
+    ARCHIVE_OK: "ok",
+    ARCHIVE_FAILED: "failed",
+    ARCHIVE_EMPTY: "empty",
+    ARCHIVE_CANCELLED: "cancelled",
+    ARCHIVE_PARTIAL: "partial",
+}
+
+
+def metrics_path(archive_path):
+    # The sidecar lives next to the archive: <archive>.metrics.json
+    fmt = archive_format(archive_path)
+    base = archive_path[:-len(fmt) - 1] if fmt else os.path.splitext(archive_path)[0]
+    return base + ".metrics.json"
+
+
+# --- Counters of one run, cheap enough to update for every file ---
+class RunMetrics:
+    # Fed by callbacks the collectors already have: the scanner's on_skip, the
+    # archiver's on_written/on_stored/on_failed, plus phase() around each stage.
+    # Files and bytes are those actually read (on_stored): a file linked to one
+    # already stored (collector_archive.Deduplicator) reads nothing. Time spent
+    # compressing is charged to the category of the file just written (one
+    # perf_counter call per file), which is where the run time goes.
+
+    def __init__(self, embed=False):
+        self.embed_in_archive = embed
+        self.started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._last_write = None
+        self.phases = {}
+        self.categories = {}
+        self.skipped = {}
+        self.failed = {}
+        self.failures = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        if name == "archive":
+            self._last_write = start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+            if name == "archive":
+                self._last_write = None
+
+    def _category(self, category):
+        stats = self.categories.get(category)
+        if stats is None:
+            stats = self.categories[category] = {"files": 0, "bytes": 0, "seconds": 0.0}
+        return stats
+
+    def on_skip(self, path, reason):
+        with self._lock:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def on_stored(self, entry, read):
+        with self._lock:
+            stats = self._category(entry.category)
+            stats["files"] += 1
+            stats["bytes"] += read
+
+    def on_written(self, entry, digest):
+        now = time.perf_counter()
+        with self._lock:
+            stats = self._category(entry.category)
+            if self._last_write is not None:
+                stats["seconds"] += now - self._last_write
+            self._last_write = now
+
+    def on_failed(self, source, reason, category=None):
+        with self._lock:
+            self.failed[reason] = self.failed.get(reason, 0) + 1
+            if len(self.failures) < MAX_LISTED_FAILURES:
+                self.failures.append({"path": source, "category": category, "reason": reason})
+            if self._last_write is not None:
+                self._last_write = time.perf_counter()
+
+    @property
+    def failed_count(self):
+        return sum(self.failed.values())
+
+    def summary(self, status, archive_path=None):
+        wall = time.perf_counter() - self._start
+        files = sum(stats["files"] for stats in self.categories.values())
+        read = sum(stats["bytes"] for stats in self.categories.values())
+        archive_bytes = os.path.getsize(archive_path) if archive_path and os.path.isfile(archive_path) else None
+        return {
+            "version": METRICS_VERSION,
+            "started": self.started.isoformat(timespec="seconds"),
+            "status": STATUS_NAMES.get(status, status),
+            "archive": os.path.basename(archive_path) if archive_path else None,
+            "wall_s": round(wall, 3),
+            "phases_s": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "files": files,
+            "bytes_read": read,
+            "archive_bytes": archive_bytes,
+            "ratio": round(archive_bytes / read, 4) if archive_bytes and read else None,
+            "categories": {
+                category: dict(stats, seconds=round(stats["seconds"], 3))
+                for category, stats in sorted(self.categories.items(), key=lambda item: -item[1]["seconds"])
+            },
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "failures": self.failures,
+        }
+
+    def embed(self, archive):
+        # finish() callback: the copy inside the archive is taken before it is closed
+        data = json.dumps(self.summary("in_progress"), indent=1).encode("utf-8")
+        write_bytes(archive, data, METRICS_NAME)
+
+    def write(self, path, status, archive_path=None):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.summary(status, archive_path), f, indent=1)
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,54 @@
+import logging
+import threading
+from collector_cancel import CancelToken
+
+
+# --- Scans of the selected categories, run ahead in the background ---
+class ScanPrefetcher:
+    # warm() runs a category's scan in a background thread when the category is
+    # selected. Listing the folders and stat'ing the files is most of a scan on a
+    # cold disk; the collection's own scan then finds that metadata in the OS cache.
+    # Nothing is copied or kept: the collection reads every file from its source, once.
+    # cancel() and close() stop a warm-up through its scan's cancel token; close()
+    # does not wait for the (daemon) threads, so the window closes at once.
+
+    def __init__(self):
+        self._warmers = {}  # category -> (thread, cancel token)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def warm(self, category, scan):
+        # scan: callable taking cancel= (a CancelToken) and returning an iterable of
+        # (FileRecord, ...) tuples, such as a partial of collector_core.iter_category_files
+        with self._lock:
+            if self._closed:
+                return
+            warmer = self._warmers.get(category)
+            if warmer and warmer[0].is_alive() and not warmer[1].cancelled():
+                return
+            cancel = CancelToken()
+            thread = threading.Thread(target=self._warm, args=(category, scan, cancel), daemon=True)
+            self._warmers[category] = (thread, cancel)
+        thread.start()
+
+    def cancel(self, category):
+        # Stops warming a category that was unselected
+        warmer = self._warmers.get(category)
+        if warmer:
+            warmer[1].cancel()
+
+    def _warm(self, category, scan, cancel):
+        logging.info(f"[{category}] Prefetching the file list...")
+        files = size = 0
+        for record, *_ in scan(cancel=cancel):
+            files += 1
+            size += record.size
+        if not cancel.cancelled():
+            logging.info(f"[{category}] Prefetch complete: {files} file(s), {size} bytes")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            warmers = list(self._warmers.values())
+        for _, cancel in warmers:
+            cancel.cancel()
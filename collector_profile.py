@@ -0,0 +1,262 @@
+import os
+import re
+import sys
+import json
+import datetime
+from collections import namedtuple
+from collector_budget import DEFAULT_WEIGHT, parse_size
+from collector_filter import DEFAULT_CONTEXT, DEFAULT_FILTER_FILES, LineFilter
+from collector_scan import FileMatcher, FileRules, RotationPolicy, parse_age, parse_time_spec
+
+# A profile with this name next to the executable (or the scripts) replaces the built-in one
+PROFILE_NAME = "collector_profile.json"
+
+# Built-in profile, in the same format as a profile file. Top-level rules apply
+# to every category; a category may override max_file_size/max_age/include and
+# add exclude/capture globs of its own. "event_logs" marks the category the
+# Windows event logs are exported into. A "filter" (top level or per category,
+# null to turn the top-level one off) keeps only matching lines of text logs,
+# e.g. {"levels": ["ERROR", "WARN"], "keywords": ["timeout"], "since": "7d",
+# "context": 2, "files": ["*.log"]}; none is set by default. A "rotation" policy
+# (same places) limits the rotated generations of each log (foo.log.1, foo.2.log,
+# foo.log.3.gz, ...): {"keep": 5, "max_age": "3d", "max_bytes": "200M"}.
+DEFAULT_PROFILE = {
+    "max_file_size": "8M",
+    "exclude": ["*.dll", "*.exe", "*.bin", "*.msi", "*.dat", "*.rar", "*.gz", "*.cab"],
+    # Oversized text logs are kept as head + tail instead of being dropped
+    "capture": ["*.log", "*.txt", "*.csv", "*.xml", "*.json", "*.trace", "*.out", "*.err"],
+    "categories": {
+        "Automation Manager": {
+            "paths": [
+                r"C:\Program Files (x86)\N-able Technologies\AutomationManager\logs",
+                r"C:\Program Files (x86)\Advanced Monitoring Agent\scriptrunner",
+                r"C:\ProgramData\N-able Technologies\AutomationManager\log",
+                r"C:\ProgramData\N-able Technologies\AutomationManager\scripts",
+            ],
+        },
+        "MSP Core": {
+            "paths": [r"C:\Program Files (x86)\Msp Agent"],
+            "weight": 2,
+        },
+        "Vulnerability Management": {
+            "paths": [
+                r"C:\Program Files (x86)\Msp Agent\Components\software-scanner",
+                r"C:\ProgramData\N-able Technologies\Vulnerability Management\logs",
+            ],
+        },
+        "Take Control Console": {
+            "paths": [r"%LOCALAPPDATA%\BeAnywhere Support Express\Console\Logs"],
+        },
+        "Take Control StandAlone Agent": {
+            "paths": [r"%ALLUSERSPROFILE%\GetSupportService\Logs"],
+        },
+        "N-sight Agent": {
+            "paths": [
+                r"C:\Program Files (x86)\Advanced Monitoring Agent",
+                r"C:\Program Files (x86)\Advanced Monitoring Agent GP",
+                r"%ProgramData%\MspPlatform\PME\log",
+                r"%ProgramData%\MspPlatform\FileCacheServiceAgent\log",
+                r"%ProgramData%\MspPlatform\PME.Agent.PmeService\log",
+                r"%ProgramData%\MspPlatform\RequestHandlerAgent\log",
+                r"%ProgramData%\AdvancedMonitoringAgentWebProtection",
+                r"%ProgramData%\AdvancedMonitoringAgentNetworkManagement",
+                r"%ProgramData%\GetSupportService_LOGICnow",
+            ],
+            "weight": 2,
+        },
+        "Take Control Viewer": {
+            "paths": [r"%LOCALAPPDATA%\Take Control Viewer\Logs"],
+        },
+        "Event Viewer Logs": {
+            "event_logs": True,
+            "weight": 3,
+        },
+    },
+}
+
+_PROFILE_KEYS = {"max_file_size", "max_age", "exclude", "include", "capture", "filter", "rotation", "categories"}
+_CATEGORY_KEYS = {"paths", "event_logs", "weight", "max_file_size", "max_age", "exclude", "include", "capture",
+                  "filter", "rotation"}
+_FILTER_KEYS = {"levels", "keywords", "since", "until", "context", "files"}
+_ROTATION_KEYS = {"keep", "max_age", "max_bytes"}
+
+# One compiled category: paths expanded and normalised, rules a FileRules,
+# line_filter a LineFilter or None
+Category = namedtuple("Category", "name paths event_logs weight rules line_filter")
+
+
+def _clean_path(path):
+    # %VARS% expanded; trailing separators dropped ("logs\\" and "logs" are one root)
+    path = os.path.expandvars(path)
+    if re.fullmatch(r"[A-Za-z]:[\\/]*", path):
+        return path[:2] + "\\"
+    return os.path.normpath(path.rstrip("\\/"))
+
+
+def _size(value, where):
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return parse_size(str(value))
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}")
+
+
+def _age(value, where):
+    if value is None:
+        return None
+    try:
+        return parse_age(str(value))
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}")
+
+
+def _globs(value, where):
+    if not isinstance(value, list) or not all(isinstance(glob, str) for glob in value):
+        raise ValueError(f"{where}: expected a list of globs")
+    return value
+
+
+def _time(value, where):
+    if value is None:
+        return None
+    try:
+        return parse_time_spec(str(value))
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}")
+
+
+def _line_filter(value, where):
+    if value is None:
+        return None
+    _check_keys(value, _FILTER_KEYS, where)
+    levels = _globs(value.get("levels", []), f"{where} levels")
+    keywords = _globs(value.get("keywords", []), f"{where} keywords")
+    since = _time(value.get("since"), f"{where} since")
+    until = _time(value.get("until"), f"{where} until")
+    context = value.get("context", DEFAULT_CONTEXT)
+    if not isinstance(context, int) or context < 0:
+        raise ValueError(f"{where}: context must be a whole number of lines")
+    files = _globs(value.get("files", list(DEFAULT_FILTER_FILES)), f"{where} files")
+    if not (levels or keywords or since is not None or until is not None):
+        raise ValueError(f"{where}: give levels, keywords, since or until")
+    # Recorded in the archive as given, relative times resolved
+    settings = dict(value, context=context, files=files)
+    for key, epoch in (("since", since), ("until", until)):
+        if epoch is not None:
+            settings[key] = datetime.datetime.fromtimestamp(epoch).isoformat(timespec="seconds")
+    return LineFilter(levels, keywords, since, until, context, files, settings)
+
+
+def _rotation(value, where):
+    if value is None:
+        return None
+    _check_keys(value, _ROTATION_KEYS, where)
+    keep = value.get("keep")
+    if keep is not None and (not isinstance(keep, int) or keep < 1):
+        raise ValueError(f"{where}: keep must be a whole number of generations, at least 1")
+    policy = RotationPolicy(keep, _age(value.get("max_age"), f"{where} max_age"),
+                            _size(value.get("max_bytes"), f"{where} max_bytes"))
+    if policy == RotationPolicy():
+        raise ValueError(f"{where}: give keep, max_age or max_bytes")
+    return policy
+
+
+def _check_keys(data, allowed, where):
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: expected an object")
+    unknown = set(data) - allowed
+    if unknown:
+        raise ValueError(f"{where}: unknown option(s) {', '.join(sorted(unknown))}")
+
+
+# --- A profile compiled once at startup ---
+class Profile:
+    # categories keeps the profile's order (the GUI lists them in it). Matching is
+    # done by the FileMatchers of each category's FileRules: an extension set and
+    # one combined regex, never a per-file loop over the globs.
+
+    def __init__(self, data, source=None):
+        self.source = source
+        _check_keys(data, _PROFILE_KEYS, "profile")
+        self.max_file_size = _size(data.get("max_file_size"), "max_file_size")
+        max_age = _age(data.get("max_age"), "max_age")
+        exclude = _globs(data.get("exclude", []), "exclude")
+        include = _globs(data.get("include", []), "include")
+        capture = _globs(data.get("capture", []), "capture")
+        line_filter = _line_filter(data.get("filter"), "filter")
+        rotation = _rotation(data.get("rotation"), "rotation")
+
+        # Rules of a category the profile does not list (e.g. one added by a caller)
+        self.default_rules = FileRules(FileMatcher(exclude) or None, FileMatcher(include) or None,
+                                       FileMatcher(capture) or None, self.max_file_size, max_age, rotation)
+
+        categories = data.get("categories")
+        if not isinstance(categories, dict) or not categories:
+            raise ValueError("profile: 'categories' must list at least one category")
+        self.categories = {}
+        for name, options in categories.items():
+            where = f"category '{name}'"
+            _check_keys(options, _CATEGORY_KEYS, where)
+            paths = [_clean_path(path) for path in _globs(options.get("paths", []), f"{where} paths")]
+            category_include = _globs(options.get("include", include), f"{where} include")
+            rules = FileRules(
+                exclude=FileMatcher(exclude + _globs(options.get("exclude", []), f"{where} exclude")) or None,
+                include=FileMatcher(category_include) or None,
+                capture=FileMatcher(capture + _globs(options.get("capture", []), f"{where} capture")) or None,
+                max_size=_size(options["max_file_size"], f"{where} max_file_size")
+                if "max_file_size" in options else self.max_file_size,
+                max_age=_age(options["max_age"], f"{where} max_age") if "max_age" in options else max_age,
+                rotation=_rotation(options["rotation"], f"{where} rotation") if "rotation" in options else rotation,
+            )
+            weight = options.get("weight", DEFAULT_WEIGHT)
+            if not isinstance(weight, int):
+                raise ValueError(f"{where}: weight must be a whole number")
+            category_filter = _line_filter(options["filter"], f"{where} filter") if "filter" in options else line_filter
+            self.categories[name] = Category(name, paths, bool(options.get("event_logs")), weight, rules,
+                                             category_filter)
+
+    def category_paths(self, exporter=None):
+        # {category: [paths]} as the engines use it; an event log category gets
+        # [exporter] (the engine's export function), or [] without one
+        return {
+            name: ([exporter] if exporter else []) if category.event_logs else list(category.paths)
+            for name, category in self.categories.items()
+        }
+
+    def rules(self):
+        return {name: category.rules for name, category in self.categories.items()}
+
+    def weights(self):
+        return {name: category.weight for name, category in self.categories.items()}
+
+    def filters(self):
+        return {name: category.line_filter
+                for name, category in self.categories.items() if category.line_filter is not None}
+
+    def event_categories(self):
+        return {name for name, category in self.categories.items() if category.event_logs}
+
+
+def default_profile_path():
+    base = os.path.dirname(sys.executable if getattr(sys, "frozen", False) else os.path.abspath(__file__))
+    return os.path.join(base, PROFILE_NAME)
+
+
+# --- Load a profile file, or the built-in profile ---
+def load_profile(path=None):
+    # Without a path, a collector_profile.json next to the executable is used if
+    # there is one. Raises ValueError (or OSError) for a profile that cannot be used.
+    if path is None:
+        path = default_profile_path()
+        if not os.path.isfile(path):
+            return Profile(DEFAULT_PROFILE)
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: {e}")
+    try:
+        return Profile(data, path)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}")
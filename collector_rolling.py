@@ -0,0 +1,381 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import logging
+import datetime
+import tempfile
+from collector_archive import ArchiveEntry, CompressionPolicy, stream_to_archive, write_bytes
+from collector_scan import FileMatcher, TimeWindow, scan_planned
+from collector_throttle import open_slot
+
+# Compressed bytes kept in the ring; the oldest segments go first
+RING_SIZE = 512 * 1024 * 1024
+# Seconds between checks of the followed logs, folder rescans and event log snapshots
+POLL_INTERVAL = 30
+RESCAN_INTERVAL = 600
+EVENT_INTERVAL = 900
+# A segment file is closed once it holds this many compressed bytes
+SEGMENT_BYTES = 4 * 1024 * 1024
+# Of a log already there when the capture starts, only its end is kept
+FIRST_CAPTURE_BYTES = 1024 * 1024
+# A log that grew by more than this between two polls is read from this far before its end
+MAX_CATCH_UP = 16 * 1024 * 1024
+# Logs followed in categories whose rules have no capture globs
+FOLLOW_FILES = ("*.log", "*.txt")
+
+# Files in the store folder: the ring's state, and the snapshot request/answer
+STATE_NAME = "ring.json"
+TRIGGER_NAME = "snapshot.request"
+DONE_NAME = "snapshot.done"
+# Where a bundle says which bytes of which log each segment holds
+BUNDLE_INDEX_NAME = "rolling_index.json"
+# Segments are gzip already: the bundle only stores them
+BUNDLE_POLICY = CompressionPolicy(default="store")
+
+_READ_SIZE = 1024 * 1024
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _gzip(data):
+    # One gzip member; members appended to one file read back as one stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def lower_priority():
+    # Below-normal CPU priority for the resident process
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            ctypes.windll.kernel32.SetPriorityClass(ctypes.windll.kernel32.GetCurrentProcess(), 0x4000)
+        else:
+            os.nice(10)
+    except (OSError, AttributeError):
+        pass
+
+
+# --- Recent log data kept compressed on disk, ready to bundle ---
+class RollingCapture:
+    # Follows the text logs of categories (the engine's map; an event log exporter
+    # in it is called every EVENT_INTERVAL for the events since the last call).
+    # New bytes of a log are gzip-appended to its current segment file in
+    # store_dir; once the segments hold more than ring_size bytes the oldest are
+    # deleted. Logs are tracked by file id, so a log rotated (renamed) between two
+    # polls is read to its end under its new name, and one truncated in place is
+    # read again from the start. Nothing is kept in memory but the offsets and the segment list, both
+    # saved to STATE_NAME so a restart carries on where it stopped.
+
+    def __init__(self, categories, store_dir, ring_size=RING_SIZE, category_rules=None, default_rules=None,
+                 throttle=None, cancel=None):
+        self.categories = {category: [path for path in paths if not callable(path)]
+                           for category, paths in categories.items()}
+        self.exporters = [(category, path) for category, paths in categories.items()
+                          for path in paths if callable(path)]
+        self.store_dir = store_dir
+        self.segment_dir = os.path.join(store_dir, "segments")
+        self.ring_size = ring_size
+        self.category_rules = category_rules or {}
+        self.default_rules = default_rules
+        self.throttle = throttle
+        self.cancel = cancel
+        self.follow_files = FileMatcher(list(FOLLOW_FILES))
+        self.files = {}         # file id -> {"path", "offset", "category", "segment"}
+        self.segments = []      # oldest first; see _new_segment
+        self.next_seq = 0
+        self.events_since = None
+        self.scanned = False
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._load()
+
+    # --- State ---
+    def _load(self):
+        try:
+            with open(os.path.join(self.store_dir, STATE_NAME), encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.files = state.get("files", {})
+        self.segments = [seg for seg in state.get("segments", []) if os.path.exists(self._path(seg))]
+        self.next_seq = state.get("next_seq", 0)
+        self.events_since = state.get("events_since")
+        self.scanned = bool(self.files)
+
+    def save(self):
+        path = os.path.join(self.store_dir, STATE_NAME)
+        state = {"files": self.files, "segments": self.segments, "next_seq": self.next_seq,
+                 "events_since": self.events_since}
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"Could not save the rolling capture state: {e}")
+
+    @property
+    def total(self):
+        return sum(seg["bytes"] for seg in self.segments)
+
+    def _path(self, seg):
+        return os.path.join(self.segment_dir, f"{seg['seq']:08d}.gz")
+
+    # --- Segments ---
+    def _new_segment(self, category, source, start):
+        seg = {"seq": self.next_seq, "category": category, "source": source, "start": start, "end": start,
+               "first": _now(), "last": _now(), "bytes": 0}
+        self.next_seq += 1
+        self.segments.append(seg)
+        return seg
+
+    def _append(self, seg, data, end):
+        packed = _gzip(data)
+        with open(self._path(seg), "ab") as f:
+            f.write(packed)
+        seg["bytes"] += len(packed)
+        seg["end"] = end
+        seg["last"] = _now()
+
+    def _evict(self):
+        total = self.total
+        while total > self.ring_size and len(self.segments) > 1:
+            seg = self.segments.pop(0)
+            total -= seg["bytes"]
+            try:
+                os.remove(self._path(seg))
+            except OSError:
+                pass
+            for state in self.files.values():
+                if state["segment"] == seg["seq"]:
+                    state["segment"] = None
+
+    def _segment_for(self, state, start):
+        # The source's open segment if it continues where that one ends, else a new one
+        seq = state.get("segment")
+        if seq is not None:
+            for seg in reversed(self.segments):
+                if seg["seq"] == seq:
+                    if seg["end"] == start and seg["bytes"] < SEGMENT_BYTES:
+                        return seg
+                    break
+        seg = self._new_segment(state["category"], state["path"], start)
+        state["segment"] = seg["seq"]
+        return seg
+
+    # --- Following the logs ---
+    def follows(self, path, category):
+        rules = self.category_rules.get(category, self.default_rules)
+        matcher = rules.capture if rules is not None and rules.capture is not None else self.follow_files
+        return matcher.matches(path, os.path.basename(path))
+
+    @staticmethod
+    def _id(path):
+        # dev:inode (volume serial and file index on Windows); survives a rename
+        st = os.stat(path)
+        return f"{st.st_dev}:{st.st_ino}", st.st_size
+
+    def _add(self, path, category, offset):
+        try:
+            file_id, size = self._id(path)
+        except OSError:
+            return
+        if file_id not in self.files:
+            self.files[file_id] = {"path": path, "offset": min(offset, size) if offset is not None else
+                                   max(size - FIRST_CAPTURE_BYTES, 0), "category": category, "segment": None}
+
+    def rescan(self):
+        # New logs: at the first scan only their end is kept, later ones are read whole
+        followed = {state["path"] for state in self.files.values()}
+        for record, owners in scan_planned(self.categories, 1, self.category_rules, rules=self.default_rules,
+                                           cancel=self.cancel, throttle=self.throttle):
+            category = owners[0][1]
+            if record.source not in followed and self.follows(record.source, category):
+                self._add(record.source, category, 0 if self.scanned else None)
+        self.scanned = True
+        self.poll()
+
+    def poll(self):
+        for file_id in list(self.files):
+            if self.cancel is not None and self.cancel.cancelled():
+                break
+            self._follow(file_id)
+        self._evict()
+
+    def _find_moved(self, path, file_id):
+        # A rotated log: the same file under another name in the same folder
+        try:
+            with os.scandir(os.path.dirname(path)) as it:
+                for item in it:
+                    if item.path != path and item.is_file():
+                        try:
+                            if self._id(item.path)[0] == file_id:
+                                return item.path
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return None
+
+    def _follow(self, file_id):
+        state = self.files[file_id]
+        path = state["path"]
+        try:
+            current, size = self._id(path)
+        except OSError:
+            current = None
+        if current != file_id:
+            # Rotated (renamed) or deleted: follow the file to its new name, and pick
+            # up the new log at the old one from its start
+            moved = self._find_moved(path, file_id)
+            if current is not None:
+                self._add(path, state["category"], 0)
+            if moved is None:
+                del self.files[file_id]
+                return
+            state["path"] = moved
+            try:
+                size = self._id(moved)[1]
+            except OSError:
+                return
+        if size < state["offset"]:
+            # Truncated in place (copytruncate)
+            state.update(offset=0, segment=None)
+        if size > state["offset"]:
+            try:
+                self._read(state, file_id, size)
+            except OSError as e:
+                logging.warning(f"Rolling capture: could not read {state['path']}: {e}")
+
+    def _read(self, state, file_id, end):
+        # Appends the bytes from the state's offset to end to its segments
+        start = state["offset"]
+        if end - start > MAX_CATCH_UP:
+            logging.info(f"Rolling capture: {state['path']} grew by {end - start} bytes, "
+                         f"keeping the last {MAX_CATCH_UP}")
+            start = end - MAX_CATCH_UP
+            state["segment"] = None
+        with open_slot(self.throttle), open(state["path"], "rb") as f:
+            st = os.fstat(f.fileno())
+            if f"{st.st_dev}:{st.st_ino}" != file_id:
+                return
+            f.seek(start)
+            pos = start
+            while pos < end:
+                size = min(_READ_SIZE, end - pos)
+                data = self.throttle.read(f, size) if self.throttle is not None else f.read(size)
+                if not data:
+                    break
+                self._append(self._segment_for(state, pos), data, pos + len(data))
+                pos += len(data)
+        state["offset"] = pos
+
+    # --- Event logs ---
+    def snapshot_events(self):
+        # Every exporter, for the events since its last run
+        since = self.events_since
+        now = time.time()
+        window = TimeWindow(since, None) if since is not None else TimeWindow(now - EVENT_INTERVAL, None)
+        for category, export in self.exporters:
+            export_dir = tempfile.mkdtemp(dir=self.store_dir)
+            try:
+                logs_dir = export(export_dir, window, self.cancel)
+                for name in sorted(os.listdir(logs_dir)):
+                    path = os.path.join(logs_dir, name)
+                    seg = self._new_segment(category, f"EventLogs/{name}", 0)
+                    with open(path, "rb") as f:
+                        for data in iter(lambda: f.read(_READ_SIZE), b""):
+                            self._append(seg, data, seg["end"] + len(data))
+            except Exception as e:
+                logging.warning(f"Rolling capture: event log export failed: {e}")
+            finally:
+                shutil.rmtree(export_dir, ignore_errors=True)
+        self.events_since = now
+        self._evict()
+
+    # --- Bundles ---
+    def _arcname(self, seg):
+        _, relative = os.path.splitdrive(seg["source"])
+        return os.path.join(seg["category"], relative.lstrip("\\/") + f".{seg['seq']:08d}.gz")
+
+    def bundle(self, archive_path):
+        # The latest appends first (the first scan, for a snapshot asked for as the
+        # capture starts), then every segment stored as it is: a few seconds
+        # whatever the ring size. Returns stream_to_archive's status.
+        if self.scanned:
+            self.poll()
+        else:
+            self.rescan()
+        self.save()
+        entries = [ArchiveEntry(self._path(seg), self._arcname(seg), seg["category"]) for seg in self.segments]
+        index = {
+            "created": _now(),
+            "ring_size": self.ring_size,
+            "segments": [
+                {"arcname": self._arcname(seg), "source": seg["source"], "category": seg["category"],
+                 "start": seg["start"], "end": seg["end"], "first": seg["first"], "last": seg["last"]}
+                for seg in self.segments
+            ],
+        }
+
+        def finish(archive):
+            write_bytes(archive, json.dumps(index, indent=1).encode("utf-8"), BUNDLE_INDEX_NAME)
+
+        return stream_to_archive(archive_path, entries, BUNDLE_POLICY, finish=finish, dedupe=False,
+                                 cancel=self.cancel)
+
+    # --- Resident loop ---
+    def run(self, make_archive_path, poll_interval=POLL_INTERVAL, rescan_interval=RESCAN_INTERVAL,
+            event_interval=EVENT_INTERVAL):
+        # Until cancelled. A TRIGGER_NAME file in store_dir (request_snapshot) makes
+        # it write a bundle to make_archive_path() and answer in DONE_NAME.
+        trigger = os.path.join(self.store_dir, TRIGGER_NAME)
+        next_scan = next_poll = next_events = 0
+        while self.cancel is None or not self.cancel.cancelled():
+            now = time.monotonic()
+            if os.path.exists(trigger):
+                archive_path = make_archive_path()
+                status = self.bundle(archive_path)
+                with open(os.path.join(self.store_dir, DONE_NAME), "w", encoding="utf-8") as f:
+                    json.dump({"archive": archive_path, "status": status}, f)
+                os.remove(trigger)
+            if now >= next_scan or now >= next_poll or (self.exporters and now >= next_events):
+                if now >= next_scan:
+                    self.rescan()
+                    next_scan = now + rescan_interval
+                else:
+                    self.poll()
+                next_poll = now + poll_interval
+                if self.exporters and now >= next_events:
+                    self.snapshot_events()
+                    next_events = now + event_interval
+                self.save()
+            if self.cancel is not None:
+                self.cancel.wait(1)
+            else:
+                time.sleep(1)
+
+
+# --- Ask a running capture for a bundle ---
+def request_snapshot(store_dir, timeout=120):
+    # Returns the answer of the resident process ({"archive", "status"}), or None
+    # if none answered within timeout seconds
+    done = os.path.join(store_dir, DONE_NAME)
+    try:
+        os.remove(done)
+    except OSError:
+        pass
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, TRIGGER_NAME), "w", encoding="utf-8"):
+        pass
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(done, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            time.sleep(0.2)
+    return None
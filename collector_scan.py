@@ -0,0 +1,437 @@
+import os
+import re
+import stat
+import time
+import queue
+import fnmatch
+import datetime
+import threading
+from collections import namedtuple
+from collector_cancel import parse_duration
+from collector_scheduler import WorkStealingPool
+from collector_throttle import open_slot
+
+# One collected file. rel_path is relative to the scanned root (the file name
+# when a single file was scanned); size and mtime come from the scan's stat.
+# capped is the size cap (bytes) an oversized text log must be cut down to, else False.
+FileRecord = namedtuple("FileRecord", "source rel_path size mtime capped", defaults=(False,))
+
+# Reasons passed to on_skip
+SKIP_EXCLUDED = "excluded"
+SKIP_TOO_LARGE = "too_large"
+SKIP_UNREADABLE = "unreadable"
+SKIP_OUTSIDE_WINDOW = "outside_window"
+SKIP_ROTATED = "rotated"
+
+# Collection window as epoch seconds; either end may be None (open)
+TimeWindow = namedtuple("TimeWindow", "since until")
+
+# "*.log": a glob that only tests the extension
+_EXTENSION_GLOB = re.compile(r"\*\.[^*?\[\].\\/]+")
+
+# Rotated generations of a log: foo.log.3 or foo.log.2025-10-30 (a dot after the log
+# extension), and foo.2.log or foo_20251030.log when foo.log is in the same folder
+# (task_12.log alone is a log of its own); any of them, or foo.log itself, may be
+# compressed as a backlog
+_LOG_EXTENSION = r"\.(?:log|txt|out|err|trace|csv)"
+_GENERATION = r"(?:\d{1,4}|\d{4}-?\d{2}-?\d{2}(?:[T_.-]?\d{2}(?:[-.]?\d{2}){0,2})?)"
+_BACKLOG_SUFFIX = re.compile(r"\.(?:gz|bz2|xz|zst|zip)$", re.IGNORECASE)
+_ROTATED_AFTER = re.compile(f"(.+{_LOG_EXTENSION})\\.{_GENERATION}", re.IGNORECASE)
+_ROTATED_BEFORE = re.compile(f"(.+?)[._]{_GENERATION}({_LOG_EXTENSION})", re.IGNORECASE)
+_LOG_NAME = re.compile(f".+{_LOG_EXTENSION}", re.IGNORECASE)
+
+
+# --- Parse an age such as "48h" or "7d" into seconds ---
+def parse_age(text):
+    try:
+        return parse_duration(text, unit_required=True)
+    except ValueError:
+        raise ValueError(f"invalid age '{text}': use e.g. 48h or 7d") from None
+
+
+# --- Parse "48h", "7d", "2025-10-30" or "2025-10-30T12:00" into epoch seconds ---
+def parse_time_spec(text, now=None):
+    text = text.strip()
+    try:
+        age = parse_age(text)
+    except ValueError:
+        pass
+    else:
+        return (time.time() if now is None else now) - age
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"invalid time '{text}': use e.g. 48h, 7d or 2025-10-30T12:00")
+
+
+# --- Build a TimeWindow from --since/--until values (None if unbounded) ---
+def time_window(since=None, until=None, now=None):
+    if not since and not until:
+        return None
+    window = TimeWindow(
+        parse_time_spec(since, now) if since else None,
+        parse_time_spec(until, now) if until else None,
+    )
+    if window.since is not None and window.until is not None and window.since > window.until:
+        raise ValueError("--since must be earlier than --until")
+    return window
+
+
+def in_window(window, mtime):
+    if window is None:
+        return True
+    if window.since is not None and mtime < window.since:
+        return False
+    if window.until is not None and mtime > window.until:
+        return False
+    return True
+
+
+# --- Name of the log a rotated generation belongs to ---
+def rotation_series(name, folder_names=()):
+    # "foo.log" (lower case) for foo.log, foo.log.1 or foo.log.3.gz, and for foo.2.log
+    # if "foo.log" is in folder_names (lower-case names of the files next to it);
+    # None for a file that is not a log
+    stem = _BACKLOG_SUFFIX.sub("", name)
+    match = _ROTATED_AFTER.fullmatch(stem)
+    if match:
+        return match.group(1).lower()
+    match = _ROTATED_BEFORE.fullmatch(stem)
+    if match and (match.group(1) + match.group(2)).lower() in folder_names:
+        return (match.group(1) + match.group(2)).lower()
+    return stem.lower() if _LOG_NAME.fullmatch(stem) else None
+
+
+# --- Normalise an extension list into a set lookup ---
+def extension_set(extensions):
+    return frozenset(
+        (ext if ext.startswith(".") else "." + ext).lower()
+        for ext in extensions
+    )
+
+
+def _compile_globs(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE)
+
+
+# --- Include/exclude globs compiled once into a single lookup ---
+class FileMatcher:
+    # "*.ext" globs become one extension set lookup, every other glob goes into a
+    # combined case-insensitive regex. Globs with a path separator ("*\Temp\*") are
+    # matched against the whole path, the others against the file name only.
+
+    def __init__(self, patterns=()):
+        self.patterns = tuple(patterns)
+        extensions, names, paths = [], [], []
+        for pattern in self.patterns:
+            if _EXTENSION_GLOB.fullmatch(pattern):
+                extensions.append(pattern[1:])
+            elif "/" in pattern or "\\" in pattern:
+                paths.append(pattern.replace("\\", "/"))
+            else:
+                names.append(pattern)
+        self.extensions = extension_set(extensions)
+        self._names = _compile_globs(names)
+        self._paths = _compile_globs(paths)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def matches(self, path, name):
+        if self.extensions and os.path.splitext(name)[1].lower() in self.extensions:
+            return True
+        if self._names is not None and self._names.match(name):
+            return True
+        return self._paths is not None and self._paths.match(path.replace("\\", "/")) is not None
+
+
+# What a category collects, compiled once from its profile (collector_profile):
+#   exclude   FileMatcher of files never collected
+#   include   FileMatcher; when set, only matching files are collected
+#   capture   FileMatcher of oversized files kept as head + tail instead of skipped
+#   max_size  size cap in bytes (None: no cap)
+#   max_age   seconds; older files are skipped (None: no limit)
+#   rotation  RotationPolicy for the rotated generations of a log (None: all kept)
+FileRules = namedtuple("FileRules", "exclude include capture max_size max_age rotation", defaults=(None,) * 6)
+
+# Which generations of a rotation series (a log and its rotated copies in one
+# folder, see rotation_series) are collected; any limit may be None. The newest
+# generation is always kept, and a generation past a limit drops the older ones too.
+#   keep       newest generations kept
+#   max_age    seconds before the newest generation's last write
+#   max_bytes  bytes of the whole series (capped sizes for oversized logs)
+RotationPolicy = namedtuple("RotationPolicy", "keep max_age max_bytes", defaults=(None,) * 3)
+
+
+# --- Per-category rules applied to every scanned entry ---
+class _ScanRules:
+    # Every entry is stat'ed at most once (os.scandir gets it for free on Windows)
+    # and the rules are applied before anything is read, so excluded or oversized
+    # files are never copied. Files last modified outside window (a TimeWindow,
+    # narrowed by the category's max_age) are skipped. A folder found in overrides
+    # (normalised path -> FileRules, see scan_planned) and everything below it use
+    # those rules instead of its parent's. Folder listings count against throttle
+    # (an IOThrottle) like file reads do.
+
+    def __init__(self, rules=None, on_skip=None, window=None, cancel=None, throttle=None, overrides=None):
+        self.rules = rules or FileRules()
+        self.on_skip = on_skip
+        self.window = window
+        self.cancel = cancel
+        self.throttle = throttle
+        self.overrides = overrides or {}
+        self._windows = {}
+
+    def cancelled(self):
+        return self.cancel is not None and self.cancel.cancelled()
+
+    def skip(self, skipped_path, reason):
+        if self.on_skip is not None:
+            self.on_skip(skipped_path, reason)
+
+    def rules_for(self, path, inherited):
+        return self.overrides.get(_path_key(path), inherited) if self.overrides else inherited
+
+    def window_for(self, rules):
+        if rules.max_age is None:
+            return self.window
+        window = self._windows.get(rules.max_age)
+        if window is None:
+            since = time.time() - rules.max_age
+            if self.window is not None:
+                window = TimeWindow(max(since, self.window.since or since), self.window.until)
+            else:
+                window = TimeWindow(since, None)
+            self._windows[rules.max_age] = window
+        return window
+
+    def excluded(self, entry_path, name, rules):
+        if (rules.exclude is not None and rules.exclude.matches(entry_path, name)) or (
+                rules.include is not None and not rules.include.matches(entry_path, name)):
+            self.skip(entry_path, SKIP_EXCLUDED)
+            return True
+        return False
+
+    def capped(self, entry_path, name, st, rules):
+        # None means skip the entry, otherwise the size cap it must be cut to (False: none)
+        if not in_window(self.window_for(rules), st.st_mtime):
+            self.skip(entry_path, SKIP_OUTSIDE_WINDOW)
+            return None
+        if rules.max_size is None or st.st_size <= rules.max_size:
+            return False
+        if rules.capture is not None and rules.capture.matches(entry_path, name):
+            return rules.max_size
+        self.skip(entry_path, SKIP_TOO_LARGE)
+        return None
+
+    def start(self, path):
+        # (records, folders to list) for a scan root, which may be a single file
+        rules = self.rules_for(path, self.rules)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return [], []
+        if stat.S_ISREG(st.st_mode):
+            name = os.path.basename(path)
+            if not self.excluded(path, name, rules):
+                cap = self.capped(path, name, st, rules)
+                if cap is not None:
+                    return [FileRecord(path, name, st.st_size, st.st_mtime, cap)], []
+            return [], []
+        if stat.S_ISDIR(st.st_mode):
+            return [], [(path, "", rules)]
+        return [], []
+
+    def list_dir(self, dir_path, rel_dir, rules):
+        # (records, subfolders) of one folder, subfolders in listing order
+        try:
+            with open_slot(self.throttle):
+                start = time.perf_counter()
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            if self.throttle is not None:
+                self.throttle.account(0, time.perf_counter() - start)
+        except OSError:
+            self.skip(dir_path, SKIP_UNREADABLE)
+            return [], []
+
+        records = []
+        subdirs = []
+        for entry in entries:
+            if self.cancelled():
+                break
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((entry.path, rel_path, self.rules_for(entry.path, rules)))
+                    continue
+                if not entry.is_file():
+                    continue
+                if self.excluded(entry.path, entry.name, rules):
+                    continue
+                st = entry.stat()
+            except OSError:
+                self.skip(entry.path, SKIP_UNREADABLE)
+                continue
+            cap = self.capped(entry.path, entry.name, st, rules)
+            if cap is not None:
+                records.append(FileRecord(entry.path, rel_path, st.st_size, st.st_mtime, cap))
+        if rules.rotation is not None:
+            records = self.rotated(records, rules.rotation, {entry.name.lower() for entry in entries})
+        return records, subdirs
+
+    def rotated(self, records, policy, folder_names=()):
+        # The records of one folder (folder_names: the lower-case names of all its
+        # files), with each rotation series cut down by policy. A series' generations
+        # are put next to each other, oldest first, so they follow one another in
+        # the compressed stream.
+        series = {}
+        for record in records:
+            base = rotation_series(os.path.basename(record.source), folder_names)
+            series.setdefault(base or record.source, []).append(record)
+        kept = []
+        for group in series.values():
+            if len(group) > 1:
+                group.sort(key=lambda record: record.mtime, reverse=True)
+                newest = group[0].mtime
+                used = 0
+                for i, record in enumerate(group):
+                    size = record.capped or record.size
+                    if i and ((policy.keep is not None and i >= policy.keep)
+                              or (policy.max_age is not None and record.mtime < newest - policy.max_age)
+                              or (policy.max_bytes is not None and used + size > policy.max_bytes)):
+                        for dropped in group[i:]:
+                            self.skip(dropped.source, SKIP_ROTATED)
+                        group = group[:i]
+                        break
+                    used += size
+                group.reverse()
+            kept.extend(group)
+        return kept
+
+
+# --- Scan a file or folder in a single pass ---
+def scan_path(path, rules=None, on_skip=None, window=None, cancel=None, throttle=None, overrides=None):
+    # Lazily yields FileRecords, folder by folder (see _ScanRules for the rules).
+    # The scan stops quietly once cancel (a CancelToken) is cancelled.
+    scan = _ScanRules(rules, on_skip, window, cancel, throttle, overrides)
+    records, pending = scan.start(path)
+    yield from records
+    while pending and not scan.cancelled():
+        records, subdirs = scan.list_dir(*pending.pop())
+        yield from records
+        # Visit subfolders in listing order, depth first like os.walk
+        pending.extend(reversed(subdirs))
+
+
+# --- Scan several files or folders at once, one task per folder ---
+def scan_many(paths, workers=None, **scan_options):
+    # Yields (path, FileRecord) as folders are listed, in no particular order.
+    # Every folder is its own task on a WorkStealingPool, so a big tree is spread
+    # over all workers instead of keeping one busy while the others idle.
+    scan = _ScanRules(**scan_options)
+    pool = WorkStealingPool(workers, scan.cancel)
+    results = queue.Queue()
+
+    def visit(path, dir_path, rel_dir, rules):
+        records, subdirs = scan.list_dir(dir_path, rel_dir, rules)
+        for subdir in subdirs:
+            pool.submit(visit, path, *subdir)
+        for record in records:
+            results.put((path, record))
+
+    def begin(path):
+        records, subdirs = scan.start(path)
+        for subdir in subdirs:
+            pool.submit(visit, path, *subdir)
+        for record in records:
+            results.put((path, record))
+
+    def run():
+        try:
+            pool.run()
+        finally:
+            results.put(None)
+
+    for path in paths:
+        pool.submit(begin, path)
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is None:
+            return
+        yield item
+
+
+# --- Path planning across categories ---
+def _path_key(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def is_within(path, root):
+    path, root = _path_key(path), _path_key(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def plan_roots(category_paths):
+    # Normalises every category root and collapses nested ones, so that each
+    # folder is scanned once. Returns [(top root, claims)] where claims lists
+    # (root, category) for every configured root at or below the top root,
+    # deepest first. Callables (event log exporters) are left to the caller.
+    roots = []
+    seen = set()
+    for category, paths in category_paths.items():
+        for path in paths:
+            if callable(path):
+                continue
+            root = os.path.normpath(path)
+            if (_path_key(root), category) not in seen:
+                seen.add((_path_key(root), category))
+                roots.append((root, category))
+
+    plan = []
+    planned = set()
+    for root, _ in roots:
+        if _path_key(root) in planned:
+            continue
+        if any(is_within(root, other) and _path_key(root) != _path_key(other) for other, _ in roots):
+            continue
+        planned.add(_path_key(root))
+        claims = sorted(((r, c) for r, c in roots if is_within(r, root)), key=lambda rc: -len(_path_key(rc[0])))
+        plan.append((root, claims))
+    return plan
+
+
+def claims_for(record, claims):
+    # The (root, category) pairs of a top root's claims whose root holds the file,
+    # most specific first - the first one is the category that owns it
+    if len(claims) == 1:
+        return claims
+    return [(root, category) for root, category in claims if is_within(record.source, root)]
+
+
+def scan_root(top, claims, **scan_options):
+    # Scans one planned top root. Yields (FileRecord, claims_for(record, claims)).
+    for record in scan_path(top, **scan_options):
+        yield record, claims_for(record, claims)
+
+
+def scan_planned(category_paths, workers=None, category_rules=None, **scan_options):
+    # Like scan_many over every category root, but nested roots are walked once.
+    # Yields (FileRecord, claims) as scan_root does. With category_rules
+    # (category -> FileRules) every root is scanned with the rules of the category
+    # that owns it, down to the next nested root; categories missing from it get
+    # the rules scan option.
+    plan = dict(plan_roots(category_paths))
+    if category_rules:
+        default = scan_options.get("rules") or FileRules()
+        overrides = {}
+        for claims in plan.values():
+            # Deepest first, so the owner of a root claimed twice is set last
+            for root, category in reversed(claims):
+                overrides[_path_key(root)] = category_rules.get(category, default)
+        scan_options["overrides"] = overrides
+    for top, record in scan_many(plan, workers, **scan_options):
+        yield record, claims_for(record, plan[top])
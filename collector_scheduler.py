@@ -0,0 +1,86 @@
+import os
+import logging
+import threading
+from collections import deque
+
+
+def default_workers():
+    # Same default as concurrent.futures.ThreadPoolExecutor: the work is I/O bound
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+# --- Thread pool where idle workers take queued tasks from busy ones ---
+class WorkStealingPool:
+    # Every worker has its own deque. Tasks submitted from inside a task (e.g. the
+    # subfolders of the folder being listed) go to the submitting worker's deque,
+    # which it works through newest first (depth first, like os.walk). A worker
+    # with nothing left steals the oldest task of the longest deque, i.e. the top
+    # of someone else's biggest remaining subtree.
+    # run() returns once every task, including those submitted while running, is
+    # done, or as soon as cancel (a CancelToken) is cancelled.
+
+    def __init__(self, workers=None, cancel=None):
+        self.workers = max(1, workers or default_workers())
+        self.cancel = cancel
+        self._queues = [deque() for _ in range(self.workers)]
+        self._pending = 0  # tasks submitted and not finished yet
+        self._next = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def submit(self, fn, *args):
+        with self._cond:
+            index = getattr(self._local, "index", None)
+            if index is None:
+                # From outside the pool: spread the initial tasks round-robin
+                index = self._next
+                self._next = (self._next + 1) % self.workers
+            self._queues[index].append((fn, args))
+            self._pending += 1
+            self._cond.notify()
+
+    def _take(self, index):
+        own = self._queues[index]
+        if own:
+            return own.pop()
+        victim = max(self._queues, key=len)
+        if victim:
+            return victim.popleft()
+        return None
+
+    def _cancelled(self):
+        return self.cancel is not None and self.cancel.cancelled()
+
+    def _work(self, index):
+        self._local.index = index
+        while True:
+            with self._cond:
+                task = None
+                while task is None:
+                    if self._pending == 0 or self._cancelled():
+                        self._cond.notify_all()
+                        return
+                    task = self._take(index)
+                    if task is None:
+                        # Everything left is running; wait for it to finish or add work
+                        self._cond.wait(0.1)
+            fn, args = task
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.warning(f"Task {getattr(fn, '__name__', fn)} failed: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._cond.notify_all()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._work, args=(i,), daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,266 @@
+import os
+import json
+import shutil
+import sys
+import tempfile
+import datetime
+import platform
+import argparse
+import concurrent.futures
+from functools import partial
+from collector_archive import ARCHIVE_CANCELLED, ARCHIVE_EMPTY, ARCHIVE_OK, ARCHIVE_PARTIAL, stream_to_archive, tree_entries
+from collector_checksums import verify
+from collector_budget import estimate, fit_to_budget, parse_size
+from collector_cancel import CancelToken, parse_duration, start_watchdog
+from collector_events import EVENT_LOGS, EventLogExport
+from collector_manifest import RunManifest
+from collector_metrics import RunMetrics, metrics_path
+from collector_writers import FORMATS
+from collector_throttle import LOW_IMPACT_OPEN_FILES, LOW_IMPACT_RATE, IOThrottle
+from collector_profile import DEFAULT_PROFILE, Profile, load_profile
+from collector_rolling import RING_SIZE, RollingCapture, lower_priority, request_snapshot
+from collector_scan import scan_planned, time_window
+
+# The run and command line shared by the silent builds (silent_new_version.py,
+# log_col_silent_ev.py). A build only brings its copy function, which turns the
+# categories below into archive entries (copy_categories with the build's own
+# arcnames), its compression policy and manifest name:
+#   copy_items(manifest, window, export_dir=None, cancel=None, throttle=None, workers=None, metrics=None)
+
+# Store folder of the resident capture (--daemon), next to the archives
+ROLLING_DIR = "N-Able_Rolling"
+
+
+def get_windows_temp_path():
+    for path in [r"C:\Windows\Temp", r"C:\Temp"]:
+        try:
+            os.makedirs(path, exist_ok=True)
+            return path
+        except OSError:
+            continue
+    return tempfile.gettempdir()
+
+
+def export_event_logs(output_dir, window=None, cancel=None, on_failed=None):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    logs_dir = os.path.join(output_dir, "EventLogs")
+    os.makedirs(logs_dir, exist_ok=True)
+
+    # All logs at once, each with its own timeout and size cap
+    outfiles = {log: os.path.join(logs_dir, f"{log.replace('/', '_')}_{timestamp}.evtx") for log in EVENT_LOGS}
+    for _ in EventLogExport(outfiles, window, cancel, on_failed=on_failed).results():
+        pass
+    return logs_dir
+
+
+# --- Categories, paths and file rules from the collection profile ---
+def use_profile(profile):
+    # The built-in profile by default; run_silent loads --profile (or a
+    # collector_profile.json next to the executable) instead
+    global categories, CATEGORY_RULES, DEFAULT_RULES, CATEGORY_WEIGHTS, CATEGORY_FILTERS
+    categories = profile.category_paths(export_event_logs)
+    CATEGORY_RULES = profile.rules()
+    DEFAULT_RULES = profile.default_rules
+    CATEGORY_WEIGHTS = profile.weights()
+    CATEGORY_FILTERS = profile.filters()
+
+
+use_profile(Profile(DEFAULT_PROFILE))
+
+
+def generate_archive_name(suffix="", archive_format="7z"):
+    hostname = platform.node()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"N-Able_Logs_{hostname}_{timestamp}{suffix}.{archive_format}"
+
+
+def export_category(category, export, window, export_dir, cancel=None, metrics=None):
+    # Runs next to the folder scan; returns the entries of the exported logs
+    def on_failed(log_name, reason):
+        if metrics is not None:
+            metrics.on_failed(log_name, reason, category)
+
+    try:
+        result_path = export(tempfile.mkdtemp(dir=export_dir), window, cancel, on_failed)
+    except Exception as e:
+        if metrics is not None:
+            metrics.on_failed(getattr(export, "__name__", str(export)), f"export failed: {e}", category)
+        return []
+    if not os.path.exists(result_path) or not os.listdir(result_path):
+        return []
+    return list(tree_entries(result_path, os.path.join(category, os.path.basename(result_path)), category))
+
+
+def copy_categories(entries_for, manifest, window, export_dir=None, cancel=None, throttle=None, workers=None,
+                    metrics=None):
+    # The copy function of a build, given how it names its entries: entries_for(record,
+    # owners) returns the archive entries of one file, owners being the (root,
+    # category) pairs that claim it, owner first. Nothing is copied. Every folder of
+    # every category is its own task on a work-stealing pool, and nested roots (Msp
+    # Agent and its software-scanner) are walked once; the archiver stores a file
+    # claimed by several categories once. Event logs are exported alongside; without
+    # export_dir they are skipped (preflight estimate). A scan that fails is reported
+    # to metrics.on_failed and the exports still come in. A throttle with an
+    # open-file cap also caps the worker count.
+    if throttle is not None and throttle.max_open_files:
+        workers = min(workers or throttle.max_open_files, throttle.max_open_files)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        exports = [
+            executor.submit(export_category, category, path, window, export_dir, cancel, metrics)
+            for category, paths in categories.items() for path in paths if callable(path)
+        ] if export_dir else []
+        try:
+            for record, owners in scan_planned(categories, workers, CATEGORY_RULES, rules=DEFAULT_RULES,
+                                               window=window, cancel=cancel, throttle=throttle,
+                                               on_skip=metrics.on_skip if metrics is not None else None):
+                if manifest.should_collect(record, owners[0][1], throttle, cancel):
+                    yield from entries_for(record, owners)
+        except Exception as e:
+            if metrics is not None:
+                metrics.on_failed(None, f"scan failed: {e}")
+        # Exported logs in the order they finished
+        for future in concurrent.futures.as_completed(exports):
+            yield from future.result()
+
+
+def create_7z_archive(archive_path, manifest, copy_items, policy, window=None, budget=None, cancel=None, throttle=None,
+                      workers=None, metrics=None, index=True, compact=False):
+    # With metrics (RunMetrics), the run summary is written next to the archive and
+    # a run that lost files (unreadable, or over the size budget) returns ARCHIVE_PARTIAL
+    metrics = metrics or RunMetrics()
+    export_dir = tempfile.mkdtemp()
+
+    def on_written(entry, digest):
+        manifest.entry_written(entry, digest)
+        metrics.on_written(entry, digest)
+
+    def finish(archive):
+        manifest.write_index(archive)
+        entries.store(archive)
+        if metrics.embed_in_archive:
+            metrics.embed(archive)
+
+    try:
+        # Everything is listed first (stat data only) so the budget can pick what to keep
+        with metrics.phase("scan"):
+            entries = fit_to_budget(copy_items(manifest, window, export_dir, cancel, throttle, workers, metrics),
+                                    budget, CATEGORY_WEIGHTS, manifest, os.path.dirname(archive_path))
+        with metrics.phase("archive"):
+            status = ARCHIVE_EMPTY
+            if entries:
+                status = stream_to_archive(archive_path, entries, policy, on_written, finish,
+                                           cancel=cancel, throttle=throttle, on_failed=metrics.on_failed, index=index,
+                                           compact=compact, on_stored=metrics.on_stored)
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+    if status == ARCHIVE_OK:
+        manifest.save(os.path.basename(archive_path))
+        if metrics.failed_count or manifest.left_out:
+            status = ARCHIVE_PARTIAL
+    metrics.write(metrics_path(archive_path), status, archive_path)
+    return status
+
+
+def remove_partial_archive(archive_path):
+    try:
+        os.remove(archive_path)
+    except OSError:
+        pass
+
+
+def run_rolling(args, output_dir):
+    # Resident capture at low priority and low I/O rate; --timeout ends it
+    lower_priority()
+    cancel = CancelToken(args.timeout)
+    throttle = IOThrottle(args.read_rate or LOW_IMPACT_RATE, LOW_IMPACT_OPEN_FILES, cancel=cancel)
+    capture = RollingCapture(categories, os.path.join(output_dir, ROLLING_DIR), args.ring_size, CATEGORY_RULES,
+                             DEFAULT_RULES, throttle, cancel)
+    capture.run(lambda: os.path.join(output_dir, generate_archive_name("_rolling")))
+    capture.save()
+
+
+def parse_args(argv=None, rolling=False):
+    # rolling adds the resident capture options (--daemon, --ring-size, --snapshot)
+    parser = argparse.ArgumentParser(description="Silent N-able log collector")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only collect files that changed since the last run (delta archive)")
+    parser.add_argument("--since", help="only collect files/events newer than this (e.g. 48h, 7d, 2025-10-30)")
+    parser.add_argument("--until", help="only collect files/events older than this (same formats)")
+    parser.add_argument("--max-total-size", help="size budget for the whole collection (e.g. 500M, 2G); "
+                                                 "newest files of the most important categories are kept first")
+    parser.add_argument("--estimate", action="store_true",
+                        help="only print how much would be collected (event logs not included) and exit")
+    parser.add_argument("--timeout", help="wall-clock limit for the whole run (e.g. 30m, 2h); "
+                                          "the partial archive is removed and the exit code is 3")
+    parser.add_argument("--low-impact", action="store_true",
+                        help="read slowly, keep few files open and back off while the disk is busy")
+    parser.add_argument("--max-read-rate", help="read rate limit in bytes/s (e.g. 20M); implies --low-impact")
+    parser.add_argument("--embed-metrics", action="store_true",
+                        help="also store the run summary (metrics.json) inside the archive")
+    parser.add_argument("--workers", type=int, help="threads scanning folders in parallel (default: CPU count + 4, max 32)")
+    parser.add_argument("--profile", help="collection profile (JSON) to use instead of the built-in one")
+    parser.add_argument("--format", choices=list(FORMATS), default="7z",
+                        help="archive format: 7z (default), tar.zst (fastest) or zip")
+    parser.add_argument("--verify", metavar="ARCHIVE",
+                        help="check an archive against the checksums stored in it, print the result and exit")
+    parser.add_argument("--no-index", action="store_true",
+                        help="do not build the search index of the text logs (log_index.sqlite)")
+    parser.add_argument("--compact", action="store_true",
+                        help="store the text logs as message templates and parameter columns (*.lct, "
+                             "rebuilt with collector_compact): about 2x faster with the default codec, "
+                             "a few percent larger (see the README)")
+    if rolling:
+        parser.add_argument("--daemon", action="store_true",
+                            help="stay resident and keep the recent log data compressed, ready for --snapshot")
+        parser.add_argument("--ring-size", help="disk space the resident capture may use (default 512M)")
+        parser.add_argument("--snapshot", action="store_true",
+                            help="ask the resident capture for an archive of what it holds and print where it is")
+    args = parser.parse_args(argv)
+    try:
+        args.profile = load_profile(args.profile)
+        args.window = time_window(args.since, args.until)
+        args.budget = parse_size(args.max_total_size) if args.max_total_size else None
+        args.timeout = parse_duration(args.timeout) if args.timeout else None
+        args.read_rate = parse_size(args.max_read_rate) if args.max_read_rate else None
+        if rolling:
+            args.ring_size = parse_size(args.ring_size) if args.ring_size else RING_SIZE
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    return args
+
+
+def run_silent(argv, copy_items, policy, manifest_name, rolling=False):
+    args = parse_args(argv, rolling)
+    if args.verify:
+        report = verify(args.verify)
+        print(json.dumps(report, indent=1))
+        sys.exit(0 if report["ok"] else 1)
+    use_profile(args.profile)
+    output_dir = get_windows_temp_path()
+    os.makedirs(output_dir, exist_ok=True)
+
+    if rolling and args.snapshot:
+        result = request_snapshot(os.path.join(output_dir, ROLLING_DIR))
+        print(json.dumps(result, indent=1))
+        sys.exit(0 if result is not None and result["status"] == ARCHIVE_OK else 1)
+    if rolling and args.daemon:
+        run_rolling(args, output_dir)
+        sys.exit(0)
+
+    manifest = RunManifest(os.path.join(output_dir, manifest_name), incremental=args.incremental)
+    archive_name = generate_archive_name("_delta" if manifest.incremental else "", args.format)
+    archive_path = os.path.join(output_dir, archive_name)
+
+    if args.estimate:
+        preflight = estimate(copy_items(manifest, args.window))
+        print(json.dumps(preflight._asdict(), indent=1))
+        sys.exit(0)
+
+    # Stages stop at the next file once the timeout passes; the watchdog ends a run stuck in I/O
+    cancel = CancelToken(args.timeout)
+    start_watchdog(cancel, ARCHIVE_CANCELLED, partial(remove_partial_archive, archive_path))
+    throttle = None
+    if args.low_impact or args.read_rate:
+        throttle = IOThrottle(args.read_rate or LOW_IMPACT_RATE, LOW_IMPACT_OPEN_FILES, cancel=cancel)
+    sys.exit(create_7z_archive(archive_path, manifest, copy_items, policy, args.window, args.budget, cancel, throttle,
+                               args.workers, RunMetrics(embed=args.embed_metrics), not args.no_index, args.compact))
@@ -0,0 +1,75 @@
+import time
+import threading
+import contextlib
+
+# --low-impact defaults: sustained read rate and files/folders open at once
+LOW_IMPACT_RATE = 16 * 1024 * 1024
+LOW_IMPACT_OPEN_FILES = 2
+# Read latency (seconds per MiB) above which the disk is considered busy
+LATENCY_TARGET = 0.05
+MAX_BACKOFF = 16
+
+_MIB = 1024 * 1024
+# Small reads are mostly syscall overhead; they are weighed as this many bytes
+_MIN_WEIGHED_READ = 64 * 1024
+
+
+# --- Keep a collection from competing with the workload on the host ---
+class IOThrottle:
+    # Three independent limits, any of which may be off (None):
+    #   rate            token bucket of bytes read per second (one second of burst)
+    #   max_open_files  files and folders open at once across all threads
+    #   latency_target  seconds per MiB; while reads are slower the throttle backs
+    #                   off (idle time proportional to the latency, doubling up to
+    #                   MAX_BACKOFF) and recovers once the disk is quick again
+    # Sleeps go through the CancelToken, if any, so a cancelled run is not held up.
+
+    def __init__(self, rate=None, max_open_files=None, latency_target=LATENCY_TARGET, cancel=None):
+        self.rate = rate
+        self.max_open_files = max_open_files
+        self.latency_target = latency_target
+        self.cancel = cancel
+        self.backoff = 1.0
+        self.latency = None  # moving average, seconds per MiB
+        self._tokens = float(rate or 0)
+        self._last = time.monotonic()
+        self._slots = threading.BoundedSemaphore(max_open_files) if max_open_files else None
+        self._lock = threading.Lock()
+
+    def slot(self):
+        # Context manager held while a file or folder is open
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def read(self, f, size=-1):
+        start = time.perf_counter()
+        data = f.read(size)
+        self.account(len(data), time.perf_counter() - start)
+        return data
+
+    def account(self, nbytes, elapsed):
+        # Called after every read (or folder listing, with nbytes=0); may sleep
+        with self._lock:
+            delay = 0.0
+            if self.latency_target is not None:
+                latency = elapsed * _MIB / max(nbytes, _MIN_WEIGHED_READ)
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if self.latency > self.latency_target:
+                    self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+                else:
+                    self.backoff = max(self.backoff / 2, 1.0)
+                delay = elapsed * (self.backoff - 1)
+            if self.rate:
+                now = time.monotonic()
+                self._tokens = min(self._tokens + (now - self._last) * self.rate, self.rate) - nbytes
+                self._last = now
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / self.rate)
+        if delay > 0:
+            if self.cancel is not None:
+                self.cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+def open_slot(throttle):
+    return throttle.slot() if throttle is not None else contextlib.nullcontext()
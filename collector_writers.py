@@ -0,0 +1,169 @@
+import os
+import time
+import shutil
+import tarfile
+import zipfile
+import tempfile
+
+# Codecs a compression policy can pick from; all of them open in stock 7-Zip.
+# Filter ids are py7zr constant names: py7zr (and its whole codec stack) is only
+# imported once an archive is written, not when a collector starts.
+CODECS = {
+    "store": [{'id': "FILTER_COPY"}],
+    "deflate": [{'id': "FILTER_DEFLATE"}],
+    "fast": [{'id': "FILTER_LZMA2", 'preset': 1}],
+    "strong": [{'id': "FILTER_LZMA2", 'preset': 7}],
+}
+# The same codec names in the other formats: zip method and level per entry,
+# zstd level for a whole tar stream
+ZIP_CODECS = {
+    "store": (zipfile.ZIP_STORED, None),
+    "deflate": (zipfile.ZIP_DEFLATED, 6),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "strong": (zipfile.ZIP_DEFLATED, 9),
+}
+ZSTD_LEVELS = {"store": 1, "deflate": 3, "fast": 3, "strong": 9}
+
+_COPY_SIZE = 1024 * 1024
+
+
+def codec_filters(codec):
+    import py7zr
+    return [dict(spec, id=getattr(py7zr, spec['id'])) for spec in CODECS[codec]]
+
+
+class _Writer:
+    # Every writer: writef(stream, arcname, mtime, codec, size) for one entry,
+    # read until b"" unless size (the exact length, None if unknown) is given;
+    # close() once done. one_codec writers compress a whole session with the codec
+    # they are opened with, and take entries of other codecs in appended sessions.
+    one_codec = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- 7z (py7zr): one coder chain per session, each session a 7z folder ---
+class SevenZipWriter(_Writer):
+    one_codec = True
+
+    def __init__(self, path, codec, append=False):
+        import py7zr
+        self._archive = py7zr.SevenZipFile(path, 'a' if append else 'w', filters=codec_filters(codec))
+
+    def writef(self, stream, arcname, mtime=None, codec=None, size=None):
+        self._archive.writef(stream, arcname)
+        if mtime is not None:
+            from py7zr.helpers import ArchiveTimestamp
+            self._archive.header.files_info.files[-1]["lastwritetime"] = ArchiveTimestamp.from_datetime(mtime)
+
+    def close(self):
+        self._archive.close()
+
+
+# --- tar in one zstd stream: headers written as entries come, nothing kept per entry ---
+class TarZstdWriter(_Writer):
+    # pyzstd comes with py7zr. A tar header holds the entry's size, so a stream of
+    # unknown length (a filtered log) is spooled to a temporary file first. A stream
+    # must hold the size it is written with (collector_archive.write_file pads a
+    # file that shrank); a short one is still padded with zeros, to keep the tar whole.
+
+    def __init__(self, path, codec, append=False):
+        import pyzstd
+        if append:
+            raise ValueError("A tar.zst archive cannot be appended to")
+        # With a checksum in the zstd frame, a corrupted archive fails to decompress
+        self._out = pyzstd.ZstdFile(path, 'w', level_or_option={pyzstd.CParameter.compressionLevel: ZSTD_LEVELS[codec],
+                                                                pyzstd.CParameter.checksumFlag: 1})
+
+    def writef(self, stream, arcname, mtime=None, codec=None, size=None):
+        if size is None:
+            with tempfile.TemporaryFile() as spool:
+                shutil.copyfileobj(stream, spool, _COPY_SIZE)
+                size = spool.tell()
+                spool.seek(0)
+                return self.writef(spool, arcname, mtime, codec, size)
+        info = tarfile.TarInfo(arcname.replace(os.sep, "/"))
+        info.size = size
+        info.mtime = int(mtime if mtime is not None else time.time())
+        info.mode = 0o644
+        self._out.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        left = size
+        while left:
+            data = stream.read(min(_COPY_SIZE, left)) or bytes(min(_COPY_SIZE, left))
+            self._out.write(data)
+            left -= len(data)
+        self._out.write(bytes(-size % tarfile.BLOCKSIZE))
+
+    def close(self):
+        try:
+            self._out.write(bytes(2 * tarfile.BLOCKSIZE))
+        finally:
+            self._out.close()
+
+
+# --- zip: method and level chosen per entry ---
+class ZipWriter(_Writer):
+    # zipfile keeps one ZipInfo per entry for the central directory written at the end
+
+    def __init__(self, path, codec, append=False):
+        self._archive = zipfile.ZipFile(path, 'a' if append else 'w', allowZip64=True)
+        self.codec = codec
+
+    def writef(self, stream, arcname, mtime=None, codec=None, size=None):
+        date_time = time.localtime(mtime if mtime is not None else time.time())[:6]
+        info = zipfile.ZipInfo(arcname.replace(os.sep, "/"), max(date_time, (1980, 1, 1, 0, 0, 0)))
+        info.compress_type, info._compresslevel = ZIP_CODECS[codec or self.codec]
+        info.external_attr = 0o644 << 16
+        if size is not None:
+            info.file_size = size
+        with self._archive.open(info, 'w', force_zip64=size is None) as out:
+            shutil.copyfileobj(stream, out, _COPY_SIZE)
+
+    def close(self):
+        self._archive.close()
+
+
+# Archive formats by file extension
+FORMATS = {"7z": SevenZipWriter, "tar.zst": TarZstdWriter, "zip": ZipWriter}
+
+
+def archive_format(path):
+    # The FORMATS name matching the path's extension, or None
+    name = path.lower()
+    for fmt in FORMATS:
+        if name.endswith("." + fmt):
+            return fmt
+    return None
+
+
+def open_writer(path, codec, append=False):
+    return FORMATS[archive_format(path) or "7z"](path, codec, append)
+
+
+# --- Read one member of an archive of any format ---
+def read_member(path, name):
+    # The member's bytes, or None if the archive has no such member. A 7z or zip
+    # only decompresses the member's own data; a tar.zst is read up to it.
+    fmt = archive_format(path) or "7z"
+    if fmt == "zip":
+        with zipfile.ZipFile(path) as archive:
+            try:
+                return archive.read(name)
+            except KeyError:
+                return None
+    if fmt == "tar.zst":
+        import pyzstd
+        with pyzstd.ZstdFile(path) as f, tarfile.open(fileobj=f, mode="r|") as archive:
+            for member in archive:
+                if member.name == name:
+                    return archive.extractfile(member).read()
+        return None
+    import py7zr
+    with py7zr.SevenZipFile(path, 'r') as archive:
+        if name not in archive.getnames():
+            return None
+        return archive.read(targets=[name])[name].read()
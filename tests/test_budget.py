@@ -0,0 +1,58 @@
+from collections import namedtuple
+import collector_budget
+from collector_archive import ArchiveEntry
+from collector_budget import DISK_RESERVE, apply_budget, estimate, fit_to_budget
+from collector_entries import EntryList
+from collector_scan import FileRecord
+
+
+def _entry(source, category, size, mtime, arcname=None):
+    record = FileRecord(source, source.rsplit("/", 1)[-1], size, mtime)
+    return ArchiveEntry(source, arcname or f"{category}/{record.rel_path}", category, None, record)
+
+
+def _entries():
+    return EntryList([
+        _entry("/logs/old.log", "Other", 400, 100),
+        _entry("/logs/new.log", "Other", 400, 200),
+        _entry("/core/core.log", "Core", 300, 50),
+        _entry("/core/core.log", "Other", 300, 50, "Other/core.log"),
+    ])
+
+
+def test_estimate_counts_a_shared_file_once():
+    preflight = estimate(_entries())
+    assert (preflight.files, preflight.bytes, preflight.archive_bytes) == (3, 1100, 275)
+    assert preflight.by_category == {"Other": 800, "Core": 300}
+
+
+def test_budget_keeps_weighted_then_newest_files():
+    selected, left_out = apply_budget(_entries(), 800, {"Core": 2})
+    assert [entry.arcname for entry in selected] == ["Other/new.log", "Core/core.log", "Other/core.log"]
+    assert [entry.source for entry in left_out] == ["/logs/old.log"]
+
+
+def test_fit_to_budget_keeps_everything_that_fits():
+    assert len(fit_to_budget(_entries(), 1100)) == 4
+    assert len(fit_to_budget(_entries(), None)) == 4
+    assert len(fit_to_budget(_entries(), 1099)) == 2
+
+
+def _free_space(monkeypatch, free):
+    usage = namedtuple("usage", "total used free")
+    monkeypatch.setattr(collector_budget.shutil, "disk_usage", lambda path: usage(free, 0, free))
+
+
+def test_free_space_limits_the_compressed_size(monkeypatch):
+    # 1100 bytes of logs, about 275 once compressed: 300 bytes free is room enough
+    _free_space(monkeypatch, DISK_RESERVE + 300)
+    assert len(fit_to_budget(_entries(), None, output_dir="/out")) == 4
+    _free_space(monkeypatch, DISK_RESERVE + 200)
+    selected = fit_to_budget(_entries(), None, output_dir="/out")
+    assert [entry.source for entry in selected] == ["/logs/old.log", "/logs/new.log"]
+
+
+def test_compressed_files_count_in_full_against_the_free_space(monkeypatch):
+    _free_space(monkeypatch, DISK_RESERVE + 300)
+    entries = [_entry("/logs/new.log", "Other", 400, 200), _entry("/logs/old.gz", "Other", 400, 100)]
+    assert [entry.source for entry in fit_to_budget(entries, None, output_dir="/out")] == ["/logs/new.log"]
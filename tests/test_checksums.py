@@ -0,0 +1,31 @@
+import os
+import pytest
+from collector_archive import new_hash, write_file
+from collector_writers import open_writer, read_member
+
+
+@pytest.mark.parametrize("fmt", ["tar.zst", "7z", "zip"])
+def test_a_file_that_shrinks_while_read_is_stored_as_checksummed(tmp_path, fmt):
+    source = tmp_path / "shrinking.log"
+    source.write_bytes(b"x" * (3 * 1024 * 1024))
+    reads = []
+
+    def on_read(data):
+        # Cut the file down once the first chunk is in the archive
+        if not reads:
+            os.truncate(source, 1024 * 1024 + 100)
+        reads.append(len(data))
+
+    stored = []
+    path = str(tmp_path / f"out.{fmt}")
+    with open_writer(path, "fast") as archive:
+        write_file(archive, str(source), "c/shrinking.log", on_read=on_read,
+                   on_stored=lambda arcname, size, digest, changed, read: stored.append((size, digest, changed)))
+
+    data = read_member(path, "c/shrinking.log")
+    digest = new_hash()
+    digest.update(data)
+    assert stored == [(len(data), digest.hexdigest(), True)]
+    # Header size kept, the missing tail is zeros
+    assert len(data) == 3 * 1024 * 1024
+    assert data[-100:] == bytes(100)
@@ -0,0 +1,52 @@
+import io
+import pytest
+from collector_compact import CompactingReader, rebuild
+
+LOG = (b"2025-10-30 12:00:01 INFO Job 17 finished in 250 ms\r\n"
+       b"\r\n"
+       b"2025-10-30 12:00:02 INFO Job 18 finished in 3125 ms\r\n"
+       b"\n"
+       b"2025-10-30 12:00:03 ERROR {0f8fad5b-d9cb-469f-a165-70867728950e} failed: 0x80070005\n"
+       b"2025-10-30 12:00:04 WARN caf\xe9 100% \xff\xfe not UTF-8\n"
+       b"    at Agent.Run() in C:\\src\\agent.cs:line 42\n"
+       b"2025-10-30 12:00:05 INFO Job 19 finished in 7 ms")
+
+
+def _round_trip(text, chunk_size=1024 * 1024):
+    reader = CompactingReader(io.BytesIO(text), len(text), chunk_size)
+    compacted = reader.read()
+    out = io.BytesIO()
+    assert rebuild(io.BytesIO(compacted), out) == len(text)
+    return out.getvalue(), reader
+
+
+@pytest.mark.parametrize("chunk_size", [16, 1024 * 1024])
+def test_compaction_is_lossless(chunk_size):
+    # Blank lines, CRLF, no newline at the end, GUIDs, hex, % and non-UTF-8 bytes
+    text, reader = _round_trip(LOG, chunk_size)
+    assert text == LOG
+    assert reader.size == len(LOG)
+    assert reader.lines == LOG.count(b"\n")
+
+
+def test_repeated_lines_share_a_template():
+    log = b"".join(b"2025-10-30 12:00:%02d INFO Job %d finished in %d ms\n" % (i % 60, i, i * 7) for i in range(500))
+    text, reader = _round_trip(log)
+    assert text == log
+    assert reader.templates < 10
+    assert reader.raw_blocks == 0
+
+
+def test_binary_and_empty_files():
+    binary = bytes(range(256)) * 4
+    text, reader = _round_trip(binary)
+    assert text == binary
+    assert reader.raw_blocks == 1
+    assert _round_trip(b"")[0] == b""
+
+
+def test_a_corrupted_stream_is_rejected():
+    compacted = bytearray(CompactingReader(io.BytesIO(LOG)).read())
+    compacted[-5] ^= 0xFF
+    with pytest.raises(ValueError):
+        rebuild(io.BytesIO(bytes(compacted)), io.BytesIO())
@@ -0,0 +1,62 @@
+import os
+import json
+from collector_archive import (ARCHIVE_OK, DEDUPE_HEAD_BYTES, SHARED_INDEX_NAME, ArchiveEntry, stream_to_archive)
+from collector_scan import FileRecord
+from collector_throttle import IOThrottle
+from collector_writers import read_member
+
+SIZE = 512 * 1024
+
+
+class CountingThrottle(IOThrottle):
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+
+    def read(self, f, size=-1):
+        data = super().read(f, size)
+        self.bytes += len(data)
+        return data
+
+
+def _entry(path, arcname, max_bytes=None):
+    st = os.stat(path)
+    return ArchiveEntry(str(path), arcname, arcname.split("/")[0], max_bytes,
+                        FileRecord(str(path), path.name, st.st_size, st.st_mtime))
+
+
+def _links(path):
+    data = read_member(path, SHARED_INDEX_NAME)
+    return json.loads(data)["links"] if data else {}
+
+
+def test_a_source_is_only_linked_to_a_copy_with_the_same_cap(tmp_path):
+    source = tmp_path / "agent.log"
+    source.write_bytes(b"line of the agent log\n" * 1000)
+    small = tmp_path / "small.log"
+    small.write_bytes(b"short\n")
+    entries = [_entry(source, "Full/agent.log"), _entry(source, "Capped/agent.log", 4096),
+               _entry(source, "AlsoCapped/agent.log", 4096),
+               # Under its cap, a file is stored whole either way
+               _entry(small, "Full/small.log"), _entry(small, "Capped/small.log", 4096)]
+    path = str(tmp_path / "bundle.zip")
+    assert stream_to_archive(path, entries) == ARCHIVE_OK
+    assert len(read_member(path, "Full/agent.log")) == source.stat().st_size
+    assert len(read_member(path, "Capped/agent.log")) == 4096
+    assert _links(path) == {"AlsoCapped/agent.log": "Capped/agent.log", "Capped/small.log": "Full/small.log"}
+
+
+def test_a_file_of_the_same_size_is_read_whole_only_when_its_start_matches(tmp_path):
+    first, other, copy = tmp_path / "first.log", tmp_path / "other.log", tmp_path / "copy.log"
+    first.write_bytes(os.urandom(SIZE))
+    other.write_bytes(os.urandom(SIZE))
+    copy.write_bytes(first.read_bytes())
+    throttle = CountingThrottle()
+    path = str(tmp_path / "bundle.zip")
+    entries = [_entry(first, "A/first.log"), _entry(other, "A/other.log"), _entry(copy, "A/copy.log")]
+    assert stream_to_archive(path, entries, throttle=throttle) == ARCHIVE_OK
+    assert _links(path) == {"A/copy.log": "A/first.log"}
+    assert read_member(path, "A/other.log") == other.read_bytes()
+    # first and other stored (one read each), the heads of other and first compared
+    # once, and copy hashed whole after its head matched: never stored after a full hash
+    assert throttle.bytes == 3 * SIZE + 3 * DEDUPE_HEAD_BYTES
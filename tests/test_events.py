@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import pytest
+from collector_cancel import CancelToken
+from collector_events import (EXPORT_FAILED, EXPORT_TIMED_OUT, EXPORT_TOO_LARGE, EXPORTER_ENV, EventLogExport,
+                              export_event_log)
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the stand-in exporter is run through its #! line")
+
+# Stand-in for wevtutil (epl <log> <outfile> /ow:true [/q:...]); what it does depends on the log name
+STAND_IN = """#!{python}
+import sys, time
+log, outfile = sys.argv[2], sys.argv[3]
+if log == "Slow":
+    time.sleep(60)
+elif log == "Huge":
+    with open(outfile, "wb") as f:
+        while True:
+            f.write(b"x" * 65536)
+            f.flush()
+            time.sleep(0.01)
+elif log == "Broken":
+    sys.exit(1)
+with open(outfile, "w") as f:
+    f.write(" ".join(sys.argv[1:]))
+"""
+
+
+@pytest.fixture(autouse=True)
+def stand_in(tmp_path, monkeypatch):
+    path = tmp_path / "wevtutil_stand_in.py"
+    path.write_text(STAND_IN.format(python=sys.executable))
+    path.chmod(0o755)
+    monkeypatch.setenv(EXPORTER_ENV, str(path))
+
+
+def _export(tmp_path, log_name, **limits):
+    failed = []
+    outfile = str(tmp_path / f"{log_name}.evtx")
+    start = time.monotonic()
+    ok = export_event_log(log_name, outfile, on_failed=lambda log, reason: failed.append((log, reason)), **limits)
+    return ok, outfile, failed, time.monotonic() - start
+
+
+def test_export_writes_the_log(tmp_path):
+    ok, outfile, failed, _ = _export(tmp_path, "System")
+    assert ok and not failed
+    with open(outfile) as f:
+        assert f.read().split()[:2] == ["epl", "System"]
+
+
+def test_export_is_killed_after_its_timeout(tmp_path):
+    ok, outfile, failed, elapsed = _export(tmp_path, "Slow", timeout=1)
+    assert not ok
+    assert failed == [("Slow", EXPORT_TIMED_OUT)]
+    assert elapsed < 10
+    assert not os.path.exists(outfile)
+
+
+def test_export_is_dropped_past_its_size_cap(tmp_path):
+    ok, outfile, failed, elapsed = _export(tmp_path, "Huge", max_bytes=256 * 1024, timeout=30)
+    assert not ok
+    assert failed == [("Huge", EXPORT_TOO_LARGE)]
+    assert elapsed < 30
+    assert not os.path.exists(outfile)
+
+
+def test_failed_export(tmp_path):
+    ok, _, failed, _ = _export(tmp_path, "Broken")
+    assert not ok
+    assert failed == [("Broken", f"{EXPORT_FAILED} (exit code 1)")]
+
+
+def test_other_logs_are_kept_when_one_fails(tmp_path):
+    failed = []
+    outfiles = {log: str(tmp_path / f"{log}.evtx") for log in ("Application", "Slow", "System")}
+    export = EventLogExport(outfiles, timeout=1, on_failed=lambda log, reason: failed.append((log, reason)))
+    assert sorted(log for log, _ in export.results()) == ["Application", "System"]
+    assert failed == [("Slow", EXPORT_TIMED_OUT)]
+
+
+def test_cancelled_export_is_not_a_failure(tmp_path):
+    cancel = CancelToken(timeout=0.5)
+    failed = []
+    ok = export_event_log("Slow", str(tmp_path / "Slow.evtx"), cancel=cancel,
+                          on_failed=lambda log, reason: failed.append((log, reason)))
+    assert not ok and not failed
@@ -0,0 +1,77 @@
+import io
+import datetime
+import pytest
+from collector_filter import FilteringReader, LineFilter
+
+
+def _filtered(text, line_filter, max_bytes=None, chunk_size=64):
+    # Small chunks, so matches and context straddle chunk boundaries
+    data = text.encode("utf-8")
+    reader = FilteringReader(io.BytesIO(data), line_filter, len(data), max_bytes, chunk_size)
+    return reader.read().decode("utf-8").splitlines(), reader
+
+
+def _epoch(text):
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+LOG = "".join(f"2025-10-30 12:{i:02d}:00 {'ERROR' if i % 10 == 5 else 'INFO'} line {i}\n" for i in range(30))
+
+
+def test_levels_are_matched_as_whole_words():
+    text = "start\nERROR: disk full\nNoErrors here\nwarn: slow\nend\n"
+    lines, reader = _filtered(text, LineFilter(levels=["error", "WARN"], context=0))
+    assert lines == ["[... log_collector: 1 lines filtered out ...]", "ERROR: disk full",
+                     "[... log_collector: 1 lines filtered out ...]", "warn: slow",
+                     "[... log_collector: 1 lines filtered out ...]",
+                     "[... log_collector: filtered, kept 2 of 5 lines ...]"]
+    assert (reader.lines, reader.kept_lines, reader.truncated) == (5, 2, False)
+
+
+def test_keywords_match_inside_words():
+    lines, _ = _filtered("a\nConnection TIMEOUTS\nb\n", LineFilter(keywords=["timeout"], context=0))
+    assert lines[1] == "Connection TIMEOUTS"
+
+
+def test_context_lines_around_a_match():
+    lines, _ = _filtered(LOG, LineFilter(levels=["ERROR"], context=1))
+    kept = [line for line in lines if not line.startswith("[...")]
+    assert [line.rsplit(" ", 1)[1] for line in kept] == ["4", "5", "6", "14", "15", "16", "24", "25", "26"]
+    assert lines[0] == "[... log_collector: 4 lines filtered out ...]"
+    assert lines[4] == "[... log_collector: 7 lines filtered out ...]"
+    assert lines[-2:] == ["[... log_collector: 3 lines filtered out ...]",
+                          "[... log_collector: filtered, kept 9 of 30 lines ...]"]
+
+
+def test_since_and_until_keep_the_lines_in_range():
+    text = LOG.replace("line 12\n", "line 12\n  at a stack frame\n")
+    line_filter = LineFilter(since=_epoch("2025-10-30T12:10:00"), until=_epoch("2025-10-30T12:12:00"), context=0)
+    lines, _ = _filtered(text, line_filter)
+    assert lines[1:5] == ["2025-10-30 12:10:00 INFO line 10", "2025-10-30 12:11:00 INFO line 11",
+                          "2025-10-30 12:12:00 INFO line 12", "  at a stack frame"]
+    assert lines[0] == "[... log_collector: 10 lines filtered out ...]"
+
+
+def test_levels_within_a_time_range():
+    line_filter = LineFilter(levels=["ERROR"], since=_epoch("2025-10-30T12:10:00"), context=0)
+    lines, _ = _filtered(LOG, line_filter)
+    assert [line for line in lines if not line.startswith("[...")] == ["2025-10-30 12:15:00 ERROR line 15",
+                                                                        "2025-10-30 12:25:00 ERROR line 25"]
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1024 * 1024])
+def test_the_byte_cap_keeps_the_newest_matches(chunk_size):
+    text = "".join(f"ERROR event {i:04d}\n" for i in range(1000))
+    lines, reader = _filtered(text, LineFilter(levels=["ERROR"], context=0), max_bytes=2000, chunk_size=chunk_size)
+    kept = lines[1:-1]
+    # 2000 bytes of 17-byte lines: the last 117 of them
+    assert kept == [f"ERROR event {i:04d}" for i in range(883, 1000)]
+    assert lines[0] == "[... log_collector: output limit of 2000 bytes reached, 883 older matching lines dropped ...]"
+    assert lines[-1] == "[... log_collector: filtered, kept 117 of 1000 lines ...]"
+    assert (reader.kept_lines, reader.truncated) == (117, True)
+
+
+def test_under_the_byte_cap_nothing_is_dropped():
+    lines, reader = _filtered(LOG, LineFilter(levels=["ERROR"], context=0), max_bytes=10000)
+    assert not reader.truncated
+    assert lines[-1] == "[... log_collector: filtered, kept 3 of 30 lines ...]"
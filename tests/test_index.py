@@ -0,0 +1,72 @@
+import json
+import pytest
+from collector_archive import ARCHIVE_OK, ArchiveEntry, stream_to_archive
+from collector_index import main, open_index, query
+
+AGENT_LOG = ("2025-10-30 08:00:00 INFO Agent started\n"
+             "2025-10-30 09:15:00 ERROR Install failed with error 1603\n"
+             "2025-10-30 09:20:00 WARN Retrying in 30 s\n"
+             "2025-10-30 11:40:00 ERROR Install failed with error 1603\n")
+PATCH_LOG = ("2025-10-31 10:00:00 INFO Scan started\n"
+             "2025-10-31 10:05:00 FATAL Access denied: 0x80070005\n"
+             "2025-10-31 10:06:00 ERROR System.IO.IOException: disk full\n"
+             "    at Patch.Download() line 12\n")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    (tmp_path / "agent.log").write_text(AGENT_LOG)
+    (tmp_path / "patch.log").write_text(PATCH_LOG)
+    entries = [ArchiveEntry(str(tmp_path / "agent.log"), "Agent/agent.log", "Agent"),
+               ArchiveEntry(str(tmp_path / "patch.log"), "Patch/patch.log", "Patch")]
+    path = str(tmp_path / "bundle.zip")
+    assert stream_to_archive(path, entries, index=True) == ARCHIVE_OK
+    return path
+
+
+def _query(archive, **filters):
+    db, copy = open_index(archive)
+    try:
+        return query(db, **filters)
+    finally:
+        db.close()
+
+
+def test_files_with_their_error_lines_and_time_range(archive):
+    # Only error levels and exceptions count: the WARN line is not an error
+    assert _query(archive) == [
+        ("Agent/agent.log", "Agent", 2, "2025-10-30T08:00:00", "2025-10-30T11:40:00"),
+        ("Patch/patch.log", "Patch", 2, "2025-10-31T10:00:00", "2025-10-31T10:06:00"),
+    ]
+
+
+def test_error_codes(archive):
+    assert _query(archive, code="1603") == [("Agent/agent.log", "1603", 2, "2025-10-30T09:15:00",
+                                            "2025-10-30T11:40:00")]
+    assert _query(archive, code="0X80070005") == [("Patch/patch.log", "0x80070005", 1, "2025-10-31T10:05:00",
+                                                  "2025-10-31T10:05:00")]
+    assert [row[:2] for row in _query(archive, code="System.IO.IOException")] == [
+        ("Patch/patch.log", "System.IO.IOException")]
+
+
+def test_text_of_the_error_lines(archive):
+    # Signatures mask the numbers, so both install failures are one row
+    assert _query(archive, text="install failed") == [("Agent/agent.log", "ERROR Install failed with error #", 2,
+                                                       "2025-10-30T09:15:00", "2025-10-30T11:40:00")]
+    assert _query(archive, text="retrying") == []
+
+
+def test_time_filters(archive):
+    assert [row[0] for row in _query(archive, since="2025-10-31T00:00:00")] == ["Patch/patch.log"]
+    assert [row[0] for row in _query(archive, until="2025-10-30T23:59:59")] == ["Agent/agent.log"]
+    assert _query(archive, code="1603", since="2025-10-30T12:00:00") == []
+    assert len(_query(archive, code="1603", since="2025-10-30T11:00:00", until="2025-10-30T12:00:00")) == 1
+
+
+def test_query_command(archive, capsys):
+    assert main([archive, "--error", "0x80070005", "--json"]) == 0
+    rows = json.loads(capsys.readouterr().out)
+    assert rows == [{"arcname": "Patch/patch.log", "match": "0x80070005", "count": 1,
+                     "first": "2025-10-31T10:05:00", "last": "2025-10-31T10:05:00"}]
+    assert main([archive, "--text", "disk full", "--until", "2025-10-30T12:00"]) == 1
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,110 @@
+import os
+import json
+from collector_archive import hash_file
+from collector_cancel import CancelToken
+from collector_manifest import DELTA_INDEX_NAME, RunManifest
+from collector_scan import FileRecord
+from collector_throttle import IOThrottle
+from collector_writers import open_writer, read_member
+
+
+class CountingThrottle(IOThrottle):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def read(self, f, size=-1):
+        self.reads += 1
+        return super().read(f, size)
+
+
+def _record(path):
+    st = os.stat(path)
+    return FileRecord(str(path), path.name, st.st_size, st.st_mtime)
+
+
+def _first_run(tmp_path, *names):
+    # A full run that collected every file, saved as the previous manifest
+    manifest = RunManifest(str(tmp_path / "manifest.json"))
+    for name in names:
+        record = _record(tmp_path / name)
+        assert manifest.should_collect(record, "Logs")
+        manifest.add(record, "Logs", f"Logs/{name}", hash_file(record.source))
+    assert manifest.save("base.7z")
+
+
+def _touch(path):
+    # Same content, later mtime
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def _delta_index(tmp_path, manifest):
+    path = str(tmp_path / "delta.zip")
+    with open_writer(path, "fast") as archive:
+        manifest.write_index(archive)
+    return json.loads(read_member(path, DELTA_INDEX_NAME))
+
+
+def test_incremental_run_collects_only_new_and_changed_files(tmp_path):
+    for name in ("same.log", "touched.log", "edited.log", "gone.log"):
+        (tmp_path / name).write_text(f"{name}\n")
+    _first_run(tmp_path, "same.log", "touched.log", "edited.log", "gone.log")
+    _touch(tmp_path / "touched.log")
+    (tmp_path / "edited.log").write_text("EDITED.log\n")
+    _touch(tmp_path / "edited.log")
+    os.remove(tmp_path / "gone.log")
+    (tmp_path / "new.log").write_text("new\n")
+
+    manifest = RunManifest(str(tmp_path / "manifest.json"), incremental=True)
+    assert manifest.incremental
+    collected = [name for name in ("same.log", "touched.log", "edited.log", "new.log")
+                 if manifest.should_collect(_record(tmp_path / name), "Logs")]
+    assert collected == ["edited.log", "new.log"]
+    for name in collected:
+        record = _record(tmp_path / name)
+        manifest.add(record, "Logs", f"Logs/{name}", hash_file(record.source))
+
+    index = _delta_index(tmp_path, manifest)
+    assert index["base_archive"] == index["previous_archive"] == "base.7z"
+    assert index["changed"] == ["Logs/edited.log", "Logs/new.log"]
+    assert index["unchanged"] == 2
+    assert index["deleted"] == [str(tmp_path / "gone.log")]
+
+
+def test_unchanged_counts_sources_not_archive_entries(tmp_path):
+    for name in ("shared.log", "same.log"):
+        (tmp_path / name).write_text(f"{name}\n")
+    _first_run(tmp_path, "shared.log", "same.log")
+    (tmp_path / "shared.log").write_text("changed, and longer\n")
+
+    manifest = RunManifest(str(tmp_path / "manifest.json"), incremental=True)
+    assert not manifest.should_collect(_record(tmp_path / "same.log"), "Logs")
+    record = _record(tmp_path / "shared.log")
+    assert manifest.should_collect(record, "Logs")
+    # One source stored under two categories: two archive entries
+    for category in ("Logs", "Agent"):
+        manifest.add(record, category, f"{category}/shared.log", hash_file(record.source))
+    assert _delta_index(tmp_path, manifest)["unchanged"] == 1
+
+
+def test_rehash_reads_through_the_run_throttle(tmp_path):
+    (tmp_path / "touched.log").write_text("line\n")
+    _first_run(tmp_path, "touched.log")
+    _touch(tmp_path / "touched.log")
+    manifest = RunManifest(str(tmp_path / "manifest.json"), incremental=True)
+    throttle = CountingThrottle()
+    assert not manifest.should_collect(_record(tmp_path / "touched.log"), "Logs", throttle=throttle)
+    assert throttle.reads
+
+
+def test_cancelled_rehash_stops_reading(tmp_path):
+    (tmp_path / "touched.log").write_text("line\n" * 1000)
+    _first_run(tmp_path, "touched.log")
+    _touch(tmp_path / "touched.log")
+    manifest = RunManifest(str(tmp_path / "manifest.json"), incremental=True)
+    cancel = CancelToken()
+    cancel.cancel()
+    # Not known to be unchanged: collected, and the archive stage stops the run
+    assert manifest.should_collect(_record(tmp_path / "touched.log"), "Logs", cancel=cancel)
+    assert str(tmp_path / "touched.log") not in manifest.unchanged
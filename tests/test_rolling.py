@@ -0,0 +1,113 @@
+import os
+import gzip
+import json
+import threading
+import collector_rolling
+from collector_archive import ARCHIVE_OK
+from collector_cancel import CancelToken
+from collector_rolling import BUNDLE_INDEX_NAME, RollingCapture, request_snapshot
+from collector_scan import FileRules
+from collector_writers import read_member
+
+
+def _capture(tmp_path, **options):
+    src = tmp_path / "src"
+    src.mkdir(exist_ok=True)
+    return src, RollingCapture({"Cat A": [str(src)]}, str(tmp_path / "store"), default_rules=FileRules(), **options)
+
+
+def _captured(capture):
+    # The text held by the ring, per segment source
+    text = {}
+    for seg in capture.segments:
+        with open(capture._path(seg), "rb") as f:
+            name = os.path.basename(seg["source"])
+            text[name] = text.get(name, b"") + gzip.decompress(f.read())
+    return text
+
+
+def _append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_first_scan_keeps_only_the_end_of_a_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(collector_rolling, "FIRST_CAPTURE_BYTES", 10)
+    src, capture = _capture(tmp_path)
+    (src / "agent.log").write_text("old lines\n" * 10 + "last line\n")
+    capture.rescan()
+    assert _captured(capture) == {"agent.log": b"last line\n"}
+
+
+def test_a_rotated_log_is_read_to_its_end_and_the_new_one_from_its_start(tmp_path):
+    src, capture = _capture(tmp_path)
+    log = src / "agent.log"
+    log.write_text("")
+    capture.rescan()
+    _append(log, "A1\n")
+    capture.poll()
+    # Rotated between two polls: the old file got one more line under its new name
+    os.rename(log, str(log) + ".1")
+    _append(str(log) + ".1", "A2\n")
+    log.write_text("B1\n")
+    capture.poll()
+    capture.poll()
+    _append(log, "B2\n")
+    capture.poll()
+    text = b"".join(_captured(capture).values())
+    assert sorted(text.splitlines()) == [b"A1", b"A2", b"B1", b"B2"]
+
+
+def test_a_log_truncated_in_place_is_read_again_from_its_start(tmp_path):
+    src, capture = _capture(tmp_path)
+    log = src / "agent.log"
+    log.write_text("A1\nA2\n")
+    capture.rescan()
+    with open(log, "r+") as f:
+        f.truncate(0)
+    _append(log, "C1\n")
+    capture.poll()
+    assert b"".join(_captured(capture).values()) == b"A1\nA2\nC1\n"
+
+
+def test_the_ring_drops_the_oldest_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(collector_rolling, "SEGMENT_BYTES", 100)
+    src, capture = _capture(tmp_path, ring_size=2000)
+    log = src / "agent.log"
+    log.write_text("")
+    capture.rescan()
+    for _ in range(20):
+        _append(log, os.urandom(200).hex() + "\n")
+        capture.poll()
+    assert capture.total <= 2000
+    assert len(os.listdir(capture.segment_dir)) == len(capture.segments)
+
+
+def test_state_survives_a_restart(tmp_path):
+    src, capture = _capture(tmp_path)
+    (src / "agent.log").write_text("A1\n")
+    capture.rescan()
+    capture.save()
+    _, restarted = _capture(tmp_path)
+    assert restarted.files == capture.files
+    assert restarted.segments == capture.segments
+
+
+def test_snapshot_of_a_running_capture(tmp_path):
+    src, _ = _capture(tmp_path)
+    (src / "agent.log").write_text("A1\n")
+    cancel = CancelToken()
+    _, capture = _capture(tmp_path, cancel=cancel)
+    archive_path = str(tmp_path / "bundle.7z")
+    thread = threading.Thread(target=capture.run, args=(lambda: archive_path,))
+    thread.start()
+    try:
+        answer = request_snapshot(capture.store_dir, timeout=30)
+    finally:
+        cancel.cancel()
+        thread.join(timeout=30)
+    assert answer == {"archive": archive_path, "status": ARCHIVE_OK}
+    index = json.loads(read_member(archive_path, BUNDLE_INDEX_NAME))
+    assert [os.path.basename(seg["source"]) for seg in index["segments"]] == ["agent.log"]
+    segment = read_member(archive_path, index["segments"][0]["arcname"])
+    assert gzip.decompress(segment) == b"A1\n"
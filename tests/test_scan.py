@@ -0,0 +1,53 @@
+import os
+import pytest
+from collector_scan import SKIP_ROTATED, FileRules, RotationPolicy, rotation_series, scan_path
+
+
+@pytest.mark.parametrize("name, series", [
+    ("agent.log", "agent.log"),
+    ("agent.log.1", "agent.log"),
+    ("Agent.LOG.12", "agent.log"),
+    ("agent.log.3.gz", "agent.log"),
+    ("agent.log.2025-10-30", "agent.log"),
+    ("agent.bin", None),
+])
+def test_generations_after_the_extension(name, series):
+    assert rotation_series(name) == series
+
+
+@pytest.mark.parametrize("name", ["agent.2.log", "agent_2.log", "agent_20251030.log", "agent.2025-10-30.log"])
+def test_generations_before_the_extension_need_the_base_log(name):
+    assert rotation_series(name, {"agent.log", name.lower()}) == "agent.log"
+    assert rotation_series(name, {name.lower()}) == name.lower()
+
+
+@pytest.mark.parametrize("names", [
+    ["task_12.log", "task_13.log"],
+    ["ticket-4711.txt", "ticket-4712.txt"],
+    ["2025-10-01.log", "2025-10-02.log"],
+])
+def test_numbered_names_are_not_a_series(names):
+    folder = {name.lower() for name in names}
+    assert [rotation_series(name, folder) for name in names] == [name.lower() for name in names]
+
+
+def _write(path, size, mtime):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_rotation_policy_keeps_the_newest_generations(tmp_path):
+    names = ["agent.log", "agent.log.1", "agent.log.2", "agent.log.3", "task_12.log", "task_13.log"]
+    for age, name in enumerate(names):
+        _write(tmp_path / name, 10, 1_700_000_000 - age * 60)
+    skipped = []
+    rules = FileRules(rotation=RotationPolicy(keep=2))
+    records = list(scan_path(str(tmp_path), rules, on_skip=lambda path, reason: skipped.append((path, reason))))
+
+    kept = [os.path.basename(record.source) for record in records]
+    assert sorted(kept) == ["agent.log", "agent.log.1", "task_12.log", "task_13.log"]
+    # Oldest first within the series
+    assert kept.index("agent.log.1") < kept.index("agent.log")
+    assert sorted((os.path.basename(path), reason) for path, reason in skipped) == [
+        ("agent.log.2", SKIP_ROTATED), ("agent.log.3", SKIP_ROTATED)]
@@ -0,0 +1,49 @@
+import os
+import pytest
+import collector_silent
+import log_col_silent_ev
+import silent_new_version
+from collector_manifest import RunManifest
+from collector_metrics import RunMetrics
+
+BUILDS = [silent_new_version.copy_all_categories, log_col_silent_ev.copy_selected_items]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    # Agent, with its scanner folder below it claimed by a second category
+    scanner = tmp_path / "agent" / "scanner"
+    scanner.mkdir(parents=True)
+    (tmp_path / "agent" / "agent.log").write_text("agent\n")
+    (scanner / "scan.log").write_text("scan\n")
+    monkeypatch.setattr(collector_silent, "categories", {"Agent": [str(tmp_path / "agent")],
+                                                         "Scanner": [str(scanner)]})
+    monkeypatch.setattr(collector_silent, "CATEGORY_RULES", {})
+    return tmp_path
+
+
+def _arcnames(copy_items, tmp_path, metrics=None):
+    manifest = RunManifest(str(tmp_path / "manifest.json"))
+    return sorted(entry.arcname.replace(os.sep, "/") for entry in copy_items(manifest, None, metrics=metrics))
+
+
+def test_each_build_names_its_entries(tree):
+    # silent_new_version: the full path without its drive; log_col_silent_ev: from the root's name
+    root = os.path.splitdrive(str(tree))[1].strip("\\/").replace(os.sep, "/")
+    assert _arcnames(silent_new_version.copy_all_categories, tree) == [
+        f"Agent/{root}/agent/agent.log", f"Agent/{root}/agent/scanner/scan.log",
+        f"Scanner/{root}/agent/scanner/scan.log"]
+    assert _arcnames(log_col_silent_ev.copy_selected_items, tree) == [
+        "Agent/agent/agent.log", "Agent/agent/scanner/scan.log", "Scanner/scanner/scan.log"]
+
+
+@pytest.mark.parametrize("copy_items", BUILDS)
+def test_a_failed_scan_is_reported_by_both_builds(tree, monkeypatch, copy_items):
+    def scan_planned(*args, **options):
+        raise OSError("device not ready")
+        yield
+
+    monkeypatch.setattr(collector_silent, "scan_planned", scan_planned)
+    metrics = RunMetrics()
+    assert _arcnames(copy_items, tree, metrics) == []
+    assert metrics.failed == {"scan failed: device not ready": 1}
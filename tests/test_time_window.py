@@ -0,0 +1,49 @@
+import os
+import datetime
+import pytest
+from collector_events import build_export_command, time_window_query
+from collector_scan import SKIP_OUTSIDE_WINDOW, FileRules, TimeWindow, in_window, parse_time_spec, scan_path, time_window
+
+NOW = 1_700_000_000
+
+
+def test_relative_and_absolute_times():
+    assert parse_time_spec("48h", now=NOW) == NOW - 48 * 3600
+    assert parse_time_spec("7d", now=NOW) == NOW - 7 * 86400
+    assert parse_time_spec("2025-10-30") == datetime.datetime(2025, 10, 30).timestamp()
+    with pytest.raises(ValueError):
+        parse_time_spec("yesterday")
+
+
+def test_window_bounds():
+    assert time_window() is None
+    window = time_window("2d", "1d", now=NOW)
+    assert window == TimeWindow(NOW - 2 * 86400, NOW - 86400)
+    assert in_window(window, NOW - 36 * 3600)
+    assert not in_window(window, NOW - 3 * 86400)
+    assert not in_window(window, NOW)
+    assert in_window(None, 0)
+    with pytest.raises(ValueError):
+        time_window("1d", "2d", now=NOW)
+
+
+def test_scan_skips_files_outside_the_window(tmp_path):
+    for name, age in (("new.log", 3600), ("old.log", 10 * 86400)):
+        path = tmp_path / name
+        path.write_text("line\n")
+        os.utime(path, (NOW - age, NOW - age))
+    skipped = []
+    records = list(scan_path(str(tmp_path), FileRules(), on_skip=lambda path, reason: skipped.append((path, reason)),
+                             window=time_window("2d", now=NOW)))
+    assert [record.rel_path for record in records] == ["new.log"]
+    assert skipped == [(str(tmp_path / "old.log"), SKIP_OUTSIDE_WINDOW)]
+
+
+def test_event_export_query():
+    assert time_window_query(None) is None
+    window = TimeWindow(0, 86400)
+    query = time_window_query(window)
+    assert query == ("*[System[TimeCreated[@SystemTime>='1970-01-01T00:00:00.000Z' and "
+                     "@SystemTime<='1970-01-02T00:00:00.000Z']]]")
+    assert build_export_command("System", "out.evtx", window)[-1] == f"/q:{query}"
+    assert not build_export_command("System", "out.evtx")[-1].startswith("/q:")